@@ -0,0 +1,164 @@
+"""Archive module"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from parseM3u8 import Segment, Variant
+
+def renditionKey(stream:Variant) -> str:
+    """Identifies rendition of the video regardless of signed url of its playlist"""
+    return f"{stream.resolution}|{stream.bandwidth}|{stream.codecs}"
+
+def segmentsFingerprint(segments:list[Segment]) -> str:
+    """Hash of segment urls (without signed query), identical content has identical fingerprint"""
+    return hashlib.sha256("\n".join(segment.id for segment in segments).encode()).hexdigest()
+
+def fileChecksum(path:str) -> str:
+    """Returns SHA-256 of the file"""
+    with open(path, "rb") as f:
+        return hashlib.file_digest(f, "sha256").hexdigest()
+
+class ArchiveRecord:
+    """Finished download stored in the archive"""
+    __slots__ = ("video", "rendition", "fingerprint", "path", "size", "checksum", "finished")
+
+    def __init__(self, video:str, rendition:str, fingerprint:str, path:str, size:int, checksum:str, finished:float) -> None:
+        """Initializes ``ArchiveRecord`` class"""
+        self.video:str = video
+        self.rendition:str = rendition
+        self.fingerprint:str = fingerprint
+        self.path:str = path
+        self.size:int = size
+        self.checksum:str = checksum
+        self.finished:float = finished
+
+class ArchiveIndex:
+    """Persistent index of downloaded videos
+    - videos are keyed by ID (IDEC) + rendition + fingerprint of segment urls, with path, size and checksum of the final file
+    - segments of kept ``.ts`` files are indexed by host and path of their url, so a video sharing them (e.g. CT Gold bonus
+      cut from an episode) reads them from disk instead of downloading them
+    - unreadable index is moved aside to ``archive.sqlite.corrupt`` and a new empty one is started"""
+
+    DEFAULT_DIRECTORY:str = os.path.join(os.path.expanduser("~"), ".cache", "ct_downloader")
+
+    def __init__(self, directory:str | None = None) -> None:
+        """Initializes ``ArchiveIndex`` class"""
+        self.directory:str = directory if directory is not None else self.DEFAULT_DIRECTORY
+        self._lock:threading.Lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+        path:str = os.path.join(self.directory, "archive.sqlite")
+        try:
+            self._connection:sqlite3.Connection = self._connect(path)
+        except sqlite3.DatabaseError:
+            print(f"Index archivu {path} je poškozený, ukládám ho stranou a začínám nový.")
+            os.replace(path, path + ".corrupt")
+            self._connection = self._connect(path)
+
+    def _connect(self, path:str) -> sqlite3.Connection:
+        """Opens the index database and creates its tables, raises ``sqlite3.DatabaseError`` if the file isn't a database"""
+        connection:sqlite3.Connection = sqlite3.connect(path, check_same_thread=False)
+        try:
+            with self._lock, connection:
+                connection.execute("""CREATE TABLE IF NOT EXISTS videos (
+                                      video TEXT NOT NULL,
+                                      rendition TEXT NOT NULL,
+                                      fingerprint TEXT NOT NULL,
+                                      path TEXT NOT NULL,
+                                      size INTEGER NOT NULL,
+                                      checksum TEXT NOT NULL,
+                                      finished REAL NOT NULL,
+                                      PRIMARY KEY (video, rendition, fingerprint, path))""")
+                connection.execute("CREATE INDEX IF NOT EXISTS videos_fingerprint ON videos (fingerprint)")
+                connection.execute("""CREATE TABLE IF NOT EXISTS segments (
+                                      segment TEXT NOT NULL,
+                                      path TEXT NOT NULL,
+                                      offset INTEGER NOT NULL,
+                                      length INTEGER NOT NULL,
+                                      crc INTEGER NOT NULL,
+                                      PRIMARY KEY (segment, path))""")
+                connection.execute("CREATE INDEX IF NOT EXISTS segments_path ON segments (path)")
+        except sqlite3.DatabaseError:
+            connection.close()
+            raise
+        return connection
+
+    def find(self, video:str, rendition:str, extention:str, verify:bool = False) -> ArchiveRecord | None:
+        """Returns the newest intact file of the video in the rendition
+        - records of missing, partial or (with ``verify``) corrupted files are removed"""
+        with self._lock:
+            rows:list = self._connection.execute("""SELECT * FROM videos WHERE video = ? AND rendition = ?
+                                                    ORDER BY finished DESC""", (video, rendition)).fetchall()
+        return self._intact([ArchiveRecord(*row) for row in rows], extention, verify)
+
+    def findContent(self, fingerprint:str, extention:str, verify:bool = False) -> ArchiveRecord | None:
+        """Returns intact file with the same segments, no matter which video it was downloaded as"""
+        with self._lock:
+            rows:list = self._connection.execute("SELECT * FROM videos WHERE fingerprint = ? ORDER BY finished DESC",
+                                                 (fingerprint,)).fetchall()
+        return self._intact([ArchiveRecord(*row) for row in rows], extention, verify)
+
+    def add(self, video:str, rendition:str, fingerprint:str, path:str,
+            segments:list[tuple[str, int, int, int]] | None = None) -> ArchiveRecord:
+        """Stores finished file, its checksum is computed here
+        - ``segments`` are (segment id, offset, length, crc32) of segments the file consists of"""
+        record:ArchiveRecord = ArchiveRecord(video, rendition, fingerprint, path, os.path.getsize(path), fileChecksum(path), time.time())
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM videos WHERE path = ?", (path,))
+            self._connection.execute("DELETE FROM segments WHERE path = ?", (path,))
+            self._connection.execute("INSERT INTO videos VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                     (record.video, record.rendition, record.fingerprint, record.path,
+                                      record.size, record.checksum, record.finished))
+            if segments is not None:
+                self._connection.executemany("INSERT OR REPLACE INTO segments VALUES (?, ?, ?, ?, ?)",
+                                             [(segment, path, offset, length, crc) for segment, offset, length, crc in segments])
+        return record
+
+    def readSegment(self, segment:str) -> bytes | None:
+        """Returns segment stored in some archived file, ``None`` if there is no intact copy"""
+        with self._lock:
+            rows:list = self._connection.execute("SELECT path, offset, length, crc FROM segments WHERE segment = ?",
+                                                 (segment,)).fetchall()
+        for path, offset, length, crc in rows:
+            try:
+                with open(path, "rb") as f:
+                    f.seek(offset)
+                    data:bytes = f.read(length)
+            except OSError:
+                data = b""
+            if len(data) == length and zlib.crc32(data) == crc:
+                return data
+            self.forget(path)
+        return None
+
+    def segmentsOf(self, path:str) -> list[tuple[str, int, int, int]]:
+        """Returns (segment id, offset, length, crc32) of segments indexed in the file"""
+        with self._lock:
+            return self._connection.execute("SELECT segment, offset, length, crc FROM segments WHERE path = ? ORDER BY offset",
+                                            (path,)).fetchall()
+
+    def forget(self, path:str) -> None:
+        """Removes file and its segments from the archive, the file itself is kept"""
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM videos WHERE path = ?", (path,))
+            self._connection.execute("DELETE FROM segments WHERE path = ?", (path,))
+
+    def close(self) -> None:
+        """Closes the archive database"""
+        self._connection.close()
+
+    def _intact(self, records:list[ArchiveRecord], extention:str, verify:bool) -> ArchiveRecord | None:
+        """Returns first record whose file exists with the recorded size (and checksum with ``verify``)"""
+        for record in records:
+            if not record.path.endswith(extention):
+                continue
+            try:
+                size:int = os.path.getsize(record.path)
+            except OSError:
+                size = -1
+            if size == record.size and (not verify or fileChecksum(record.path) == record.checksum):
+                return record
+            print(f"Soubor {record.path} v archivu chybí nebo je poškozený, bude stažen znovu.")
+            self.forget(record.path)
+        return None
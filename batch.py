@@ -0,0 +1,250 @@
+"""Batch module"""
+import asyncio
+import os
+import sys
+import time
+from typing import AsyncIterable, AsyncIterator, Iterable
+from aiohttp import ClientSession
+from prettytable import PrettyTable
+import requests
+from requests.adapters import HTTPAdapter
+from archive import ArchiveIndex, ArchiveRecord
+from cache import MetadataCache
+from concurrency import BandwidthLimiter, pooledSession
+from downloadCT import CT, CT_Error, getDownloader
+from downloadM3u8 import iterate
+from events import Events
+from parseM3u8 import Variant
+from selection import StreamSelector, estimateSize, planBudget
+
+class BatchItem:
+    """One url of the batch and the result of its download"""
+    def __init__(self, url:str, weight:float = 1.0) -> None:
+        """Initializes ``BatchItem`` class
+        - ``weight`` is the part of the batch rate limit the job gets relative to the other jobs"""
+        self.url:str = url
+        self.weight:float = weight
+        self.name:str | None = None
+        self.status:str = "čeká"
+        self.bytes:int = 0
+        self.duration:float = 0.0
+        self.error:str | None = None
+        self.video:CT | None = None
+        self.stream:Variant | None = None
+        self.estimate:int | None = None
+
+    @property
+    def throughput(self) -> float:
+        """Average download speed in bytes per second"""
+        if self.duration == 0:
+            return 0.0
+        return self.bytes / self.duration
+
+class Batch:
+    """Batch downloader
+    - downloads many CT and CT Gold urls concurrently
+    - all jobs share one aiohttp connection pool for metadata, subtitles and segments
+    - urls are resolved ahead of the running downloads, up to ``maxResolves`` at once
+    - url listed more than once is downloaded only once
+    - url can be followed by weight of its job in the shared rate limit (``<url> 2``)"""
+
+    def __init__(self, urls:Iterable[str] | AsyncIterable[str], directory:str, subs:bool = False, convert:bool = False, resume:bool = True, pipe:bool = False,
+                 maxJobs:int = 3, maxConnections:int = 32, maxConnectionsPerHost:int = 16, maxResolves:int = 64,
+                 cache:MetadataCache | None = None, refresh:bool = False,
+                 selector:StreamSelector | None = None, budget:int | None = None, events:Events | None = None,
+                 archive:ArchiveIndex | None = None, verify:bool = False, rateLimit:BandwidthLimiter | None = None) -> None:
+        """Initializes ``Batch`` class
+        - ``urls`` can be async iterable, downloads start while it is still producing urls
+        - ``selector`` chooses stream of every video
+        - ``budget`` limits estimated total size in bytes, all urls are resolved first and streams are planned
+          from bandwidth × duration before any segment is downloaded
+        - ``events`` receives events of all jobs
+        - videos already in ``archive`` are skipped, ``verify`` checks their checksums
+        - ``rateLimit`` caps throughput of the whole batch, every job gets a share of it by its weight (equal by default)"""
+        self.urls:Iterable[str] | AsyncIterable[str] = urls
+        self.items:list[BatchItem] = []
+        self.directory:str = directory
+        self.subs:bool = subs
+        self.convert:bool = convert
+        self.resume:bool = resume
+        self.pipe:bool = pipe
+        self.maxJobs:int = maxJobs
+        self.maxConnections:int = maxConnections
+        self.maxConnectionsPerHost:int = maxConnectionsPerHost
+        self.maxResolves:int = maxResolves
+        self.cache:MetadataCache | None = cache
+        self.refresh:bool = refresh
+        self.selector:StreamSelector | None = selector
+        self.budget:int | None = budget
+        self.events:Events | None = events
+        self.archive:ArchiveIndex | None = archive
+        self.verify:bool = verify
+        self.rateLimit:BandwidthLimiter | None = rateLimit
+
+    @staticmethod
+    def readUrls(source:str) -> list[str]:
+        """Reads urls from file or from stdin if ``source`` is ``-``
+        - empty lines and lines starting with ``#`` are skipped
+        - url can be followed by weight of its job (``<url> 2``), invalid weight raises ``ValueError``"""
+        if source == "-":
+            lines:list[str] = sys.stdin.read().split("\n")
+        else:
+            with open(source, encoding="utf-8") as f:
+                lines:list[str] = f.read().split("\n")
+        urls:list[str] = [line.strip() for line in lines if line.strip() != "" and not line.strip().startswith("#")]
+        for url in urls:
+            Batch.parseUrl(url)
+        return urls
+
+    @staticmethod
+    def parseUrl(line:str) -> tuple[str, float]:
+        """Returns url and weight of the batch line ``<url>`` or ``<url> <weight>``"""
+        parts:list[str] = line.split()
+        if len(parts) == 1:
+            return parts[0], 1.0
+        try:
+            weight:float = float(parts[1])
+        except ValueError:
+            weight = 0.0
+        if len(parts) != 2 or not 0 < weight < float("inf"):
+            raise ValueError(f"Neplatná váha v řádku dávky: {line}")
+        return parts[0], weight
+
+    def run(self) -> list[BatchItem]:
+        """Downloads all urls and returns their results"""
+        return asyncio.run(self.asyncRun())
+
+    async def asyncRun(self) -> list[BatchItem]:
+        """Downloads all urls asynchronously and returns their results"""
+        session:requests.Session = self._makeSession()
+        jobs:asyncio.Semaphore = asyncio.Semaphore(self.maxJobs)
+        resolving:asyncio.Semaphore = asyncio.Semaphore(self.maxResolves)
+        try:
+            async with pooledSession(self.maxConnections, self.maxConnectionsPerHost) as pool:
+                if self.budget is not None:
+                    await self._plan(session, pool, resolving)
+                tasks:list[asyncio.Task] = [asyncio.create_task(self._runItem(item, session, pool, jobs, resolving))
+                                            for item in self.items if item.status == "čeká"]
+                try:
+                    if self.budget is None:
+                        async for url, weight in self._iterUrls():
+                            item:BatchItem = BatchItem(url, weight)
+                            self.items.append(item)
+                            tasks.append(asyncio.create_task(self._runItem(item, session, pool, jobs, resolving)))
+                finally:
+                    await asyncio.gather(*tasks)
+        finally:
+            session.close()
+        return self.items
+
+    async def _plan(self, session:requests.Session, pool:ClientSession, resolving:asyncio.Semaphore) -> None:
+        """Resolves all urls and selects streams fitting into ``budget``
+        - urls which can't be resolved or whose duration can't be found are marked as failed and left out of the plan"""
+        self.items = [BatchItem(url, weight) async for url, weight in self._iterUrls()]
+        await asyncio.gather(*(self._resolveItem(item, session, pool, resolving) for item in self.items))
+        measured:list[BatchItem] = [item for item in self.items if item.status == "čeká"]
+        lengths:list[float | None] = await asyncio.gather(*(self._measureItem(item, pool, resolving) for item in measured))
+        resolved:list[BatchItem] = [item for item in measured if item.status == "čeká"]
+        durations:list[float] = [length for length in lengths if length is not None]
+        streams:list[Variant] = planBudget([(item.video.video.streams, duration) for item, duration in zip(resolved, durations)],
+                                           self.budget, self.selector)
+        for item, stream, duration in zip(resolved, streams, durations):
+            item.stream = stream
+            item.estimate = estimateSize(stream, duration)
+
+    async def _resolveItem(self, item:BatchItem, session:requests.Session, pool:ClientSession, resolving:asyncio.Semaphore) -> None:
+        """Resolves one url of the batch without downloading it"""
+        async with resolving:
+            try:
+                item.video = await self._getDownloader(item.url, session).resolve(subtitles=self.subs, session=pool)
+                item.name = item.video.name
+            except CT_Error as e:
+                item.status = "chyba"
+                item.error = f"{e} {e.details}" if e.details is not None else str(e)
+            except Exception as e:
+                item.status = "chyba"
+                item.error = str(e)
+
+    async def _measureItem(self, item:BatchItem, pool:ClientSession, resolving:asyncio.Semaphore) -> float | None:
+        """Returns duration of the resolved url of the batch in seconds, ``None`` if it can't be found and the item failed"""
+        async with resolving:
+            try:
+                return await item.video.video.asyncGetDuration(pool)
+            except CT_Error as e:
+                item.status = "chyba"
+                item.error = f"{e} {e.details}" if e.details is not None else str(e)
+            except Exception as e:
+                item.status = "chyba"
+                item.error = str(e)
+        return None
+
+    async def _iterUrls(self) -> AsyncIterator[tuple[str, float]]:
+        """Iterates over urls and weights of ``urls`` no matter if they are sync or async iterable, repeated urls are skipped"""
+        seen:set[str] = set()
+        async for line in iterate(self.urls):
+            url, weight = self.parseUrl(line)
+            if url in seen:
+                print(f"Url {url} je v dávce vícekrát, stáhne se jen jednou.")
+                continue
+            seen.add(url)
+            yield url, weight
+
+    async def _runItem(self, item:BatchItem, session:requests.Session, pool:ClientSession, jobs:asyncio.Semaphore,
+                       resolving:asyncio.Semaphore) -> None:
+        """Resolves and downloads one url of the batch, the url is resolved before it waits for a free job"""
+        if item.video is None:
+            await self._resolveItem(item, session, pool, resolving)
+            if item.status == "chyba":
+                return
+        async with jobs:
+            item.status = "běží"
+            start:float = time.perf_counter()
+            try:
+                video:CT = item.video
+                item.stream = item.stream if item.stream is not None else video.video.select_stream(self.selector)
+                record:ArchiveRecord | None = await asyncio.to_thread(video.archived, item.stream, self.convert, self.verify)
+                if record is not None:
+                    item.bytes = record.size
+                    item.status = "v archivu"
+                    return
+                path:str = await video.asyncDownload(subs=self.subs, convert=self.convert, resume=self.resume, session=pool, pipe=self.pipe,
+                                                     stream=item.stream, verify=self.verify,
+                                                     rateLimit=self.rateLimit.share(item.weight) if self.rateLimit is not None else None)
+                item.bytes = os.path.getsize(path)
+                item.status = "hotovo"
+            except CT_Error as e:
+                item.status = "chyba"
+                item.error = f"{e} {e.details}" if e.details is not None else str(e)
+            except Exception as e:
+                item.status = "chyba"
+                item.error = str(e)
+            finally:
+                item.duration = time.perf_counter() - start
+
+    def _getDownloader(self, url:str, session:requests.Session) -> CT:
+        """Returns downloader matching the url"""
+        return getDownloader(url, self.directory, session=session, cache=self.cache, refresh=self.refresh, events=self.events,
+                             archive=self.archive)
+
+    def _makeSession(self) -> requests.Session:
+        """Returns blocking session for synchronous calls of downloaders, limited to ``maxConnectionsPerHost`` connections per host"""
+        session:requests.Session = requests.Session()
+        adapter:HTTPAdapter = HTTPAdapter(pool_connections=self.maxJobs, pool_maxsize=self.maxConnectionsPerHost, pool_block=True)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+
+    def displaySummary(self) -> None:
+        """Displays table with results of all items"""
+        t:PrettyTable = PrettyTable()
+        t.field_names = ["Video", "Stav", "Rozlišení", "Odhad", "Velikost", "Čas", "Rychlost"]
+        t.align = "l"
+        for item in self.items:
+            t.add_row([item.name or item.url,
+                       item.status if item.error is None else f"{item.status}: {item.error}",
+                       item.stream.resolution if item.stream is not None else "",
+                       f"{item.estimate/1_000_000:.1f} MB" if item.estimate is not None else "",
+                       f"{item.bytes/1_000_000:.1f} MB",
+                       f"{item.duration:.1f} s",
+                       f"{item.throughput/1_000_000:.2f} MB/s"])
+        print(t)
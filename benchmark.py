@@ -0,0 +1,444 @@
+"""Benchmark module"""
+import asyncio
+import json
+import multiprocessing
+import os
+import socket
+import tempfile
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager, redirect_stdout
+from typing import Callable, Iterator
+import requests
+import typer
+from typing_extensions import Annotated
+from bs4 import BeautifulSoup
+from prettytable import PrettyTable
+from pagescan import PageInfo, scanChunks
+from aiohttp import ClientSession, web
+from concurrency import pooledSession
+from decrypt import SegmentDecryptor, decryptAES128, encryptAES128, segmentIV
+from downloadCT import CT, CT_Gold
+from downloadM3u8 import M3U8
+from standin import StandIn, syntheticSubtitles
+from subtitles import asyncDownloadSubtitles, txtToSrt
+from parseM3u8 import Key, Segment, parseMaster, parseMedia
+
+app = typer.Typer(add_completion=False, context_settings={"help_option_names": ["-h", "--help"]})
+
+def measure(function:Callable, repeat:int) -> tuple[float, int]:
+    """Returns best time in seconds and peak allocated memory in bytes of ``function``"""
+    best:float = float("inf")
+    for _ in range(repeat):
+        start:float = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    function()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak
+
+def syntheticPage(gold:bool = False, size:int = 1_000_000) -> str:
+    """Returns page shaped like ČT episode page (or CT Gold page) with ``size`` bytes of filler"""
+    ld_json:str = json.dumps({"@type": "VideoObject", "name": "Díl 1",
+                              "video": {"embedUrl": "https://www.ceskatelevize.cz/ivysilani/embed/iFramePlayer.php?IDEC=224562210010001"}})
+    head:str = ("<!DOCTYPE html><html><head><title>Díl 1 | Zlatá Praha</title>"
+                "<script type=\"application/ld+json\">{\"@type\": \"WebSite\"}</script>"
+                f"<script type=\"application/ld+json\">{ld_json}</script></head><body>")
+    item:str = "<div class=\"card\"><a href=\"/porady/1000-serial/100000/\"><img src=\"/a.jpg\" alt=\"obrázek\"><span>Díl</span></a></div>\n"
+    filler:list[str] = [item] * (size // len(item))
+    if gold:
+        filler.insert(len(filler) // 3, "<iframe src=\"https://www.ceskatelevize.cz/ivysilani/embed/iFramePlayer.php?bonus=12345&amp;x=1\"></iframe>")
+    return head + "".join(filler) + "</body></html>"
+
+@app.callback()
+def callback():
+   """Benchmarks of CT downloader"""
+
+@app.command()
+def pages(fixtures:Annotated[str, typer.Option(
+            "-f", "--fixtures",
+            help="Složka s uloženými stránkami (*.html)", show_default=False)]
+            = None,
+          repeat:Annotated[int, typer.Option(
+            "-r", "--repeat",
+            help="Počet opakování", show_default=True)]
+            = 5,
+          chunk_size:Annotated[int, typer.Option(
+            "--chunk-size",
+            help="Velikost čtených částí stránky", show_default=True)]
+            = 16384
+            ):
+   """Compares full BeautifulSoup parse with incremental page scan"""
+   pages:dict[str, str] = {}
+   if fixtures is not None:
+      for file in sorted(os.listdir(fixtures)):
+         if file.endswith(".html"):
+            with open(os.path.join(fixtures, file), encoding="utf-8") as f:
+               pages[file] = f.read()
+   else:
+      pages["synthetic CT"] = syntheticPage()
+      pages["synthetic CT Gold"] = syntheticPage(gold=True)
+   def enough(page:PageInfo) -> bool:
+      return len(page.ld_json) >= 2 or (page.title is not None and len(page.iframes) > 0)
+   t:PrettyTable = PrettyTable()
+   t.field_names = ["Stránka", "Velikost", "BeautifulSoup", "Scan", "Paměť BeautifulSoup", "Paměť scan"]
+   t.align = "l"
+   for page_name, text in pages.items():
+      chunks:list[str] = [text[i:i+chunk_size] for i in range(0, len(text), chunk_size)]
+      full_time, full_memory = measure(lambda: BeautifulSoup(text, "html.parser").find_all("script", {"type": "application/ld+json"}), repeat)
+      scan_time, scan_memory = measure(lambda: scanChunks(chunks, enough), repeat)
+      t.add_row([page_name, f"{len(text)/1_000_000:.2f} MB",
+                 f"{full_time*1000:.1f} ms", f"{scan_time*1000:.1f} ms",
+                 f"{full_memory/1_000_000:.1f} MB", f"{scan_memory/1_000_000:.1f} MB"])
+   print(t)
+
+def syntheticMediaPlaylist(segments:int = 100_000, key_every:int = 1000) -> str:
+    """Returns media playlist with ``segments`` segments, key rotation and discontinuities"""
+    lines:list[str] = ["#EXTM3U", "#EXT-X-VERSION:3", "#EXT-X-TARGETDURATION:4", "#EXT-X-MEDIA-SEQUENCE:0", "#EXT-X-PLAYLIST-TYPE:VOD"]
+    for i in range(segments):
+        if i % key_every == 0:
+            lines.append(f"#EXT-X-KEY:METHOD=AES-128,URI=\"key{i // key_every}.bin\",IV=0x{i:032x}")
+            lines.append("#EXT-X-DISCONTINUITY")
+        lines.append("#EXTINF:4.000,")
+        lines.append(f"segment-{i}.ts?token=abcdef0123456789")
+    lines.append("#EXT-X-ENDLIST")
+    return "\n".join(lines) + "\n"
+
+def syntheticMasterPlaylist(variants:int = 2000) -> str:
+    """Returns master playlist with ``variants`` variant streams"""
+    lines:list[str] = ["#EXTM3U", "#EXT-X-MEDIA:TYPE=AUDIO,GROUP-ID=\"aac\",NAME=\"Čeština\",LANGUAGE=\"cs\",DEFAULT=YES,URI=\"audio.m3u8\""]
+    for i in range(variants):
+        lines.append(f"#EXT-X-STREAM-INF:BANDWIDTH={100000 + i},RESOLUTION={640 + i}x360,CODECS=\"avc1.4d401e,mp4a.40.2\",AUDIO=\"aac\"")
+        lines.append(f"variant-{i}/index.m3u8")
+    return "\n".join(lines) + "\n"
+
+@app.command()
+def playlist(segments:Annotated[int, typer.Option(
+            "-s", "--segments",
+            help="Počet segmentů syntetického playlistu", show_default=True)]
+            = 100_000,
+          variants:Annotated[int, typer.Option(
+            "-v", "--variants",
+            help="Počet streamů syntetického master playlistu", show_default=True)]
+            = 2000,
+          repeat:Annotated[int, typer.Option(
+            "-r", "--repeat",
+            help="Počet opakování", show_default=True)]
+            = 3
+            ):
+   """Measures parsing of large media and master playlists"""
+   media:str = syntheticMediaPlaylist(segments)
+   master:str = syntheticMasterPlaylist(variants)
+   base_url:str = "https://example.com/stream/index.m3u8"
+   t:PrettyTable = PrettyTable()
+   t.field_names = ["Playlist", "Velikost", "Položek", "Čas", "Položek/s", "Paměť"]
+   t.align = "l"
+   media_time, media_memory = measure(lambda: parseMedia(media, base_url), repeat)
+   master_time, master_memory = measure(lambda: parseMaster(master, base_url), repeat)
+   for playlist_name, text, items, parse_time, memory in (("media", media, segments, media_time, media_memory),
+                                                          ("master", master, variants, master_time, master_memory)):
+      t.add_row([playlist_name, f"{len(text)/1_000_000:.2f} MB", items, f"{parse_time*1000:.1f} ms",
+                 f"{items/parse_time:,.0f}", f"{memory/1_000_000:.1f} MB"])
+   print(t)
+
+@app.command()
+def decrypt(segments:Annotated[int, typer.Option(
+            "-s", "--segments",
+            help="Počet zašifrovaných segmentů", show_default=True)]
+            = 64,
+          size:Annotated[int, typer.Option(
+            "--size",
+            help="Velikost segmentu v bajtech", show_default=True)]
+            = 2_000_000,
+          workers:Annotated[int, typer.Option(
+            "-w", "--workers",
+            help="Počet vláken nebo procesů", show_default=False)]
+            = None
+            ):
+   """Compares serial AES-128 decryption with the thread and process pool of ``SegmentDecryptor``"""
+   key:bytes = os.urandom(16)
+   fixtures:list[tuple[Segment, bytes]] = []
+   for i in range(segments):
+      segment:Segment = Segment(f"segment-{i}.ts", 4.0, i, key=Key("AES-128", "key.bin"))
+      fixtures.append((segment, encryptAES128(os.urandom(size), key, segmentIV(segment))))
+   async def fetchKey(url:str) -> bytes:
+      return key
+   async def pool(processes:bool) -> None:
+      decryptor:SegmentDecryptor = SegmentDecryptor(fetchKey, workers=workers, processes=processes)
+      try:
+         await asyncio.gather(*(decryptor.decrypt(segment, data) for segment, data in fixtures))
+      finally:
+         decryptor.close()
+   t:PrettyTable = PrettyTable()
+   t.field_names = ["Způsob", "Čas", "MB/s"]
+   t.align = "l"
+   for method, function in (("sériově", lambda: [decryptAES128(data, key, segmentIV(segment)) for segment, data in fixtures]),
+                            ("vlákna", lambda: asyncio.run(pool(False))),
+                            ("procesy", lambda: asyncio.run(pool(True)))):
+      start:float = time.perf_counter()
+      function()
+      elapsed:float = time.perf_counter() - start
+      t.add_row([method, f"{elapsed*1000:.0f} ms", f"{segments*size/elapsed/1_000_000:.1f}"])
+   print(t)
+
+def serveStandIn(port:int, options:dict) -> None:
+    """Runs stand-in on ``port``, target of the stand-in process"""
+    web.run_app(StandIn(port=port, **options).makeApp(), host="127.0.0.1", port=port, print=None)
+
+@contextmanager
+def runningStandIn(**options) -> Iterator[str]:
+    """Runs stand-in in separate process, so it does not share CPU with measured code, and yields its base url"""
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port:int = s.getsockname()[1]
+    process:multiprocessing.Process = multiprocessing.Process(target=serveStandIn, args=(port, options), daemon=True)
+    process.start()
+    url:str = f"http://127.0.0.1:{port}/"
+    try:
+        for _ in range(100):
+            try:
+                requests.get(url + "stats", timeout=1)
+                break
+            except requests.ConnectionError:
+                if not process.is_alive():
+                    raise RuntimeError("Stand-in se nepodařilo spustit.")
+                time.sleep(0.05)
+        yield url
+    finally:
+        process.terminate()
+        process.join()
+
+class PeakRss:
+    """Samples resident memory of this process in background thread and keeps its peak"""
+
+    def __init__(self, interval:float = 0.005) -> None:
+        """Initializes ``PeakRss`` class"""
+        self.interval:float = interval
+        self.peak:int | None = None
+        self._stop:threading.Event = threading.Event()
+        self._thread:threading.Thread = threading.Thread(target=self._sample, daemon=True)
+
+    def __enter__(self) -> "PeakRss":
+        """Starts sampling"""
+        self._thread.start()
+        return self
+
+    def __exit__(self, *_) -> None:
+        """Stops sampling"""
+        self._stop.set()
+        self._thread.join()
+
+    def _sample(self) -> None:
+        """Reads current resident memory until stopped, falls back to peak of the whole process without ``/proc``
+        - on platforms without ``/proc`` and ``resource`` (Windows) the peak stays ``None``"""
+        while not self._stop.is_set():
+            rss:int | None = self._current()
+            if rss is None:
+                return
+            self.peak = max(self.peak or 0, rss)
+            self._stop.wait(self.interval)
+
+    def _current(self) -> int | None:
+        """Returns current resident memory in bytes (or peak of the whole process), ``None`` if it can't be measured"""
+        try:
+            with open("/proc/self/statm") as f:
+                return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        except OSError:
+            pass
+        try:
+            import resource
+        except ImportError:
+            return None
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+def standInDownloaders(url:str) -> tuple[type[CT], type[CT_Gold]]:
+    """Returns CT and CT Gold downloaders pointed to the stand-in at ``url``"""
+    class StandInCT(CT):
+        VALID_URLS = [url]
+        PLAYLIST_API = url + "ivysilani/ajax/get-client-playlist/"
+    class StandInCTGold(CT_Gold):
+        VALID_URLS = [url]
+        PLAYLIST_API = url + "ivysilani/ajax/get-client-playlist/"
+    return StandInCT, StandInCTGold
+
+def downloadEngines(url:str, directory:str) -> dict[str, Callable[[], str]]:
+    """Returns download engines to measure, each downloads the stand-in stream into ``directory``"""
+    ct, ct_gold = standInDownloaders(url)
+    def m3u8(name:str) -> M3U8:
+        return M3U8(url + "hls/master.m3u8", directory, name)
+    def sync() -> str:
+        video:M3U8 = m3u8("sync")
+        return video.download(video.get_best_stream())
+    def asynchronous() -> str:
+        video:M3U8 = m3u8("async")
+        return video._finish(asyncio.run(video.asyncDownload(video.get_best_stream())))
+    return {"M3U8.download": sync,
+            "M3U8.asyncDownload": asynchronous,
+            "CT": lambda: ct(url + "video/224562210010001/", directory).download(convert=False, resume=False),
+            "CT Gold": lambda: ct_gold(url + "zlata/12345/", directory).download(convert=False, resume=False)}
+
+@app.command()
+def download(segments:Annotated[int, typer.Option(
+            "-s", "--segments",
+            help="Počet segmentů", show_default=True)]
+            = 100,
+          segment_size:Annotated[int, typer.Option(
+            "--segment-size",
+            help="Velikost segmentu v bajtech", show_default=True)]
+            = 1_000_000,
+          latency:Annotated[float, typer.Option(
+            "--latency",
+            help="Zpoždění každé odpovědi v sekundách", show_default=True)]
+            = 0.02,
+          bandwidth:Annotated[int, typer.Option(
+            "--bandwidth",
+            help="Rychlost každé odpovědi v bajtech za sekundu", show_default=False)]
+            = None,
+          error_rate:Annotated[float, typer.Option(
+            "--error-rate",
+            help="Podíl požadavků na segmenty, které selžou s chybou 503", show_default=True)]
+            = 0.0,
+          engine:Annotated[list[str], typer.Option(
+            "-e", "--engine",
+            help="Měřený způsob stahování (lze opakovat), bez něj se měří všechny", show_default=False)]
+            = None
+            ):
+   """Measures download engines against local HLS stand-in"""
+   t:PrettyTable = PrettyTable()
+   t.field_names = ["Způsob", "Čas", "Segmentů/s", "MB/s", "TTFB", "Max. RSS", "Požadavků", "Chyb"]
+   t.align = "l"
+   with runningStandIn(segments=segments, segmentSize=segment_size, latency=latency, bandwidth=bandwidth, errorRate=error_rate) as url, \
+        tempfile.TemporaryDirectory() as directory:
+      engines:dict[str, Callable[[], str]] = downloadEngines(url, directory)
+      for name, function in engines.items():
+         if engine and name not in engine:
+            continue
+         requests.get(url + "stats?reset")
+         start:float = time.time()
+         with PeakRss() as rss:
+            try:
+               path:str = function()
+               result:str = ""
+            except Exception as e:
+               path, result = "", f" (chyba: {e})"
+         elapsed:float = time.time() - start
+         stats:dict = requests.get(url + "stats?reset").json()
+         size:int = os.path.getsize(path) if path != "" and os.path.exists(path) else 0
+         ttfb:str = f"{(stats['first_segment'] - start)*1000:.0f} ms" if stats["first_segment"] is not None else ""
+         t.add_row([name + result, f"{elapsed:.2f} s", f"{segments/elapsed:.1f}", f"{size/elapsed/1_000_000:.1f}",
+                    ttfb, f"{rss.peak/1_000_000:.0f} MB" if rss.peak is not None else "?", stats["requests"], stats["errors"]])
+   print(t)
+
+@app.command()
+def subtitles(hours:Annotated[float, typer.Option(
+            "--hours",
+            help="Délka syntetických titulků v hodinách", show_default=True)]
+            = 4.0,
+          tracks:Annotated[int, typer.Option(
+            "-t", "--tracks",
+            help="Počet stahovaných stop titulků", show_default=True)]
+            = 4,
+          latency:Annotated[float, typer.Option(
+            "--latency",
+            help="Zpoždění každé odpovědi v sekundách", show_default=True)]
+            = 0.1,
+          fixtures:Annotated[str, typer.Option(
+            "-f", "--fixtures",
+            help="Složka s uloženými titulky (*.txt)", show_default=False)]
+            = None,
+          repeat:Annotated[int, typer.Option(
+            "-r", "--repeat",
+            help="Počet opakování", show_default=True)]
+            = 3
+            ):
+   """Measures TXT → SRT conversion and concurrent download of subtitle tracks"""
+   sources:dict[str, str] = {}
+   if fixtures is not None:
+      for file in sorted(os.listdir(fixtures)):
+         if file.endswith(".txt"):
+            with open(os.path.join(fixtures, file), encoding="utf-8") as f:
+               sources[file] = f.read()
+   else:
+      sources[f"synthetic {hours:g} h"] = syntheticSubtitles(hours)
+   t:PrettyTable = PrettyTable()
+   t.field_names = ["Titulky", "Velikost", "Způsob", "Čas", "MB/s", "Paměť"]
+   t.align = "l"
+   with tempfile.TemporaryDirectory() as directory:
+      for source_name, text in sources.items():
+         lines:list[str] = text.split("\n")
+         path:str = os.path.join(directory, "out.srt")
+         def stream() -> None:
+            with open(path, "w", encoding="utf-8") as f:
+               f.writelines(txtToSrt(lines))
+         for method, function in (("do paměti", lambda: "".join(txtToSrt(lines))), ("do souboru", stream)):
+            elapsed, memory = measure(function, repeat)
+            t.add_row([source_name, f"{len(text)/1_000_000:.2f} MB", method, f"{elapsed*1000:.1f} ms",
+                       f"{len(text)/elapsed/1_000_000:.1f}", f"{memory/1_000_000:.1f} MB"])
+      with runningStandIn(subtitleTracks=tracks, subtitleHours=hours, latency=latency) as url:
+         track_urls:list[tuple[str, str]] = [(f"Titulky {track}", f"{url}subtitles/{track}.txt") for track in range(tracks)]
+         def sequential() -> None:
+            with requests.Session() as session:
+               for track_name, track_url in track_urls:
+                  with open(os.path.join(directory, f"{track_name}.srt"), "w", encoding="utf-8") as f:
+                     f.writelines(txtToSrt(line.decode() for line in session.get(track_url, stream=True).iter_lines()))
+         async def concurrent() -> None:
+            async with ClientSession() as session:
+               await asyncDownloadSubtitles(track_urls, directory, "video", session)
+         for method, function in (("stopy postupně", sequential), ("stopy souběžně", lambda: asyncio.run(concurrent()))):
+            start:float = time.perf_counter()
+            function()
+            elapsed:float = time.perf_counter() - start
+            t.add_row([f"stand-in {tracks}× {hours:g} h", "", method, f"{elapsed*1000:.1f} ms", "", ""])
+   print(t)
+
+@app.command()
+def resolve(urls:Annotated[int, typer.Option(
+            "-u", "--urls",
+            help="Počet řešených url adres", show_default=True)]
+            = 200,
+          latency:Annotated[float, typer.Option(
+            "--latency",
+            help="Zpoždění každé odpovědi v sekundách", show_default=True)]
+            = 0.05,
+          max_resolves:Annotated[int, typer.Option(
+            "--max-resolves",
+            help="Nejvíce současně řešených url adres", show_default=True)]
+            = 64
+            ):
+   """Measures resolution of video metadata (page, ID, playlist info, master playlist), blocking chain vs one asyncio session"""
+   t:PrettyTable = PrettyTable()
+   t.field_names = ["Způsob", "Url", "Čas", "Na url", "Url/s", "Požadavků"]
+   t.align = "l"
+   with runningStandIn(latency=latency) as url, tempfile.TemporaryDirectory() as directory:
+      ct, ct_gold = standInDownloaders(url)
+      pages:list[str] = [url + (f"video/{100000 + i}/" if i % 2 == 0 else f"zlata/{10000 + i}/") for i in range(urls)]
+      def downloader(page:str) -> CT:
+         return (ct if "/video/" in page else ct_gold)(page, directory)
+      def blocking() -> None:
+         for page in pages[:max(1, urls // 10)]:
+            video:CT = downloader(page)
+            video.name
+            video.streams
+      async def concurrent() -> None:
+         resolving:asyncio.Semaphore = asyncio.Semaphore(max_resolves)
+         async def one(page:str) -> None:
+            async with resolving:
+               await downloader(page).resolve(session=session)
+         async with pooledSession() as session:
+            await asyncio.gather(*(one(page) for page in pages))
+      for method, count, function in (("requests postupně", max(1, urls // 10), blocking),
+                                      ("asyncio, jedna session", urls, lambda: asyncio.run(concurrent()))):
+         requests.get(url + "stats?reset")
+         start:float = time.perf_counter()
+         with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+            function()
+         elapsed:float = time.perf_counter() - start
+         stats:dict = requests.get(url + "stats?reset").json()
+         t.add_row([method, count, f"{elapsed:.2f} s", f"{elapsed/count*1000:.0f} ms", f"{count/elapsed:.1f}", stats["requests"]])
+   print(t)
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,77 @@
+"""Cache module"""
+import os
+import re
+import sqlite3
+import threading
+import time
+
+class MetadataCache:
+    """Persistent cache of metadata resolution
+    - stores url → ID, ID → playlist info and playlist url → master playlist
+    - entries expire with the signed urls they contain, least recently used are evicted"""
+
+    DEFAULT_DIRECTORY:str = os.path.join(os.path.expanduser("~"), ".cache", "ct_downloader")
+    EXPIRY_PATTERN:re.Pattern = re.compile(r"(?:^|[?&~;/,_=])(?:exp|expires|expiry|e)=(\d{9,11})(?!\d)", re.IGNORECASE)
+    EXPIRY_MARGIN:float = 60.0
+
+    def __init__(self, directory:str | None = None, ttl:float = 3600.0, maxEntries:int = 10_000) -> None:
+        """Initializes ``MetadataCache`` class
+        - ``ttl`` is used for entries without expiring url"""
+        self.directory:str = directory if directory is not None else self.DEFAULT_DIRECTORY
+        self.ttl:float = ttl
+        self.maxEntries:int = maxEntries
+        self._lock:threading.Lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+        self._connection:sqlite3.Connection = sqlite3.connect(os.path.join(self.directory, "metadata.sqlite"), check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.execute("""CREATE TABLE IF NOT EXISTS entries (
+                                        kind TEXT NOT NULL,
+                                        key TEXT NOT NULL,
+                                        value TEXT NOT NULL,
+                                        expires REAL NOT NULL,
+                                        accessed REAL NOT NULL,
+                                        PRIMARY KEY (kind, key))""")
+            self._connection.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)")
+            self._connection.execute("DELETE FROM entries WHERE expires <= ?", (time.time(),))
+
+    def get(self, kind:str, key:str) -> str | None:
+        """Returns cached value or ``None`` if it is missing or expired"""
+        now:float = time.time()
+        with self._lock, self._connection:
+            row = self._connection.execute("SELECT value FROM entries WHERE kind = ? AND key = ? AND expires > ?",
+                                           (kind, key, now)).fetchone()
+            if row is None:
+                return None
+            self._connection.execute("UPDATE entries SET accessed = ? WHERE kind = ? AND key = ?", (now, kind, key))
+        return row[0]
+
+    def set(self, kind:str, key:str, value:str, ttl:float | None = None, signed:str = "") -> None:
+        """Stores value for ``ttl`` seconds but not past the earliest url expiry found in it or in ``signed``"""
+        now:float = time.time()
+        expires:float = now + (ttl if ttl is not None else self.ttl)
+        url_expiry:float | None = self.expiryOf(value + "\n" + signed)
+        if url_expiry is not None:
+            expires = min(expires, url_expiry - self.EXPIRY_MARGIN)
+        if expires <= now:
+            return
+        with self._lock, self._connection:
+            self._connection.execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?)", (kind, key, value, expires, now))
+            self._connection.execute("""DELETE FROM entries WHERE rowid IN (
+                                        SELECT rowid FROM entries ORDER BY accessed DESC LIMIT -1 OFFSET ?)""",
+                                     (self.maxEntries,))
+
+    def clear(self) -> None:
+        """Removes all entries"""
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM entries")
+
+    def close(self) -> None:
+        """Closes the cache database"""
+        self._connection.close()
+
+    def expiryOf(self, value:str) -> float | None:
+        """Returns earliest expiry timestamp of signed urls in ``value``"""
+        expiries:list[int] = [int(match) for match in self.EXPIRY_PATTERN.findall(value)]
+        if len(expiries) == 0:
+            return None
+        return float(min(expiries))
@@ -0,0 +1,261 @@
+"""Concurrency module"""
+import asyncio
+import heapq
+import itertools
+import random
+import re
+import time
+from collections import deque
+from datetime import datetime
+from aiohttp import ClientSession, TCPConnector
+
+class AdaptiveLimiter:
+    """Adaptive limit of concurrent requests
+    - additive increase: limit grows by one per round of successful requests
+    - multiplicative decrease: limit is cut by ``backoff`` on errors, throttling (429/503)
+      or when latency rises over ``latency_tolerance`` × the best latency seen"""
+
+    def __init__(self, initial:int = 4, minimum:int = 1, maximum:int = 32, backoff:float = 0.5,
+                 latency_tolerance:float = 2.0, window:float = 5.0) -> None:
+        """Initializes ``AdaptiveLimiter`` class
+        - ``window`` is the time in seconds over which throughput is measured"""
+        self.minimum:int = minimum
+        self.maximum:int = maximum
+        self.backoff:float = backoff
+        self.latency_tolerance:float = latency_tolerance
+        self.window:float = window
+        self.in_flight:int = 0
+        self.errors:int = 0
+        self._limit:float = float(min(max(initial, minimum), maximum))
+        self._min_latency:float | None = None
+        self._latency:float | None = None
+        self._last_decrease:float = 0.0
+        self._samples:deque[tuple[float, int]] = deque()
+        self._condition:asyncio.Condition | None = None
+
+    @property
+    def limit(self) -> int:
+        """Current number of allowed concurrent requests"""
+        return int(self._limit)
+
+    @property
+    def throughput(self) -> float:
+        """Bytes per second received over the last ``window`` seconds"""
+        self._trim(time.monotonic())
+        if len(self._samples) == 0:
+            return 0.0
+        return sum(size for _, size in self._samples) / self.window
+
+    @property
+    def latency(self) -> float | None:
+        """Smoothed latency of requests in seconds"""
+        return self._latency
+
+    async def acquire(self) -> float:
+        """Waits for free slot and returns start time of the request"""
+        condition:asyncio.Condition = self._getCondition()
+        async with condition:
+            await condition.wait_for(lambda: self.in_flight < self.limit)
+            self.in_flight += 1
+        return time.monotonic()
+
+    async def release(self, start:float, size:int = 0, error:bool = False, throttled:bool = False) -> None:
+        """Frees slot and adapts the limit to the outcome of the request"""
+        now:float = time.monotonic()
+        if error or throttled:
+            self.errors += 1
+            self._decrease(now)
+        else:
+            self._record(now, now - start, size)
+        condition:asyncio.Condition = self._getCondition()
+        async with condition:
+            self.in_flight -= 1
+            condition.notify_all()
+
+    def _record(self, now:float, latency:float, size:int) -> None:
+        """Records successful request and grows the limit unless latency rises"""
+        self._samples.append((now, size))
+        self._trim(now)
+        self._min_latency = latency if self._min_latency is None else min(self._min_latency, latency)
+        self._latency = latency if self._latency is None else 0.8*self._latency + 0.2*latency
+        if self._latency > self.latency_tolerance * max(self._min_latency, 0.001):
+            self._decrease(now)
+        else:
+            self._limit = min(float(self.maximum), self._limit + 1/self._limit)
+
+    def _decrease(self, now:float) -> None:
+        """Cuts the limit, at most once per smoothed latency so one burst of errors counts once"""
+        if now - self._last_decrease < (self._latency or 0.0):
+            return
+        self._last_decrease = now
+        self._limit = max(float(self.minimum), self._limit * self.backoff)
+        if self._latency is not None and self._min_latency is not None:
+            self._min_latency = min(self._min_latency * 1.1, self._latency)
+
+    def _trim(self, now:float) -> None:
+        """Forgets throughput samples older than ``window``"""
+        while len(self._samples) > 0 and self._samples[0][0] < now - self.window:
+            self._samples.popleft()
+
+    def _getCondition(self) -> asyncio.Condition:
+        """Returns condition bound to the running event loop"""
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        return self._condition
+
+def backoffDelay(tries:int, base:float = 0.5, cap:float = 30.0) -> float:
+    """Returns jittered exponential backoff delay in seconds for ``tries``-th retry"""
+    return random.uniform(0, min(cap, base * 2**tries))
+
+def pooledSession(maxConnections:int = 32, maxConnectionsPerHost:int = 16, dnsCache:float = 300.0,
+                  keepAlive:float = 30.0) -> ClientSession:
+    """Returns aiohttp session whose requests share one connection pool
+    - idle connections are kept alive for ``keepAlive`` seconds and DNS answers are cached for ``dnsCache`` seconds
+    - has to be called inside running event loop"""
+    connector:TCPConnector = TCPConnector(limit=maxConnections, limit_per_host=maxConnectionsPerHost,
+                                          ttl_dns_cache=dnsCache, keepalive_timeout=keepAlive)
+    return ClientSession(connector=connector)
+
+class RateSchedule:
+    """Rate limit changing with time of day
+    - ``periods`` are (start, end, rate) with start and end in minutes after midnight, a period may cross midnight
+    - rate is in bytes per second, ``None`` or time outside of all periods means unlimited"""
+
+    PERIOD_PATTERN:re.Pattern = re.compile(r"^(\d{1,2}):(\d{2})-(\d{1,2}):(\d{2})=(.+)$")
+
+    def __init__(self, periods:list[tuple[int, int, float | None]]) -> None:
+        """Initializes ``RateSchedule`` class"""
+        self.periods:list[tuple[int, int, float | None]] = periods
+
+    def rate(self, now:datetime | None = None) -> float | None:
+        """Returns rate limit valid at ``now`` (current local time by default)"""
+        now = now if now is not None else datetime.now()
+        minute:int = now.hour*60 + now.minute
+        for start, end, rate in self.periods:
+            if start <= minute < end or (end <= start and (minute >= start or minute < end)):
+                return rate
+        return None
+
+    @classmethod
+    def parse(cls, text:str) -> "RateSchedule":
+        """Parses schedule like ``08:00-18:00=2M,18:00-08:00=max``"""
+        periods:list[tuple[int, int, float | None]] = []
+        for part in text.split(","):
+            match:re.Match | None = cls.PERIOD_PATTERN.match(part.strip())
+            if match is None:
+                raise ValueError(f"Neplatný úsek rozvrhu rychlosti: {part.strip()}")
+            start_hour, start_minute, end_hour, end_minute = (int(group) for group in match.groups()[:4])
+            if start_hour > 24 or end_hour > 24 or start_minute > 59 or end_minute > 59:
+                raise ValueError(f"Neplatný čas v rozvrhu rychlosti: {part.strip()}")
+            periods.append(((start_hour*60 + start_minute) % 1440, (end_hour*60 + end_minute) % 1440, parseRate(match.group(5))))
+        return cls(periods)
+
+def parseRate(text:str | None) -> float | RateSchedule | None:
+    """Parses rate limit in bytes per second (``500k``, ``2M``, ``1G``) or time-of-day schedule of them
+    - empty text or ``max`` means unlimited"""
+    if text is None or text.strip().lower() in ("", "max"):
+        return None
+    text = text.strip()
+    if "=" in text:
+        return RateSchedule.parse(text)
+    units:dict[str, int] = {"k": 1_000, "m": 1_000_000, "g": 1_000_000_000}
+    number, unit = (text[:-1], units[text[-1].lower()]) if text[-1].lower() in units else (text, 1)
+    try:
+        rate:float = float(number) * unit
+    except ValueError:
+        raise ValueError(f"Neplatný limit rychlosti: {text}")
+    if rate <= 0:
+        raise ValueError(f"Limit rychlosti musí být kladný: {text}")
+    return rate
+
+class TokenBucket:
+    """Token bucket limiting throughput to ``rate`` bytes per second
+    - ``rate`` can be ``RateSchedule``, ``None`` means unlimited
+    - tokens are taken at once and the consumer waits until its debt is paid, so concurrent consumers share the rate
+    - at most ``burst`` seconds of unused rate are saved"""
+
+    def __init__(self, rate:float | RateSchedule | None, burst:float = 0.25) -> None:
+        """Initializes ``TokenBucket`` class"""
+        self.rate:float | RateSchedule | None = rate
+        self.burst:float = burst
+        self._tokens:float = 0.0
+        self._updated:float = time.monotonic()
+
+    def currentRate(self) -> float | None:
+        """Returns rate limit valid now"""
+        return self.rate.rate() if isinstance(self.rate, RateSchedule) else self.rate
+
+    async def consume(self, amount:int) -> None:
+        """Takes ``amount`` bytes worth of tokens, waits if there are not enough of them"""
+        now:float = time.monotonic()
+        rate:float | None = self.currentRate()
+        if rate is None:
+            self._tokens = 0.0
+            self._updated = now
+            return
+        self._tokens = min(self._tokens + (now - self._updated)*rate, rate*self.burst) - amount
+        self._updated = now
+        if self._tokens < 0:
+            await asyncio.sleep(-self._tokens / rate)
+
+class BandwidthShare:
+    """Share of ``BandwidthLimiter`` used by one job, all requests of the job consume from it"""
+
+    def __init__(self, limiter:"BandwidthLimiter", weight:float, rate:float | RateSchedule | None) -> None:
+        """Initializes ``BandwidthShare`` class
+        - ``rate`` caps the job on its own"""
+        self.limiter:BandwidthLimiter = limiter
+        self.weight:float = weight
+        self.bucket:TokenBucket = TokenBucket(rate)
+        self.finish:float = 0.0
+
+    async def consume(self, amount:int) -> float:
+        """Waits until ``amount`` bytes fit into the job's rate and its fair part of the global rate
+        - returns seconds spent waiting, so they are not mistaken for latency of the request"""
+        start:float = time.monotonic()
+        await self.bucket.consume(amount)
+        await self.limiter.consume(self, amount)
+        return time.monotonic() - start
+
+class BandwidthLimiter:
+    """Global bandwidth limit shared by concurrent jobs
+    - the global token bucket is handed out by weighted fair queueing: every chunk gets virtual finish time
+      ``max(virtual time, job's last finish) + size / weight`` and chunks are served in its order,
+      so a job with many requests in flight can't starve jobs with few of them
+    - ``jobRate`` caps every job on its own"""
+
+    def __init__(self, rate:float | RateSchedule | None = None, jobRate:float | RateSchedule | None = None) -> None:
+        """Initializes ``BandwidthLimiter`` class"""
+        self.bucket:TokenBucket = TokenBucket(rate)
+        self.jobRate:float | RateSchedule | None = jobRate
+        self._virtual:float = 0.0
+        self._waiting:list[tuple[float, int, int, asyncio.Future]] = []
+        self._sequence = itertools.count()
+        self._server:asyncio.Task | None = None
+
+    def share(self, weight:float = 1.0, rate:float | RateSchedule | None = None) -> BandwidthShare:
+        """Returns share of a new job, ``rate`` overrides ``jobRate``"""
+        return BandwidthShare(self, weight, rate if rate is not None else self.jobRate)
+
+    async def consume(self, share:BandwidthShare, amount:int) -> None:
+        """Waits for the turn of ``amount`` bytes of ``share`` in the global rate"""
+        if len(self._waiting) == 0 and self.bucket.currentRate() is None:
+            return
+        share.finish = max(self._virtual, share.finish) + amount / share.weight
+        future:asyncio.Future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiting, (share.finish, next(self._sequence), amount, future))
+        if self._server is None or self._server.done() or self._server.get_loop() is not asyncio.get_running_loop():
+            self._server = asyncio.create_task(self._serve())
+        await future
+
+    async def _serve(self) -> None:
+        """Serves waiting chunks in order of their virtual finish times
+        - chunk is let through first and its tokens are paid before the next one, so a job with a single request
+          in flight is already waiting again when the next chunk is chosen"""
+        while len(self._waiting) > 0:
+            finish, _, amount, future = heapq.heappop(self._waiting)
+            if future.done():
+                continue
+            self._virtual = finish
+            future.set_result(None)
+            await self.bucket.consume(amount)
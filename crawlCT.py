@@ -0,0 +1,106 @@
+"""Crawler module"""
+import asyncio
+import re
+from typing import AsyncIterator
+from urllib.parse import parse_qs, urljoin, urlsplit, urlunsplit
+from aiohttp import ClientSession
+from bs4 import BeautifulSoup, SoupStrainer
+from downloadCT import CT_Error
+
+class ShowCrawler:
+    """Show crawler
+    - expands show or listing page on ČT into urls of all its episodes
+    - follows pagination and yields episodes as soon as they are found
+    - page that can't be downloaded is skipped, episodes of other pages are still yielded"""
+
+    EPISODE_PATTERN:re.Pattern = re.compile(r"^/porady/[^/]+/\d+[^/]*/?$")
+    LISTING_PATTERN:re.Pattern = re.compile(r"/dily(/|$)")
+    PAGE_PARAMS:tuple[str, ...] = ("page", "strana", "stranka")
+
+    def __init__(self, url:str, maxPages:int = 200, maxRequestsAtTime:int = 4, session:ClientSession | None = None) -> None:
+        """Initializes ``ShowCrawler`` class"""
+        self.url:str = url
+        self.maxPages:int = maxPages
+        self.maxRequestsAtTime:int = maxRequestsAtTime
+        self.session:ClientSession | None = session
+        self.show_prefix:str | None = self._getShowPrefix(url)
+
+    async def crawl(self) -> AsyncIterator[str]:
+        """Yields url of every episode of the show"""
+        own_session:bool = self.session is None
+        session:ClientSession = ClientSession() if own_session else self.session
+        semaphore:asyncio.Semaphore = asyncio.Semaphore(self.maxRequestsAtTime)
+        seen_pages:set[str] = {self._normalize(self.url)}
+        seen_episodes:set[str] = set()
+        pending:set[asyncio.Task] = {asyncio.create_task(self._getPage(self.url, session, semaphore))}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    try:
+                        page_url, html = task.result()
+                    except CT_Error as e:
+                        print(f"{e} Stránku přeskakuji. {e.details}")
+                        continue
+                    episodes, pages = self._parsePage(page_url, html)
+                    for page in pages:
+                        if page not in seen_pages and len(seen_pages) < self.maxPages:
+                            seen_pages.add(page)
+                            pending.add(asyncio.create_task(self._getPage(page, session, semaphore)))
+                    for episode in episodes:
+                        if episode not in seen_episodes:
+                            seen_episodes.add(episode)
+                            yield episode
+        finally:
+            for task in pending:
+                task.cancel()
+            if own_session:
+                await session.close()
+
+    async def _getPage(self, url:str, session:ClientSession, semaphore:asyncio.Semaphore) -> tuple[str, str]:
+        """Downloads one listing page"""
+        async with semaphore:
+            try:
+                async with session.get(url) as response:
+                    if response.status != 200:
+                        raise CT_Error("Nemohl jsem se dostat na stránku pořadu.", f"{url} {response.status}")
+                    return url, await response.text()
+            except CT_Error:
+                raise
+            except Exception as e:
+                raise CT_Error("Stahování stránky pořadu selhalo.", e)
+
+    def _parsePage(self, page_url:str, html:str) -> tuple[list[str], list[str]]:
+        """Returns episode urls and listing page urls linked from the page"""
+        episodes:list[str] = []
+        pages:list[str] = []
+        soup:BeautifulSoup = BeautifulSoup(html, "html.parser", parse_only=SoupStrainer(["a", "link"]))
+        for tag in soup.find_all(["a", "link"], href=True):
+            url:str = self._normalize(urljoin(page_url, tag["href"]))
+            parts = urlsplit(url)
+            if parts.netloc != urlsplit(page_url).netloc:
+                continue
+            if self.show_prefix is not None and not parts.path.startswith(self.show_prefix):
+                continue
+            if self.EPISODE_PATTERN.match(parts.path) and not self.LISTING_PATTERN.search(parts.path):
+                episodes.append(urlunsplit((parts.scheme, parts.netloc, parts.path, "", "")))
+            elif "next" in tag.get("rel", []) or self._isListing(parts.path, parts.query):
+                pages.append(url)
+        return episodes, pages
+
+    def _isListing(self, path:str, query:str) -> bool:
+        """Checks if the link points to a listing page of the show"""
+        params:dict = parse_qs(query)
+        return self.LISTING_PATTERN.search(path) is not None or any(param in params for param in self.PAGE_PARAMS)
+
+    def _getShowPrefix(self, url:str) -> str | None:
+        """Returns ``/porady/<show>/`` path of the show or ``None`` if url is not a show page"""
+        path_parts:list[str] = urlsplit(url).path.split("/")
+        if len(path_parts) > 2 and path_parts[1] == "porady" and path_parts[2] != "":
+            return f"/porady/{path_parts[2]}/"
+        return None
+
+    def _normalize(self, url:str) -> str:
+        """Removes fragment from url"""
+        parts = urlsplit(url)
+        return urlunsplit((parts.scheme, parts.netloc, parts.path, parts.query, ""))
@@ -0,0 +1,111 @@
+"""Segment decryption module"""
+import asyncio
+import os
+import shutil
+import subprocess
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Awaitable, Callable
+from parseM3u8 import Segment
+try:
+    from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+except ImportError:
+    Cipher = None
+
+class Decryption_Error(Exception):
+    """Decryption error"""
+    def __init__(self, message:str, details:str | None = None) -> None:
+        """Initializies ``Decryption_Error`` class"""
+        super().__init__(message)
+        self.details:str | None = details
+
+def segmentIV(segment:Segment) -> bytes:
+    """Returns IV of the segment, the one from ``#EXT-X-KEY`` or media sequence number as 16 byte big-endian"""
+    if segment.key is not None and segment.key.iv is not None:
+        return segment.key.iv
+    return segment.sequence.to_bytes(16, "big")
+
+MISSING_BACKEND:str = "Pro dešifrování segmentů je potřeba balíček cryptography."
+
+def decryptAES128(data:bytes, key:bytes, iv:bytes, openssl:str = "openssl") -> bytes:
+    """Decrypts AES-128-CBC data and removes PKCS#7 padding
+    - uses ``cryptography`` package if it is installed, ``openssl`` command otherwise
+    - raises ``Decryption_Error`` asking to install ``cryptography`` if neither of them is available"""
+    if Cipher is not None:
+        decryptor = Cipher(algorithms.AES(key), modes.CBC(iv)).decryptor()
+        plain:bytes = decryptor.update(bytes(data)) + decryptor.finalize()
+        padding:int = plain[-1] if len(plain) > 0 else 0
+        if not 0 < padding <= 16 or plain[-padding:] != bytes([padding]) * padding:
+            raise Decryption_Error("Segment nemá platné zarovnání, klíč nebo IV je nejspíš špatně.")
+        return plain[:-padding]
+    return _openssl([openssl, "enc", "-d", "-aes-128-cbc", "-K", key.hex(), "-iv", iv.hex()], data)
+
+def encryptAES128(data:bytes, key:bytes, iv:bytes, openssl:str = "openssl") -> bytes:
+    """Encrypts data by AES-128-CBC with PKCS#7 padding, the way HLS segments are encrypted"""
+    if Cipher is not None:
+        padding:int = 16 - len(data) % 16
+        encryptor = Cipher(algorithms.AES(key), modes.CBC(iv)).encryptor()
+        return encryptor.update(bytes(data) + bytes([padding]) * padding) + encryptor.finalize()
+    return _openssl([openssl, "enc", "-e", "-aes-128-cbc", "-K", key.hex(), "-iv", iv.hex()], data)
+
+def _openssl(command:list[str], data:bytes) -> bytes:
+    """Runs ``openssl`` with ``data`` on stdin and returns its stdout"""
+    if shutil.which(command[0]) is None:
+        raise Decryption_Error(MISSING_BACKEND, f"Nainstaluj ho příkazem pip install cryptography, příkaz {command[0]} nebyl nalezen.")
+    try:
+        return subprocess.run(command, input=data, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE).stdout
+    except subprocess.CalledProcessError as e:
+        raise Decryption_Error("Dešifrování segmentu selhalo.", e.stderr.decode(errors="replace").strip())
+    except OSError as e:
+        raise Decryption_Error(MISSING_BACKEND, f"Nainstaluj ho příkazem pip install cryptography, příkaz {command[0]} nelze spustit: {e}")
+
+class SegmentDecryptor:
+    """Decryption stage of the download pipeline
+    - keys are fetched once per key url and cached, concurrent requests for the same key share one fetch
+    - AES-128 decryption runs in a thread pool (or process pool) so the event loop keeps downloading"""
+
+    def __init__(self, fetchKey:Callable[[str], Awaitable[bytes]], workers:int | None = None, processes:bool = False) -> None:
+        """Initializes ``SegmentDecryptor`` class
+        - ``fetchKey`` downloads key from its url
+        - ``processes`` decrypts in separate processes instead of threads"""
+        self.fetchKey:Callable[[str], Awaitable[bytes]] = fetchKey
+        self.workers:int = workers if workers is not None else os.cpu_count() or 1
+        self.processes:bool = processes
+        self._keys:dict[str, asyncio.Future] = {}
+        self._executor:Executor | None = None
+
+    async def decrypt(self, segment:Segment, data:bytes) -> bytes:
+        """Returns decrypted segment, unencrypted segments are returned unchanged"""
+        if segment.key is None:
+            return data
+        if segment.key.method != "AES-128":
+            raise Decryption_Error("Nepodporovaný způsob šifrování segmentů.", segment.key.method)
+        if segment.key.url is None:
+            raise Decryption_Error("Playlist neuvádí adresu klíče.")
+        key:bytes = await self._getKey(segment.key.url)
+        return await asyncio.get_running_loop().run_in_executor(self._getExecutor(), decryptAES128, data, key, segmentIV(segment))
+
+    def close(self) -> None:
+        """Shuts down the worker pool"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def _getKey(self, url:str) -> bytes:
+        """Returns cached key, failed fetches are not cached"""
+        if url not in self._keys:
+            self._keys[url] = asyncio.ensure_future(self.fetchKey(url))
+        try:
+            key:bytes = await asyncio.shield(self._keys[url])
+        except Exception:
+            if self._keys.get(url) is not None and self._keys[url].done():
+                del self._keys[url]
+            raise
+        if len(key) != 16:
+            raise Decryption_Error("Klíč nemá 16 bajtů.", url)
+        return key
+
+    def _getExecutor(self) -> Executor:
+        """Returns worker pool, created when first segment is decrypted"""
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(self.workers) if self.processes else ThreadPoolExecutor(self.workers)
+        return self._executor
@@ -0,0 +1,507 @@
+"""Distributed download module"""
+import asyncio
+import hashlib
+import hmac
+import itertools
+import math
+import multiprocessing
+import os
+import secrets
+import shutil
+import socket
+import tempfile
+import time
+import uuid
+from collections import deque
+from contextlib import aclosing
+from typing import AsyncIterator, Awaitable, Callable
+from urllib.parse import urlsplit
+import typer
+from typing_extensions import Annotated
+from aiohttp import ClientConnectionError, ClientSession, web
+from archive import segmentsFingerprint
+from concurrency import AdaptiveLimiter, BandwidthLimiter, BandwidthShare, parseRate, pooledSession
+from downloadCT import CT, getDownloader
+from downloadM3u8 import M3U8
+from parseM3u8 import MediaPlaylist, Segment, Variant, parseMedia
+
+class Distributed_Error(Exception):
+    """Distributed download error"""
+    def __init__(self, message:str, details:str | None = None) -> None:
+        """Initializies ``Distributed_Error`` class"""
+        super().__init__(message)
+        self.details:str | None = details
+
+def resolveVideo(url:str, directory:str, name:str | None = None, downloader:Callable[..., CT] = getDownloader) -> M3U8:
+    """Returns downloader of the video stream
+    - url of ``.m3u8`` playlist is downloaded directly, other urls are resolved by ``downloader`` (CT or CT Gold page)"""
+    if urlsplit(url).path.endswith(".m3u8"):
+        return M3U8(url, directory, name if name is not None else "video")
+    return downloader(url, directory, name).video
+
+class SegmentRange:
+    """Range of segments ``first``-``end`` (exclusive) leased to a worker
+    - ``done`` is the index after the last segment the worker reported
+    - the worker may already be downloading ``ahead`` segments past ``done``, they are never stolen"""
+    __slots__ = ("id", "first", "end", "done", "worker", "ahead", "started", "updated")
+
+    def __init__(self, id:int, first:int, end:int, worker:str, ahead:int = 1) -> None:
+        """Initializes ``SegmentRange`` class"""
+        self.id:int = id
+        self.first:int = first
+        self.end:int = end
+        self.done:int = first
+        self.worker:str = worker
+        self.ahead:int = ahead
+        self.started:float = time.monotonic()
+        self.updated:float = self.started
+
+    def remainingTime(self, now:float) -> float:
+        """Estimates seconds until the worker finishes the range from its throughput since the range was leased,
+        infinite while it has not reported any segment"""
+        rate:float = (self.done - self.first) / max(now - self.started, 1e-6)
+        return (self.end - self.done) / rate if rate > 0 else math.inf
+
+class Coordinator:
+    """Coordinator of distributed download of one video
+    - splits media playlist into ranges of ``rangeSize`` segments and leases them to workers over HTTP
+    - workers report every downloaded segment, lease of a worker silent for ``leaseTimeout`` seconds is given to another one
+    - idle worker steals the second half of the range expected to finish last by observed throughput (work stealing),
+      segments the owner of the range may already be downloading stay with it
+    - workers upload ranges as chunk files with SHA-256 checksum, chunks are concatenated in playlist order
+    - every request must carry shared ``token`` in ``X-Token`` header, the coordinator listens only on localhost
+      unless ``host`` says otherwise
+
+    Endpoints:
+    - ``POST /lease``: returns range to download, 204 when there is nothing to lease yet, 410 when the download is finished,
+      the worker sends how many segments it downloads ahead
+    - ``POST /progress/{id}``: records ``done`` segments and returns current ``end`` of the range (410 if the lease was lost)
+    - ``PUT /chunk/{id}``: uploads chunk file with ``X-Checksum`` header"""
+
+    def __init__(self, video:M3U8, stream:Variant, host:str = "127.0.0.1", port:int = 8600, rangeSize:int = 25,
+                 leaseTimeout:float = 60.0, token:str | None = None) -> None:
+        """Initializes ``Coordinator`` class
+        - ``video`` gives name, directory and events of the download, ``stream`` is the downloaded variant
+        - random ``token`` is generated if none is given"""
+        self.video:M3U8 = video
+        self.stream:Variant = stream
+        self.host:str = host
+        self.port:int = port
+        self.token:str = token if token is not None else secrets.token_urlsafe(16)
+        self.rangeSize:int = rangeSize
+        self.leaseTimeout:float = leaseTimeout
+        self.base_url:str = stream.url.rsplit("/", 1)[0] + "/"
+        self.segments:list[Segment] = []
+        self.fingerprint:str | None = None
+        self.pending:deque[tuple[int, int]] = deque()
+        self.leases:dict[int, SegmentRange] = {}
+        self.chunks:dict[int, tuple[int, str]] = {}
+        self.runner:web.AppRunner | None = None
+        self._ids = itertools.count(1)
+        self._finished:asyncio.Event | None = None
+
+    @property
+    def url(self) -> str:
+        """Url on which local workers reach the coordinator"""
+        host:str = "127.0.0.1" if self.host in ("", "0.0.0.0", "::") else self.host
+        return f"http://[{host}]:{self.port}/" if ":" in host else f"http://{host}:{self.port}/"
+
+    def makeApp(self) -> web.Application:
+        """Returns aiohttp application of the coordinator"""
+        app:web.Application = web.Application(client_max_size=0, middlewares=[self._authenticate])
+        app.router.add_post("/lease", self._lease)
+        app.router.add_post("/progress/{id:\\d+}", self._progress)
+        app.router.add_put("/chunk/{id:\\d+}", self._chunk)
+        return app
+
+    def download(self, convert:bool = True, localWorkers:int = 0) -> str:
+        """Downloads the video by workers and converts it
+        - returns path of the downloaded file"""
+        return asyncio.run(self.asyncDownload(convert=convert, localWorkers=localWorkers))
+
+    async def asyncDownload(self, convert:bool = True, localWorkers:int = 0, session:ClientSession | None = None) -> str:
+        """Downloads the video by workers asynchronously
+        - ``localWorkers`` worker processes are started on this machine, other workers can join over the network
+        - returns path of the downloaded file"""
+        own_session:bool = session is None
+        if own_session:
+            session = pooledSession()
+        try:
+            async with session.get(self.stream.url, headers=self.video.headers) as response:
+                response.raise_for_status()
+                playlist:MediaPlaylist = parseMedia(await response.text(), self.base_url)
+        finally:
+            if own_session:
+                await session.close()
+        self.segments = playlist.segments
+        self.fingerprint = segmentsFingerprint(self.segments)
+        self.pending = deque((first, min(first + self.rangeSize, len(self.segments)))
+                             for first in range(0, len(self.segments), self.rangeSize))
+        self._finished = asyncio.Event()
+        self.video._make_tempdir()
+        try:
+            path:str = await self.video._asyncTrack(self._asyncServe(localWorkers), self.stream, len(self.segments))
+            if not convert:
+                return self.video._finish(path)
+            print("Začíní konvertování segmentů...")
+            return await asyncio.to_thread(self.video._convert, remove=True)
+        except BaseException:
+            self.video._discard_tempdir()
+            raise
+
+    async def _asyncServe(self, localWorkers:int) -> str:
+        """Serves workers until all chunks are uploaded and returns path of the concatenated file"""
+        self.runner = web.AppRunner(self.makeApp())
+        await self.runner.setup()
+        site:web.TCPSite = web.TCPSite(self.runner, self.host, self.port)
+        await site.start()
+        self.port = self.runner.addresses[0][1]
+        print(f"Koordinátor běží na {self.url}, token pracovníků: {self.token}, segmentů: {len(self.segments)}, úseků: {len(self.pending)}.")
+        processes:list[multiprocessing.Process] = [multiprocessing.Process(target=runWorker, args=(self.url, self.token), daemon=True)
+                                                   for _ in range(localWorkers)]
+        for process in processes:
+            process.start()
+        try:
+            if len(self.segments) > 0:
+                await self._finished.wait()
+        finally:
+            for process in processes:
+                if not self._finished.is_set():
+                    process.terminate()
+                await asyncio.to_thread(process.join, 5)
+                if process.is_alive():
+                    process.terminate()
+            await self.runner.cleanup()
+            self.runner = None
+        return await asyncio.to_thread(self._concatenate)
+
+    def _concatenate(self) -> str:
+        """Joins chunk files in playlist order into one file in the temporary directory"""
+        path:str = os.path.join(self.video.temp_directory, self.video.name+self.video.extention_in)
+        with open(path, "wb") as f:
+            position:int = 0
+            for first in sorted(self.chunks):
+                end, chunk = self.chunks[first]
+                if first != position:
+                    raise Distributed_Error("Chybí část segmentů.", f"{position}-{first}")
+                with open(chunk, "rb") as c:
+                    shutil.copyfileobj(c, f)
+                os.remove(chunk)
+                position = end
+        if position != len(self.segments):
+            raise Distributed_Error("Chybí část segmentů.", f"{position}-{len(self.segments)}")
+        return path
+
+    @web.middleware
+    async def _authenticate(self, request:web.Request, handler:Callable[[web.Request], Awaitable[web.StreamResponse]]) -> web.StreamResponse:
+        """Rejects requests without the shared token"""
+        if not hmac.compare_digest(request.headers.get("X-Token", "").encode(), self.token.encode()):
+            raise web.HTTPForbidden(text="Neplatný token pracovníka.")
+        return await handler(request)
+
+    async def _lease(self, request:web.Request) -> web.Response:
+        """Leases pending range, range of a lost worker or stolen half of the range expected to finish last"""
+        body:dict = await request.json()
+        worker:str = body.get("worker", request.remote or "")
+        ahead:int = max(int(body.get("ahead", 1)), 1)
+        if self._finished.is_set():
+            raise web.HTTPGone()
+        self._expireLeases()
+        if len(self.pending) > 0:
+            first, end = self.pending.popleft()
+        else:
+            stolen:tuple[int, int] | None = self._steal(worker)
+            if stolen is None:
+                return web.Response(status=204)
+            first, end = stolen
+        lease:SegmentRange = SegmentRange(next(self._ids), first, end, worker, ahead)
+        self.leases[lease.id] = lease
+        return web.json_response({"lease": lease.id, "first": first, "end": end, "playlist": self.stream.url,
+                                  "base_url": self.base_url, "fingerprint": self.fingerprint, "headers": self.video.headers})
+
+    async def _progress(self, request:web.Request) -> web.Response:
+        """Records downloaded segments of the range, the worker learns how far it should continue"""
+        lease:SegmentRange | None = self.leases.get(int(request.match_info["id"]))
+        if lease is None:
+            raise web.HTTPGone()
+        report:dict = await request.json()
+        done:int = int(report["done"])
+        if not lease.done < done <= lease.end:
+            raise web.HTTPConflict(text=f"done={done}, end={lease.end}")
+        lease.done = done
+        lease.updated = time.monotonic()
+        self.video.events.emit("segment_finish", video=self.video.name, sequence=self.segments[done-1].sequence,
+                               url=self.segments[done-1].url, bytes=int(report.get("bytes", 0)), seconds=float(report.get("seconds", 0.0)),
+                               worker=lease.worker)
+        return web.json_response({"end": lease.end})
+
+    async def _chunk(self, request:web.Request) -> web.Response:
+        """Receives chunk file of a finished range and checks its checksum"""
+        lease:SegmentRange | None = self.leases.get(int(request.match_info["id"]))
+        if lease is None:
+            raise web.HTTPGone()
+        if lease.done != lease.end:
+            raise web.HTTPConflict(text=f"done={lease.done}, end={lease.end}")
+        path:str = os.path.join(self.video.temp_directory, f"chunk-{lease.first:08d}{self.video.extention_in}")
+        digest = hashlib.sha256()
+        with open(path + ".part", "wb") as f:
+            async for data in request.content.iter_chunked(M3U8.CHUNK_SIZE):
+                digest.update(data)
+                f.write(data)
+        if digest.hexdigest() != request.headers.get("X-Checksum"):
+            os.remove(path + ".part")
+            raise web.HTTPBadRequest(text="Kontrolní součet nesouhlasí.")
+        if self.leases.pop(lease.id, None) is None:
+            os.remove(path + ".part")
+            raise web.HTTPGone()
+        os.replace(path + ".part", path)
+        self.chunks[lease.first] = (lease.end, path)
+        if len(self.pending) == 0 and len(self.leases) == 0:
+            self._finished.set()
+        return web.Response(status=204)
+
+    def _steal(self, worker:str) -> tuple[int, int] | None:
+        """Shortens the range expected to finish last and returns its second half for ``worker``
+        - only segments past ``done + ahead`` of the range can be stolen, ``None`` if no range has at least two of them"""
+        now:float = time.monotonic()
+        victims:list[SegmentRange] = [lease for lease in self.leases.values() if lease.end - (lease.done + lease.ahead) >= 2]
+        victim:SegmentRange | None = max(victims, key=lambda lease: (lease.remainingTime(now), lease.end - lease.done), default=None)
+        if victim is None:
+            return None
+        start:int = victim.done + victim.ahead
+        first, end = start + math.ceil((victim.end - start) / 2), victim.end
+        victim.end = first
+        print(f"Pracovník {worker} přebírá segmenty {first+1}-{end} od pracovníka {victim.worker}.")
+        return first, end
+
+    def _expireLeases(self) -> None:
+        """Returns ranges of workers silent for ``leaseTimeout`` seconds back to pending ranges"""
+        now:float = time.monotonic()
+        for lease in list(self.leases.values()):
+            if now - lease.updated > self.leaseTimeout:
+                print(f"Pracovník {lease.worker} neodpovídá, jeho segmenty {lease.first+1}-{lease.end} dostane jiný.")
+                del self.leases[lease.id]
+                self.pending.appendleft((lease.first, lease.end))
+
+class Worker:
+    """Worker of distributed download
+    - leases ranges of segments from the coordinator, downloads them by the segment engine of ``M3U8``
+      (decryption, retries, adaptive concurrency) and uploads them as chunk files with checksum
+    - stops downloading a range as soon as the coordinator shortens it for another worker"""
+
+    def __init__(self, coordinator:str, token:str, directory:str | None = None, maxRequestsAtTime:int = 16,
+                 rateLimit:BandwidthShare | None = None, name:str | None = None) -> None:
+        """Initializes ``Worker`` class
+        - ``coordinator`` is url of the coordinator and ``token`` its shared token, chunks are stored in ``directory`` before upload"""
+        self.coordinator:str = coordinator if coordinator.endswith("/") else coordinator + "/"
+        self.token:str = token
+        self.directory:str = directory if directory is not None else tempfile.gettempdir()
+        self.maxRequestsAtTime:int = maxRequestsAtTime
+        self.rateLimit:BandwidthShare | None = rateLimit
+        self.name:str = name if name is not None else f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:4]}"
+        self.segments:int = 0
+        self.connectTimeout:float = 10
+        self._playlists:dict[str, list[Segment]] = {}
+
+    @property
+    def window(self) -> int:
+        """Number of segments scheduled at once"""
+        return 2*self.maxRequestsAtTime
+
+    @property
+    def ahead(self) -> int:
+        """Number of segments past the last reported one the worker may already be downloading
+        - scheduled ``window``, one more taken from the range and waiting for a free slot and one not reported yet"""
+        return self.window + 2
+
+    def run(self) -> int:
+        """Works until the download is finished, returns number of downloaded segments
+        - the coordinator may start up to ``connectTimeout`` seconds after the worker"""
+        return asyncio.run(self.asyncRun())
+
+    async def asyncRun(self, session:ClientSession | None = None) -> int:
+        """Works asynchronously until the download is finished, returns number of downloaded segments"""
+        own_session:bool = session is None
+        if own_session:
+            session = pooledSession()
+        try:
+            waiting:float = time.monotonic()
+            while True:
+                try:
+                    async with session.post(self.coordinator + "lease", json={"worker": self.name, "ahead": self.ahead},
+                                            headers={"X-Token": self.token}) as response:
+                        if response.status == 410:
+                            return self.segments
+                        if response.status == 403:
+                            raise Distributed_Error("Koordinátor odmítl token pracovníka.", self.coordinator)
+                        if response.status == 204:
+                            await asyncio.sleep(0.5)
+                            continue
+                        response.raise_for_status()
+                        task:dict = await response.json()
+                except ClientConnectionError as e:
+                    if self.segments > 0:
+                        print("Koordinátor už neběží.")
+                        return self.segments
+                    if time.monotonic() - waiting < self.connectTimeout:
+                        await asyncio.sleep(0.5)
+                        continue
+                    raise Distributed_Error("Nepodařilo se spojit s koordinátorem.", e)
+                try:
+                    await self._asyncRange(task, session)
+                except Distributed_Error:
+                    raise
+                except Exception as e:
+                    print(f"Úsek {task['first']+1}-{task['end']} se nepodařilo stáhnout, koordinátor ho dá jinému pracovníkovi. {e}")
+                    await asyncio.sleep(1)
+        finally:
+            if own_session:
+                await session.close()
+
+    async def _asyncRange(self, task:dict, session:ClientSession) -> None:
+        """Downloads leased range into chunk file and uploads it"""
+        segments:list[Segment] = await self._asyncSegments(task, session)
+        video:M3U8 = M3U8(task["playlist"], self.directory, f"worker-{self.name}", headers=task["headers"])
+        video.limiter = AdaptiveLimiter(maximum=self.maxRequestsAtTime)
+        video.rate_limit = self.rateLimit
+        lease:dict = {"end": task["end"]}
+        async def leased() -> AsyncIterator[Segment]:
+            for index in range(task["first"], len(segments)):
+                if index >= lease["end"]:
+                    return
+                yield segments[index]
+        path:str = os.path.join(self.directory, f".ct-chunk-{self.name}-{task['lease']}{video.extention_in}")
+        digest = hashlib.sha256()
+        done:int = task["first"]
+        try:
+            with open(path, "wb") as f:
+                start:float = time.perf_counter()
+                window:int = min(self.window, task["end"] - task["first"])
+                async with aclosing(video._asyncFetchInOrder(leased(), session, window)) as fetched:
+                    async for data in fetched:
+                        f.write(data)
+                        digest.update(data)
+                        done += 1
+                        self.segments += 1
+                        async with session.post(f"{self.coordinator}progress/{task['lease']}",
+                                                json={"done": done, "bytes": len(data), "seconds": time.perf_counter() - start},
+                                                headers={"X-Token": self.token}) as response:
+                            if response.status == 410:
+                                return
+                            response.raise_for_status()
+                            lease["end"] = (await response.json())["end"]
+                        start = time.perf_counter()
+                        if done >= lease["end"]:
+                            break
+            with open(path, "rb") as f:
+                async with session.put(f"{self.coordinator}chunk/{task['lease']}", data=f,
+                                       headers={"X-Checksum": digest.hexdigest(), "X-Token": self.token}) as response:
+                    if response.status != 410:
+                        response.raise_for_status()
+        finally:
+            if video.decryptor is not None:
+                video.decryptor.close()
+            if os.path.exists(path):
+                os.remove(path)
+
+    async def _asyncSegments(self, task:dict, session:ClientSession) -> list[Segment]:
+        """Returns segments of the media playlist, checks that the worker sees the same playlist as the coordinator"""
+        if task["playlist"] not in self._playlists:
+            async with session.get(task["playlist"], headers=task["headers"]) as response:
+                response.raise_for_status()
+                segments:list[Segment] = parseMedia(await response.text(), task["base_url"]).segments
+            if segmentsFingerprint(segments) != task["fingerprint"]:
+                raise Distributed_Error("Playlist pracovníka se liší od playlistu koordinátora.", task["playlist"])
+            self._playlists[task["playlist"]] = segments
+        return self._playlists[task["playlist"]]
+
+def runWorker(coordinator:str, token:str, rate:str | None = None) -> None:
+    """Runs worker until the download is finished, target of local worker processes"""
+    parsed = parseRate(rate)
+    Worker(coordinator, token, rateLimit=BandwidthLimiter(parsed).share() if parsed is not None else None).run()
+
+app = typer.Typer(add_completion=False, context_settings={"help_option_names": ["-h", "--help"]})
+
+@app.callback()
+def callback():
+   """Distributed download of one video by several workers"""
+
+@app.command()
+def coordinator(url:Annotated[str, typer.Option(
+            "-u", "--url",
+            help="Url adresa na ČT nebo přímo na .m3u8 playlist", show_default=False)],
+         directory:Annotated[str, typer.Option(
+            "-d", "--directory",
+            help="Umístění pro stažený soubor", show_default=False)]
+            = ".",
+         name:Annotated[str, typer.Option(
+            "-n", "--name",
+            help="Jméno souboru", show_default=False)]
+            = None,
+         convert:Annotated[bool, typer.Option(
+            "-c", "--convert",
+            help="Konvertovat z .ts do .mp4", show_default=True)]
+            = False,
+         max_resolution:Annotated[int, typer.Option(
+            "--max-resolution",
+            help="Nejvyšší rozlišení (výška v pixelech, např. 720)", show_default=False)]
+            = None,
+         host:Annotated[str, typer.Option(
+            "--host",
+            help="Adresa, na které koordinátor čeká na pracovníky (0.0.0.0 pro pracovníky z celé sítě)", show_default=True)]
+            = "127.0.0.1",
+         port:Annotated[int, typer.Option(
+            "-p", "--port",
+            help="Port koordinátora", show_default=True)]
+            = 8600,
+         range_size:Annotated[int, typer.Option(
+            "--range-size",
+            help="Počet segmentů v jednom úseku", show_default=True)]
+            = 25,
+         lease_timeout:Annotated[float, typer.Option(
+            "--lease-timeout",
+            help="Po kolika sekundách bez hlášení dostane úsek jiný pracovník", show_default=True)]
+            = 60.0,
+         local_workers:Annotated[int, typer.Option(
+            "-w", "--local-workers",
+            help="Počet pracovníků spuštěných na tomto počítači", show_default=True)]
+            = 0,
+         token:Annotated[str, typer.Option(
+            "-t", "--token",
+            help="Sdílený token pracovníků, bez něj se vygeneruje náhodný", show_default=False)]
+            = None
+            ):
+   """Splits download of the video into ranges of segments for workers and joins them"""
+   from selection import StreamSelector
+   video:M3U8 = resolveVideo(url, directory, name)
+   stream:Variant = video.select_stream(StreamSelector(maxHeight=max_resolution) if max_resolution is not None else None)
+   path:str = Coordinator(video, stream, host=host, port=port, rangeSize=range_size, leaseTimeout=lease_timeout,
+                          token=token).download(convert=convert, localWorkers=local_workers)
+   print(f"Hotovo: {path}")
+
+@app.command()
+def worker(coordinator_url:Annotated[str, typer.Argument(
+            help="Url adresa koordinátora (např. http://192.168.0.10:8600/)", show_default=False)],
+         token:Annotated[str, typer.Option(
+            "-t", "--token",
+            help="Token, který vypsal koordinátor", show_default=False)],
+         requests:Annotated[int, typer.Option(
+            "--requests",
+            help="Nejvíce současných požadavků na segmenty", show_default=True)]
+            = 16,
+         rate_limit:Annotated[str, typer.Option(
+            "--rate-limit",
+            help="Nejvyšší rychlost stahování v B/s (např. 500k, 2M) nebo rozvrh podle denní doby", show_default=False)]
+            = None
+            ):
+   """Downloads ranges of segments leased by the coordinator"""
+   try:
+      rate = parseRate(rate_limit)
+   except ValueError as e:
+      raise typer.BadParameter(str(e))
+   segments:int = Worker(coordinator_url, token, maxRequestsAtTime=requests,
+                         rateLimit=BandwidthLimiter(rate).share() if rate is not None else None).run()
+   print(f"Staženo segmentů: {segments}")
+
+if __name__ == "__main__":
+    app()
@@ -1,11 +1,20 @@
 """CT module"""
+import asyncio
 import json
 import os
+from functools import cached_property
 from prettytable import PrettyTable
 import requests
-import shutil
-from bs4 import BeautifulSoup, Tag
-from downloadM3u8 import M3U8, M3U8Index
+from aiohttp import ClientSession
+from archive import ArchiveIndex, ArchiveRecord, renditionKey
+from cache import MetadataCache
+from concurrency import BandwidthShare, pooledSession
+from downloadM3u8 import M3U8, M3U8_Error, asyncGetMasterPlaylist
+from events import Events
+from parseM3u8 import Variant
+from selection import StreamSelector
+from subtitles import asyncDownloadSubtitles
+from pagescan import PageInfo, asyncScanResponse, scanResponse
 
 class CT_Error(Exception):
     """CT error"""
@@ -19,22 +28,175 @@ class CT:
     - can download video only using url (noob friendly)"""
 
     VALID_URLS:str = ["https://www.ceskatelevize.cz/"]
+    PLAYLIST_API:str = "https://www.ceskatelevize.cz/ivysilani/ajax/get-client-playlist/"
 
-    def __init__(self, url:str, directory:str, name:str | None = None) -> None:
-        """Initializies ``CT`` class"""
+    ID_TTL:float = 30*24*3600
+
+    def __init__(self, url:str, directory:str, name:str | None = None, session:requests.Session | None = None,
+                 cache:MetadataCache | None = None, refresh:bool = False, events:Events | None = None,
+                 archive:ArchiveIndex | None = None) -> None:
+        """Initializies ``CT`` class
+        - ``session`` is reused for every request, so batches can share one connection pool
+        - ``cache`` skips resolution steps done before, ``refresh`` ignores cached values
+        - ``events`` receives timings of every resolution step and progress of the download
+        - ``archive`` skips videos downloaded before and reuses their segments"""
+        self.events:Events = events if events is not None else Events()
+        self.session:requests.Session = session if session is not None else requests.Session()
+        self.cache:MetadataCache | None = cache
+        self.refresh:bool = refresh
+        self.archive:ArchiveIndex | None = archive
         self.url:str = self._getUrl(url=url)
-        self.source_code: BeautifulSoup = self._getSourceCode()
-        self.directory:str = self._getDirectory(directory=directory)
-        self.id: str = self._getID()
-        self.playlist_info:dict = self._getPlaylistInfo()
-        self.playlist_url = self._getPlaylistUrl()
-        self.name:str = self._getName(name=name)
-        self.subtitles_urls: list[str,str] | list[None] = self._getSubs()
-        
-        self.video: M3U8 = M3U8(playlist_url=self.playlist_url,
-                                directory=self.directory,
-                                name=self.name)
+        self.source_code: PageInfo | None = None
+        self.directory:str = os.path.abspath(directory)
+        self._name:str | None = name
+
+    @cached_property
+    def id(self) -> str:
+        """ID of the video, resolved on first use"""
+        with self.events.phase("_getID", url=self.url):
+            return self._cached("id", self.url, self._getID, ttl=self.ID_TTL)
+
+    @cached_property
+    def playlist_info(self) -> dict:
+        """Information about the video from playlist API, resolved on first use"""
+        with self.events.phase("_getPlaylistInfo", url=self.url):
+            return json.loads(self._cached("playlist_info", f"{type(self).__name__}:{self.id}",
+                                           lambda: json.dumps(self._getPlaylistInfo())))
+
+    @cached_property
+    def playlist_url(self) -> str:
+        """Url of the master playlist"""
+        return self._getPlaylistUrl()
+
+    @cached_property
+    def name(self) -> str:
+        """Name of the video, given one or resolved on first use"""
+        with self.events.phase("_getName", url=self.url):
+            return self._getName(name=self._name)
+
+    @cached_property
+    def subtitles_urls(self) -> list[str,str] | list[None]:
+        """Names and urls of subtitles"""
+        return self._getSubs()
+
+    @cached_property
+    def video(self) -> M3U8:
+        """Downloader of the video stream"""
+        return M3U8(playlist_url=self.playlist_url,
+                    directory=self.directory,
+                    name=self.name,
+                    session=self.session,
+                    cache=self.cache,
+                    refresh=self.refresh,
+                    events=self.events,
+                    archive=self.archive)
+
+    @property
+    def streams(self) -> list[Variant]:
+        """Variant streams of the video, master playlist is downloaded on first use"""
+        return self.video.streams
+
+    async def resolve(self, streams:bool = True, subtitles:bool = False, session:ClientSession | None = None) -> "CT":
+        """Resolves everything needed for download asynchronously over one aiohttp ``session``
+        - steps resolved before (or cached) are skipped, ``streams`` and ``subtitles`` are resolved only if asked for
+        - steps form one chain (page → ID → playlist info), then the name and the master playlist are resolved concurrently,
+          the page is skipped when ID is cached and the name is in playlist info"""
+        own_session:bool = session is None
+        if own_session:
+            session = pooledSession()
+        try:
+            await self._asyncResolvePlaylistInfo(session)
+            resolve_name:bool = "name" not in self.__dict__
+            get_master:bool = streams and ("video" not in self.__dict__ or "streams" not in self.video.__dict__)
+            name, master = await asyncio.gather(self._asyncResolveName(session) if resolve_name else asyncio.sleep(0),
+                                                self._asyncGetMasterPlaylist(session) if get_master else asyncio.sleep(0))
+            if resolve_name:
+                self.name = name
+            if get_master:
+                self.video.streams = self.video._parseStreams(master)
+            if subtitles:
+                self.subtitles_urls
+        finally:
+            if own_session:
+                await session.close()
         print("Inicializace proběhla úsěšně!")
+        return self
+
+    async def _asyncResolveID(self, session:ClientSession) -> str:
+        """Resolves ``id`` asynchronously"""
+        if "id" not in self.__dict__:
+            with self.events.phase("_getID", url=self.url):
+                self.id = await self._asyncCached("id", self.url, lambda: self._asyncGetID(session), ttl=self.ID_TTL)
+        return self.id
+
+    async def _asyncResolvePlaylistInfo(self, session:ClientSession) -> dict:
+        """Resolves ``playlist_info`` asynchronously"""
+        if "playlist_info" not in self.__dict__:
+            key:str = f"{type(self).__name__}:{await self._asyncResolveID(session)}"
+            with self.events.phase("_getPlaylistInfo", url=self.url):
+                self.playlist_info = json.loads(await self._asyncCached("playlist_info", key,
+                                                                        lambda: self._asyncGetPlaylistInfoText(session)))
+        return self.playlist_info
+
+    async def _asyncResolveName(self, session:ClientSession) -> str:
+        """Resolves name asynchronously, page is downloaded only if the name is not in playlist info"""
+        with self.events.phase("_getName", url=self.url):
+            if self._name is not None and self._name != "":
+                return self._name
+            try:
+                return self._getNameFromPlaylistInfo()
+            except CT_Error:
+                await self._asyncGetSource(session)
+                return self._getNameFromSourceCode()
+
+    async def _asyncGetMasterPlaylist(self, session:ClientSession) -> str:
+        """Downloads master playlist asynchronously, it does not need the name so it is fetched while the name is resolved"""
+        with self.events.phase("get_streams", url=self.playlist_url):
+            return await asyncGetMasterPlaylist(self.playlist_url, session, cache=self.cache, refresh=self.refresh)
+
+    async def _asyncCached(self, kind:str, key:str, resolve, ttl:float | None = None) -> str:
+        """Returns value from ``cache`` or awaits ``resolve()`` and stores it"""
+        if self.cache is not None and not self.refresh:
+            value:str | None = self.cache.get(kind, key)
+            if value is not None:
+                return value
+        value:str = await resolve()
+        if self.cache is not None:
+            self.cache.set(kind, key, value, ttl=ttl)
+        return value
+
+    def archived(self, stream:Variant, convert:bool = True, verify:bool = False) -> ArchiveRecord | None:
+        """Returns archived file of the video in the ``stream`` rendition, ``None`` if it has to be downloaded
+        - ``verify`` checks checksum of the file, otherwise only its size is checked"""
+        if self.archive is None:
+            return None
+        return self.archive.find(f"{type(self).__name__}:{self.id}", renditionKey(stream),
+                                 self.video.extention_out if convert else self.video.extention_in, verify)
+
+    def _cached(self, kind:str, key:str, resolve, ttl:float | None = None) -> str:
+        """Returns value from ``cache`` or resolves and stores it"""
+        if self.cache is not None and not self.refresh:
+            value:str | None = self.cache.get(kind, key)
+            if value is not None:
+                return value
+        value:str = resolve()
+        if self.cache is not None:
+            self.cache.set(kind, key, value, ttl=ttl)
+        return value
+
+    async def _asyncGetSource(self, session:ClientSession) -> PageInfo:
+        """Returns source code of the page, downloads it over ``session`` on first use"""
+        if self.source_code is None:
+            with self.events.phase("_getSourceCode", url=self.url):
+                self.source_code = await self._asyncGetSourceCode(session)
+        return self.source_code
+
+    def _getSource(self) -> PageInfo:
+        """Returns source code of the page, downloads it on first use"""
+        if self.source_code is None:
+            with self.events.phase("_getSourceCode", url=self.url):
+                self.source_code = self._getSourceCode()
+        return self.source_code
 
     def displayInfo(self, clear_terminal:bool = False) -> None:
         """Displays info about video"""
@@ -61,13 +223,28 @@ class CT:
                 return url
         raise CT_Error("Neplatná url.")
 
-    def _getSourceCode(self) -> BeautifulSoup:
-        """Gets source code of the page"""
+    def _getSourceCode(self) -> PageInfo:
+        """Gets parts of the page source code needed by downloader
+        - stops downloading the page as soon as they are found"""
         print("Stahování informací z webu...")
-        response:requests.Response = requests.get(self.url)
+        response:requests.Response = self.session.get(self.url, stream=True)
         if response.status_code != 200:
+            response.close()
             raise CT_Error(f"Nemohl jsem se dostat na web. Zkontroluj připojení k internetu nebo správnost url.",response.status_code)
-        return BeautifulSoup(response.text, 'html.parser')
+        return scanResponse(response, self._hasPageInfo)
+
+    async def _asyncGetSourceCode(self, session:ClientSession) -> PageInfo:
+        """Gets parts of the page source code needed by downloader asynchronously"""
+        print("Stahování informací z webu...")
+        response = await session.get(self.url)
+        if response.status != 200:
+            response.close()
+            raise CT_Error(f"Nemohl jsem se dostat na web. Zkontroluj připojení k internetu nebo správnost url.",response.status)
+        return await asyncScanResponse(response, self._hasPageInfo)
+
+    def _hasPageInfo(self, page:PageInfo) -> bool:
+        """Checks if scanned part of the page contains everything needed"""
+        return len(page.ld_json) >= 2
     
     def _getDirectory(self, directory:str) -> str:
         """Checks directory and creates it if it doesn't exist"""
@@ -78,19 +255,28 @@ class CT:
                 os.makedirs(directory)
             except Exception as e:
                 raise CT_Error(f"Nepodařilo se mi vytvořit složku. {e}")
-        return directory
+        return os.path.abspath(directory)
 
     def _getID(self) -> str:
         """Gets id of the video"""
         print("Zjišťuji ID videa...")
+        return self._parseID(self._getSource())
+
+    async def _asyncGetID(self, session:ClientSession) -> str:
+        """Gets id of the video asynchronously"""
+        print("Zjišťuji ID videa...")
+        return self._parseID(await self._asyncGetSource(session))
+
+    def _parseID(self, source_code:PageInfo) -> str:
+        """Finds id of the video in source code of the page"""
         try:
-            script:Tag = self.source_code.find_all('script', {'type': 'application/ld+json'})[1]
+            script:str = source_code.ld_json[1]
         except IndexError:
             raise CT_Error("Nenašel jsem ID-script v source codu.")
         except Exception as e:
             raise CT_Error(f"Hledání ID-scriptu selhalo. Struktura stránky se mohla změnit", e)
         try:
-            contents:dict = json.loads(script.contents[0])
+            contents:dict = json.loads(script)
             embed_url:str = contents["video"]["embedUrl"]
             return embed_url.split("IDEC=")[1]
         except ValueError:
@@ -98,10 +284,9 @@ class CT:
         except Exception as e:
             raise CT_Error("Hledání ID selhalo. Struktura skriptu se mohla změnit.", e) 
 
-    def _getPlaylistInfo(self) -> dict:
-        """Returns dictionary full of information about video"""
-        print("Zjišťuji klíč k lokaci playlistu...")
-        data = {
+    def _playlistData(self) -> dict:
+        """Returns form data of the playlist API request"""
+        return {
             'playlist[0][type]': 'episode',
             'playlist[0][id]': self.id,
             'requestUrl': '/ivysilani/embed/iFramePlayer.php',
@@ -110,15 +295,31 @@ class CT:
             'canPlayDRM': 'true',
             'streamingProtocol': 'dash',
         }
+
+    def _getPlaylistInfo(self) -> dict:
+        """Returns dictionary full of information about video"""
+        print("Zjišťuji klíč k lokaci playlistu...")
         try:
-            r1 = requests.post('https://www.ceskatelevize.cz/ivysilani/ajax/get-client-playlist/', data=data)
+            r1 = self.session.post(self.PLAYLIST_API, data=self._playlistData())
             a = json.loads(r1.text)
-            r2 = requests.get(a["url"])
+            r2 = self.session.get(a["url"])
             b = json.loads(r2.text)
             return b["playlist"][-1]
         except Exception as e:
             raise CT_Error(f"Nepodařilo se získat adresu videa na serveru.", e)
 
+    async def _asyncGetPlaylistInfoText(self, session:ClientSession) -> str:
+        """Returns information about video as JSON text, requested asynchronously"""
+        print("Zjišťuji klíč k lokaci playlistu...")
+        try:
+            async with session.post(self.PLAYLIST_API, data=self._playlistData()) as r1:
+                a = json.loads(await r1.text())
+            async with session.get(a["url"]) as r2:
+                b = json.loads(await r2.text())
+            return json.dumps(b["playlist"][-1])
+        except Exception as e:
+            raise CT_Error(f"Nepodařilo se získat adresu videa na serveru.", e)
+
     def _getPlaylistUrl(self) -> str:
         """Gets ``playlist url``"""
         print("Zjišťuji url adresu playlistu...")
@@ -149,13 +350,14 @@ class CT:
     def _getNameFromSourceCode (self) -> str:
         """Gets name of the video from web"""
         print("Hledám název videa na webu...")
+        source_code:PageInfo = self._getSource()
         try:
-            script:Tag = self.source_code.find_all('script', {'type': 'application/ld+json'})[1]
+            script:str = source_code.ld_json[1]
         except IndexError:
             raise CT_Error("Nenašel jsem jméno videa.")
         except Exception as e:
             raise CT_Error(f"Hledání jména selhalo. Struktura stránky se mohla změnit", e)
-        contents:dict = json.loads(script.contents[0])
+        contents:dict = json.loads(script)
         return contents["name"]
 
     def _getSubs(self) -> list[str,str] | list[None]:
@@ -165,69 +367,103 @@ class CT:
         except Exception:
             return []
     
-    def download(self, subs: bool = False, convert: bool = True) -> None:
-        """Downloads video stream in best quality and converts it"""
-        print("Začíná stahování segmentů...")
-        stream:M3U8Index = self.video.get_best_stream()
-        contents: str = requests.get(stream.url).text
-        self.video._make_tempdir()
-        os.chdir(self.video.temp_directory)
-        for line in contents.split("\n"):
-            if line.startswith("http"):
-                with open(f"{self.video.name}{self.video.extention_in}", "ab") as f:
-                    f.write(self.video._downloadSegment(line))
-        if convert:
+    def download(self, subs: bool = False, convert: bool = True, resume: bool = True, pipe: bool = False,
+                 live: bool = False, duration: float | None = None, selector: StreamSelector | None = None,
+                 vtt: bool = False, mux: bool = False, verify: bool = False, rateLimit: BandwidthShare | None = None) -> str:
+        """Downloads video stream and converts it
+        - ``resume`` continues an interrupted download of the same video
+        - ``pipe`` converts while downloading, without the intermediate ``.ts`` file
+        - ``live`` records live broadcast until it ends, ``duration`` seconds pass or Ctrl+C is pressed
+        - ``selector`` chooses the stream, best quality is downloaded without it
+        - subtitles are downloaded alongside the video, ``vtt`` saves them also as WebVTT, ``mux`` adds them into converted file
+        - video found in ``archive`` is not downloaded again, ``verify`` checks its checksum
+        - ``rateLimit`` caps throughput of the segments
+        - returns path of the downloaded file"""
+        return asyncio.run(self.asyncDownload(subs=subs, convert=convert, resume=resume, pipe=pipe, live=live, duration=duration, selector=selector,
+                                              vtt=vtt, mux=mux, verify=verify, rateLimit=rateLimit))
+
+    async def asyncDownload(self, subs: bool = False, convert: bool = True, resume: bool = True, session: ClientSession | None = None, pipe: bool = False,
+                            live: bool = False, duration: float | None = None, selector: StreamSelector | None = None, stream: Variant | None = None,
+                            vtt: bool = False, mux: bool = False, verify: bool = False, rateLimit: BandwidthShare | None = None) -> str:
+        """Downloads video stream and converts it
+        - ``session`` lets several downloads share one connection pool, it is used for metadata, subtitles and segments alike
+        - ``stream`` is downloaded if given (e.g. planned by batch budget), otherwise it is chosen by ``selector``
+        - subtitles are downloaded while the master playlist is resolved and segments are downloaded
+        - returns path of the downloaded file"""
+        own_session: bool = session is None
+        if own_session:
+            session = pooledSession()
+        subtitles_task:asyncio.Task | None = None
+        try:
+            await self.resolve(streams=False, subtitles=subs, session=session)
+            self._getDirectory(directory=self.directory)
+            subtitles_task = asyncio.create_task(self._asyncDownloadSubs(session, vtt)) if subs else None
+            if stream is None:
+                await self.video.asyncGetStreams(session)
+                stream = self.video.select_stream(selector)
+            if not live:
+                record:ArchiveRecord | None = await asyncio.to_thread(self.archived, stream, convert, verify)
+                if record is not None:
+                    print(f"Video už je staženo: {record.path}")
+                    if subtitles_task is not None:
+                        await subtitles_task
+                    return record.path
+            pipe = pipe and convert
+            mux = mux and convert
+            muxed:list[tuple[str, str]] | None = await subtitles_task if mux and pipe and subtitles_task is not None else None
+            print("Začíná nahrávání vysílání..." if live else "Začíná stahování segmentů...")
+            try:
+                if live:
+                    downloaded:str = await self.video.asyncRecord(stream, session=session, pipe=pipe, duration=duration, subtitles=muxed,
+                                                              rateLimit=rateLimit)
+                else:
+                    downloaded:str = await self.video.asyncDownload(stream, resume=resume, session=session, pipe=pipe, subtitles=muxed,
+                                                                rateLimit=rateLimit)
+            except M3U8_Error as e:
+                raise CT_Error(str(e), e.details)
+            except Exception as e:
+                raise CT_Error("Stahování segmentů selhalo.", e)
+            subtitles:list[tuple[str, str]] = await subtitles_task if subtitles_task is not None else []
+        except BaseException:
+            if subtitles_task is not None:
+                subtitles_task.cancel()
+            if "video" in self.__dict__:
+                self.video._discard_tempdir()
+            raise
+        finally:
+            if own_session:
+                await session.close()
+        if convert and not pipe:
             print("Začíní konvertování segmentů...")
-            self.video._convert(remove=True)
+            try:
+                path:str = await asyncio.to_thread(self.video._convert, remove=True, subtitles=subtitles if mux else None)
+            except M3U8_Error as e:
+                self.video._discard_tempdir()
+                raise CT_Error(str(e), e.details)
         else:
             try:
-                shutil.move(os.path.join(self.video.temp_directory, self.video.name+self.video.extention_in),
-                            os.path.join(self.directory, self.video.name+self.video.extention_in))
-                self.video._remove_tempdir()
+                path:str = self.video._finish(downloaded)
             except Exception as e:
+                self.video._discard_tempdir()
                 raise CT_Error("Nepodařilo se soubor přesunout z dočasné složky.", e)
-        if subs:
-            self._downloadSubs()
+        if self.archive is not None and not live:
+            await asyncio.to_thread(self.archive.add, f"{type(self).__name__}:{self.id}", renditionKey(stream), self.video.fingerprint, path,
+                                    self.video.layout if path.endswith(self.video.extention_in) else None)
+        return path
 
-    def _downloadSubs(self) -> None:
-        """Downloads subs"""
+    async def _asyncDownloadSubs(self, session:ClientSession, vtt:bool = False) -> list[tuple[str, str]]:
+        """Downloads all subtitle tracks concurrently and returns their names and paths of SRT files"""
         print("Stahování titulků...")
-        if len(self.subtitles_urls) ==0:
+        if len(self.subtitles_urls) == 0:
             print("Titulky nejsou k dispozici!")
-            return
-        for sub_name, sub_url in self.subtitles_urls:
-            with open(os.path.join(self.directory, self.video.name + f" ({sub_name})" + ".srt"), "w") as f:
-                f.write(self._txtToSrt(requests.get(sub_url).content.decode()))
-            print(f"Stažené titulky: {sub_name}.")   
-
-    def _txtToSrt(self, source:str) -> str:
-        """Converts subtitle contents into ``srt`` format"""
-        def seconds(milliseconds:str) -> str:
-            """Converts miliseconds to ``srt format``"""
-            seconds, milliseconds = divmod(milliseconds, 1000)
-            minutes, seconds = divmod(seconds, 60)
-            hours, minutes = divmod(minutes, 60)
-            srt_time = f"{hours:02d}:{minutes:02d}:{seconds:02d},{milliseconds:03d}"
-            return srt_time
-        lines = source.split("\n")
-        start: bool = True
-        srt_file:str = ""
-        for line in lines:
-            if start and line != "":
-                index:str = line.strip().split(";")[0]
-                start_time, end_time = line.strip().split(" ")[1:]
-                # Convert start and end times to SRT format (HH:MM:SS,ms)
-                start_time = seconds(int(start_time))
-                end_time = seconds(int(end_time))
-                srt_file+= f"{index}\n{start_time} --> {end_time}\n"
-                start = False
-            else:
-                if line == "":
-                    start = True
-                    srt_file += "\n"
-                    continue
-                srt_file += line+"\n"
-        return srt_file
+            return []
+        try:
+            tracks:list[tuple[str, str]] = await asyncDownloadSubtitles(self.subtitles_urls, self.directory, self.video.name, session, vtt)
+        except Exception as e:
+            raise CT_Error("Stahování titulků selhalo.", e)
+        for sub_name, _ in tracks:
+            print(f"Stažené titulky: {sub_name}.")
+        return tracks
 
 
 class CT_Gold(CT):
@@ -235,14 +471,16 @@ class CT_Gold(CT):
     - can download video only using url (noob friendly)"""
 
     VALID_URLS:str = ["https://zlatapraha.ceskatelevize.cz/"]
+    PLAYER_URL:str = "https://www.ceskatelevize.cz/ivysilani/embed/iFramePlayer.php?"
 
-    def __init__(self, url: str, directory: str, name: str | None = None) -> None:
-        super().__init__(url, directory, name)
+    def __init__(self, url: str, directory: str, name: str | None = None, session: requests.Session | None = None,
+                 cache: MetadataCache | None = None, refresh: bool = False, events: Events | None = None,
+                 archive: ArchiveIndex | None = None) -> None:
+        super().__init__(url, directory, name, session, cache, refresh, events, archive)
 
-    def _getPlaylistInfo(self) -> dict:
-        """Returns dictionary full of information about video"""
-        print("Zjišťuji klíč k lokaci playlistu...")
-        data = {
+    def _playlistData(self) -> dict:
+        """Returns form data of the playlist API request"""
+        return {
             'playlist[0][type]': 'bonus',
             'playlist[0][id]': self.id,
             'requestUrl': '/ivysilani/embed/iFramePlayer.php',
@@ -250,35 +488,38 @@ class CT_Gold(CT):
             'type': 'html',
             'canPlayDRM': 'true',
         }
-        try:
-            r1 = requests.post('https://www.ceskatelevize.cz/ivysilani/ajax/get-client-playlist/', data=data)
-            a = json.loads(r1.text)
-            r2 = requests.get(a["url"])
-            b = json.loads(r2.text)
-            return b["playlist"][-1]
-        except Exception as e:
-            raise CT_Error(f"Nepodařilo se získat adresu videa na serveru.", e)
 
     def _getNameFromSourceCode(self) -> str:
         """Gets name of the video from web"""
         print("Hledám název videa na webu...")
+        source_code:PageInfo = self._getSource()
         try:
-            title:Tag = self.source_code.find('title')
-            self.ct_name = title.text.split("|")[0].strip()
+            return source_code.title.split("|")[0].strip()
         except ValueError:
             raise CT_Error("Nedokázal jsem proparsovat název videa ze source codu.")
         except Exception as e:
             raise CT_Error("Hledání jména ze source codu selhalo. Struktura stránky se mohla změnit.", e)
     
-    def _getID(self) -> str:
-        """Gets id of the video"""
-        print("Zjišťuji ID videa...")
+    def _parseID(self, source_code:PageInfo) -> str:
+        """Finds id of the video in source code of the page"""
         try:
-            iframes:Tag = self.source_code.find_all('iframe')
-            for iframe in iframes:
-                if iframe['src'].startswith("https://www.ceskatelevize.cz/ivysilani/embed/iFramePlayer.php?"):
-                    return iframe['src'].split("bonus=")[1][:5]
+            for src in source_code.iframes:
+                if src.startswith(self.PLAYER_URL):
+                    return src.split("bonus=")[1][:5]
         except ValueError:
             raise CT_Error("Nedokázal jsem proparsovat ID videa ze source codu.")
         except Exception as e:
             raise CT_Error("Hledání ID videa selhalo. Struktura stránky se mohla změnit.", e)
+        raise CT_Error("Nenašel jsem přehrávač videa v source codu.")
+
+    def _hasPageInfo(self, page:PageInfo) -> bool:
+        """Checks if scanned part of the page contains everything needed"""
+        return page.title is not None and any(src.startswith(self.PLAYER_URL) for src in page.iframes)
+
+def getDownloader(url:str, directory:str, name:str | None = None, **options) -> CT:
+    """Returns downloader of the class matching the url, nothing is resolved yet
+    - ``options`` are passed to the downloader (``session``, ``cache``, ``refresh``, ``events``, ``archive``)"""
+    for downloader in (CT_Gold, CT):
+        if any(url.startswith(valid_url) for valid_url in downloader.VALID_URLS):
+            return downloader(url, directory, name, **options)
+    raise CT_Error("Neplatná url.")
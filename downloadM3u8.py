@@ -2,155 +2,888 @@ import subprocess
 import requests
 import shutil
 import os
+import tempfile
 import time
-from aiohttp import ClientSession
+from aiohttp import ClientResponse, ClientSession
+from multidict import CIMultiDictProxy
 import asyncio
+import signal
+import struct
+import zlib
+from contextlib import aclosing
+from functools import cached_property
+from typing import AsyncIterable, AsyncIterator, Awaitable, BinaryIO, Callable, Iterable
+from urllib.parse import urljoin
+from archive import ArchiveIndex, segmentsFingerprint
+from cache import MetadataCache
+from concurrency import AdaptiveLimiter, BandwidthShare, backoffDelay
+from events import Events
+from decrypt import Decryption_Error, SegmentDecryptor, decryptAES128, segmentIV
+from parseM3u8 import MasterPlaylist, MediaPlaylist, Segment, Variant, parseMaster, parseMedia
+from selection import StreamSelector
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
 
-class M3U8Index:
+def lockFile(path:str) -> BinaryIO | None:
+    """Opens ``path`` and locks it exclusively without waiting, returns ``None`` if another job already holds the lock
+    - the lock is released when the returned file is closed"""
+    f: BinaryIO = open(path, "a+b")
+    try:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+    except OSError:
+        f.close()
+        return None
+    return f
+
+def positionedWrite(fd: int, data: bytes, offset: int) -> None:
+    """Writes ``data`` at ``offset`` of file without moving its position (``pwrite``)"""
+    if hasattr(os, "pwrite"):
+        view: memoryview = memoryview(data)
+        while len(view) > 0:
+            written: int = os.pwrite(fd, view, offset)
+            view = view[written:]
+            offset += written
+    else:
+        position: int = os.lseek(fd, 0, os.SEEK_CUR)
+        os.lseek(fd, offset, os.SEEK_SET)
+        os.write(fd, data)
+        os.lseek(fd, position, os.SEEK_SET)
+
+async def asyncGetMasterPlaylist(url:str, session:ClientSession, headers:dict = {}, cache:MetadataCache | None = None,
+                                 refresh:bool = False) -> str:
+    """Returns contents of master playlist from ``cache`` or downloads it over ``session``"""
+    if cache is not None and not refresh:
+        content: str | None = cache.get("master", url)
+        if content is not None:
+            return content
+    async with session.get(url, headers=headers) as response:
+        content: str = await response.text()
+    if cache is not None:
+        cache.set("master", url, content, signed=url)
+    return content
+
+async def iterate(items:Iterable | AsyncIterable) -> AsyncIterator:
+    """Iterates over ``items`` no matter if they are sync or async iterable"""
+    if isinstance(items, AsyncIterable):
+        async for item in items:
+            yield item
+    else:
+        for item in items:
+            yield item
+
+class M3U8_Error(Exception):
+    """M3U8 error"""
+    def __init__(self, message:str, details:str | None = None) -> None:
+        """Initializies ``M3U8_Error`` class"""
+        super().__init__(message)
+        self.details:str | None = details
+
+class M3U8Index(Variant):
     """Index/stream from playlist.m3u8"""
+    __slots__ = ()
+
     def __init__(self, bandwidth: int, resolution: str, url: str) -> None:
         """Initializes M3U8Index class"""
-        self.bandwith: int = bandwidth
-        self.resolution: str = resolution
-        self.url: str = url
-    
-    def __str__(self) -> str:
-        """If print statement is placed on M3U8Index"""
-        return "STREAM"+"\n"+f"\t - resolution: {self.resolution}"+"\n"+f"\t - bandwith: {self.bandwith}"
+        super().__init__(url=url, bandwidth=bandwidth, resolution=resolution)
+
+class SegmentJournal:
+    """Journal of segments already written into the partial file
+    - header holds fingerprint of the playlist, then one fixed size record per segment
+    - record: segment index, byte offset, length, crc32 of the data"""
+    MAGIC: bytes = b"CTJ1"
+    HEADER: struct.Struct = struct.Struct("<4sII")
+    RECORD: struct.Struct = struct.Struct("<IQII")
+
+    def __init__(self, path: str, segments: list[Segment]) -> None:
+        """Initializes SegmentJournal class"""
+        self.path: str = path
+        self.segments: int = len(segments)
+        self.fingerprint: int = zlib.crc32("\n".join(segment.id for segment in segments).encode())
+        self.records: list[tuple[int, int, int, int]] = []
+        self._file = None
+
+    @property
+    def end(self) -> int:
+        """Byte offset right after the last journaled segment"""
+        if len(self.records) == 0:
+            return 0
+        _, offset, length, _ = self.records[-1]
+        return offset + length
+
+    def load(self, data_path: str) -> int:
+        """Loads journal, drops records not backed by ``data_path`` and truncates its torn tail
+        - returns number of completed segments"""
+        self.records = []
+        try:
+            with open(self.path, "rb") as f:
+                raw: bytes = f.read()
+        except FileNotFoundError:
+            raw = b""
+        if len(raw) >= self.HEADER.size and self.HEADER.unpack_from(raw) == (self.MAGIC, self.segments, self.fingerprint):
+            for pos in range(self.HEADER.size, len(raw) - self.RECORD.size + 1, self.RECORD.size):
+                record = self.RECORD.unpack_from(raw, pos)
+                if record[0] != len(self.records) or record[1] != self.end:
+                    break
+                self.records.append(record)
+        if not os.path.exists(data_path):
+            self.records = []
+        else:
+            size: int = os.path.getsize(data_path)
+            while len(self.records) > 0 and self.end > size:
+                self.records.pop()
+            with open(data_path, "rb") as f:
+                while len(self.records) > 0:
+                    _, offset, length, crc = self.records[-1]
+                    f.seek(offset)
+                    if zlib.crc32(f.read(length)) == crc:
+                        break
+                    self.records.pop()
+            os.truncate(data_path, self.end)
+        self._rewrite()
+        return len(self.records)
+
+    def append(self, index: int, offset: int, data: bytes) -> None:
+        """Records segment that was just written into the partial file"""
+        record = (index, offset, len(data), zlib.crc32(data))
+        self._file.write(self.RECORD.pack(*record))
+        self._file.flush()
+        self.records.append(record)
+
+    def close(self) -> None:
+        """Closes journal file"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _rewrite(self) -> None:
+        """Writes header and valid records and keeps the journal open for appending"""
+        self.close()
+        with open(self.path, "wb") as f:
+            f.write(self.HEADER.pack(self.MAGIC, self.segments, self.fingerprint))
+            for record in self.records:
+                f.write(self.RECORD.pack(*record))
+        self._file = open(self.path, "ab")
 
 class M3U8:
-    def __init__(self, playlist_url: str, directory: str, name:str, extentiton_in: str = ".ts", extention_out: str = ".mp4", headers: dict = {}, middle_path:str | None = None) -> None:
+    THROTTLE_STATUSES: tuple[int, ...] = (429, 503)
+    RANGE_CHUNK: int = 4*1024*1024
+    CHUNK_SIZE: int = 64*1024
+    LIVE_REFRESH: float = 6.0
+
+    def __init__(self, playlist_url: str, directory: str, name:str, extentiton_in: str = ".ts", extention_out: str = ".mp4", headers: dict = {}, middle_path:str | None = None, session:requests.Session | None = None, cache:MetadataCache | None = None, refresh:bool = False, ffmpeg:str = "ffmpeg", events:Events | None = None, archive:ArchiveIndex | None = None) -> None:
         self.headers = headers
+        self.events: Events = events if events is not None else Events()
+        self.ffmpeg: str = ffmpeg
+        self.session: requests.Session = session if session is not None else requests.Session()
+        self.cache: MetadataCache | None = cache
+        self.refresh: bool = refresh
+        self.limiter: AdaptiveLimiter | None = None
+        self.rate_limit: BandwidthShare | None = None
+        self.decryptor: SegmentDecryptor | None = None
+        self.archive: ArchiveIndex | None = archive
+        self.fingerprint: str | None = None
+        self.layout: list[tuple[str, int, int, int]] | None = None
         self.playlist_url: str = playlist_url
         self.middle_path:str | None = middle_path
-        self.streams:list[M3U8Index] = self.get_streams()
-        self.directory: str = directory
+        self.master: MasterPlaylist | None = None
+        self.directory: str = os.path.abspath(directory)
         self.name: str = self._valid_name(name)
-        self.temp_directory: str = os.path.join(self.directory, self.name)
+        self.temp_directory: str = os.path.join(self.directory, f".{self.name}.part")
+        self._temp_made: bool = False
+        self._temp_lock: BinaryIO | None = None
         self.extention_in = extentiton_in
         self.extention_out = extention_out
 
-    def get_streams(self) -> list[M3U8Index]:
+    @cached_property
+    def streams(self) -> list[Variant]:
+        """Variant streams, master playlist is downloaded on first use"""
+        with self.events.phase("get_streams", url=self.playlist_url):
+            return self.get_streams()
+
+    def get_streams(self) -> list[Variant]:
         """Return all streams"""
-        streams: list[M3U8Index] = []
-        #GETTING ALL STREAMS
-        content: str = requests.get(self.playlist_url, headers=self.headers).text
-        for index, line in enumerate(content.split("\n")):
-            if line.startswith("#EXT-X-STREAM-INF"):
-                parts: list[str] = line[18:].split(",")
-                url: str = str(content.split("\n")[index+1])
-                bandwidth: str|None = None
-                resolution: str|None = None
-                for i, part in enumerate(parts):
-                    if str(part).startswith("BANDWIDTH"):
-                        bandwidth=int(parts[i].split("=")[1])
-                    if str(part).startswith("RESOLUTION"):
-                        resolution=parts[i].split("=")[1]
-                if self.middle_path is not None:
-                    url_parts:list[str] = url.split("/")
-                    url_parts.insert(1,str(self.middle_path))
-                    url:str = "/".join(url_parts)
-                if not url.startswith("http"):
-                    url: str = self.playlist_url.rsplit("/", 1)[0] + "/" + url
-                #ADDING TO LIST
-                streams.append(M3U8Index(bandwidth=bandwidth,
-                                               resolution=resolution,
-                                               url=url))
-        return streams
-
-    def get_best_stream(self) -> M3U8Index:
+        return self._parseStreams(self._getMasterPlaylist())
+
+    async def asyncGetStreams(self, session: ClientSession) -> list[Variant]:
+        """Returns all streams, master playlist is downloaded over ``session`` if it was not downloaded before"""
+        if "streams" not in self.__dict__:
+            with self.events.phase("get_streams", url=self.playlist_url):
+                self.streams = self._parseStreams(await self._asyncGetMasterPlaylist(session))
+        return self.streams
+
+    def _parseStreams(self, content: str) -> list[Variant]:
+        """Parses master playlist and returns its streams"""
+        self.master: MasterPlaylist = parseMaster(content, self.playlist_url)
+        if self.middle_path is not None:
+            for stream in self.master.variants:
+                if not stream.uri.startswith("http"):
+                    uri_parts: list[str] = stream.uri.split("/")
+                    uri_parts.insert(1, str(self.middle_path))
+                    stream.url = urljoin(self.playlist_url, "/".join(uri_parts))
+        return self.master.variants
+
+    def _getMasterPlaylist(self) -> str:
+        """Returns contents of master playlist from ``cache`` or from server"""
+        if self.cache is not None and not self.refresh:
+            content: str | None = self.cache.get("master", self.playlist_url)
+            if content is not None:
+                return content
+        content: str = self.session.get(self.playlist_url, headers=self.headers).text
+        if self.cache is not None:
+            self.cache.set("master", self.playlist_url, content, signed=self.playlist_url)
+        return content
+
+    async def _asyncGetMasterPlaylist(self, session: ClientSession) -> str:
+        """Returns contents of master playlist from ``cache`` or from server"""
+        return await asyncGetMasterPlaylist(self.playlist_url, session, self.headers, self.cache, self.refresh)
+
+    def select_stream(self, selector: StreamSelector | None = None) -> Variant:
+        """Returns stream chosen by ``selector``, best stream if there is no selector"""
+        if selector is None:
+            return self.get_best_stream()
+        return selector.select(self.streams)
+
+    def get_duration(self) -> float:
+        """Returns duration of the video in seconds, read from media playlist of the smallest stream"""
+        stream: Variant = min(self.streams, key=lambda stream: stream.bandwidth or 0)
+        if self.cache is not None and not self.refresh:
+            duration: str | None = self.cache.get("duration", self.playlist_url)
+            if duration is not None:
+                return float(duration)
+        duration: float = parseMedia(self.session.get(stream.url, headers=self.headers).text, stream.url).duration
+        if self.cache is not None:
+            self.cache.set("duration", self.playlist_url, str(duration), signed=self.playlist_url)
+        return duration
+
+    async def asyncGetDuration(self, session: ClientSession) -> float:
+        """Returns duration of the video in seconds like ``get_duration``, playlists are downloaded over ``session``"""
+        stream: Variant = min(await self.asyncGetStreams(session), key=lambda stream: stream.bandwidth or 0)
+        if self.cache is not None and not self.refresh:
+            duration: str | None = self.cache.get("duration", self.playlist_url)
+            if duration is not None:
+                return float(duration)
+        async with session.get(stream.url, headers=self.headers) as response:
+            duration: float = parseMedia(await response.text(), stream.url).duration
+        if self.cache is not None:
+            self.cache.set("duration", self.playlist_url, str(duration), signed=self.playlist_url)
+        return duration
+
+    def get_best_stream(self) -> Variant:
         """Returns best stream"""
-        best_stream: M3U8Index = self.streams[0]
+        best_stream: Variant = self.streams[0]
         for stream in self.streams[1:]:
-            if stream.bandwith > best_stream.bandwith:
+            if (stream.bandwidth or 0) > (best_stream.bandwidth or 0):
                 best_stream = stream
         return best_stream
 
-    async def asyncDownload(self, stream: M3U8Index, base_url:str = "", maxRequestsAtTime:int = 100):
-        """Downloads segments asynchronously from index file"""
-        if base_url != "" or base_url is not None:
+    async def asyncDownload(self, stream: Variant, base_url:str = "", maxRequestsAtTime:int = 32, window:int | None = None, session:ClientSession | None = None, resume:bool = False, limiter:AdaptiveLimiter | None = None, pipe:bool = False, subtitles:list[tuple[str, str]] | None = None, rateLimit:BandwidthShare | None = None) -> str:
+        """Downloads segments concurrently and writes them in playlist order into one file
+        - at most ``window`` segments are held in memory
+        - number of concurrent requests is adapted by ``limiter`` up to ``maxRequestsAtTime``
+        - response bodies are read no faster than ``rateLimit`` allows
+        - progress is journaled next to the file, ``resume`` continues after the last complete segment
+        - ``pipe`` streams segments into ffmpeg and produces ``extention_out`` file without the ``extention_in`` one,
+          ``subtitles`` (name, path) are muxed into it
+        - with ``archive`` an already archived file with the same segments is reused and archived segments are read from disk
+        - temporary directory is removed when the download fails, unless it can be resumed
+        - returns path of the downloaded file in the temporary directory, ``_finish`` moves it into ``directory``"""
+        if base_url == "" or base_url is None:
+            base_url: str = stream.url.rsplit("/", 1)[0] + "/"
+        own_session: bool = session is None
+        if own_session:
+            session = ClientSession()
+        try:
+            async with session.get(stream.url, headers=self.headers) as response:
+                response.raise_for_status()
+                playlist: MediaPlaylist = parseMedia(await response.text(), base_url)
+            segments: list[Segment] = playlist.segments
+            self.fingerprint = segmentsFingerprint(segments)
+            self.layout = None
+            if self.archive is not None:
+                archived: str | None = await asyncio.to_thread(self._linkArchived, self.extention_out if pipe else self.extention_in)
+                if archived is not None:
+                    return archived
+            self.limiter = limiter if limiter is not None else AdaptiveLimiter(maximum=maxRequestsAtTime)
+            self.rate_limit = rateLimit
+            self.decryptor = SegmentDecryptor(lambda url: self._asyncGetKey(url, session))
+            if pipe:
+                return await self._asyncTrack(self._asyncPipeSegments(segments, session, window or 2*self.limiter.maximum, subtitles), stream, len(segments))
+            return await self._asyncTrack(self._asyncDownloadSegments(segments, session, window or 2*self.limiter.maximum, resume), stream, len(segments))
+        except BaseException:
+            self._discard_tempdir()
+            raise
+        finally:
+            if self.decryptor is not None:
+                self.decryptor.close()
+            if own_session:
+                await session.close()
+
+    async def asyncRecord(self, stream: Variant, base_url:str = "", maxRequestsAtTime:int = 32, window:int | None = None, session:ClientSession | None = None, limiter:AdaptiveLimiter | None = None, pipe:bool = False, duration:float | None = None, stop:asyncio.Event | None = None, subtitles:list[tuple[str, str]] | None = None, rateLimit:BandwidthShare | None = None) -> str:
+        """Records live or event playlist, only segments new since the last refresh are downloaded
+        - playlist is refreshed every target duration with conditional requests
+        - recording stops on ``#EXT-X-ENDLIST``, after ``duration`` seconds of video, when ``stop`` is set or on Ctrl+C
+          (without ``stop`` Ctrl+C is handled here, the previous SIGINT handler is restored afterwards)
+        - segments are read no faster than ``rateLimit`` allows
+        - returns path of the recorded file"""
+        if base_url == "" or base_url is None:
             base_url: str = stream.url.rsplit("/", 1)[0] + "/"
-        contents: str = requests.get(stream.url, headers=self.headers).text
-        session:ClientSession = ClientSession()
-        semaphore:asyncio.Semaphore = asyncio.Semaphore(maxRequestsAtTime)
-        tasks: list = []
-        for line in contents.split("\n"):
-            if not line.startswith("#"):
-                task = asyncio.create_task(self._asyncDownloadSegment(url=base_url+line, session=session, semaphore=semaphore))
-                tasks.append(task)
+        own_session: bool = session is None
+        if own_session:
+            session = ClientSession()
+        handle_signal: bool = stop is None
+        stop = stop if stop is not None else asyncio.Event()
+        previous_handler = signal.getsignal(signal.SIGINT)
+        if handle_signal:
+            try:
+                asyncio.get_running_loop().add_signal_handler(signal.SIGINT, stop.set)
+            except (NotImplementedError, RuntimeError, ValueError):
+                handle_signal = False
+        try:
+            self.limiter = limiter if limiter is not None else AdaptiveLimiter(maximum=maxRequestsAtTime)
+            self.rate_limit = rateLimit
+            self.decryptor = SegmentDecryptor(lambda url: self._asyncGetKey(url, session))
+            segments: AsyncIterator[Segment] = self._asyncPollSegments(stream, base_url, session, duration, stop)
+            if pipe:
+                return await self._asyncTrack(self._asyncPipeSegments(segments, session, window or 2*self.limiter.maximum, subtitles), stream)
+            return await self._asyncTrack(self._asyncWriteSegments(segments, session, window or 2*self.limiter.maximum), stream)
+        except BaseException:
+            self._discard_tempdir()
+            raise
+        finally:
+            if handle_signal:
+                asyncio.get_running_loop().remove_signal_handler(signal.SIGINT)
+                if previous_handler is not None:
+                    signal.signal(signal.SIGINT, previous_handler)
+            if self.decryptor is not None:
+                self.decryptor.close()
+            if own_session:
+                await session.close()
+
+    async def _asyncTrack(self, download:Awaitable[str], stream:Variant, segments:int | None = None) -> str:
+        """Awaits ``download`` and emits its start, finish or error events"""
+        start: float = time.perf_counter()
+        self.events.emit("download_start", video=self.name, segments=segments, url=stream.url, bandwidth=stream.bandwidth, resolution=stream.resolution)
+        try:
+            path: str = await download
+        except BaseException as e:
+            self.events.emit("download_error", video=self.name, error=repr(e), seconds=time.perf_counter() - start)
+            raise
+        self.events.emit("download_finish", video=self.name, bytes=os.path.getsize(path), seconds=time.perf_counter() - start)
+        return path
+
+    async def _asyncPollSegments(self, stream: Variant, base_url:str, session:ClientSession, duration:float | None, stop:asyncio.Event, tries:int = 5) -> AsyncIterator[Segment]:
+        """Yields segments of live playlist as they appear, diffed by media sequence number
+        - playlist is reloaded after its target duration, or after half of it when it didn't change or couldn't be downloaded
+        - segments that fell out of the playlist window before they were seen are reported"""
+        last_sequence: int = -1
+        recorded: float = 0.0
+        validators: dict[str, str] = {}
+        failures: int = 0
+        target: float = self.LIVE_REFRESH
+        while not stop.is_set():
+            delay: float = target / 2
+            try:
+                async with session.get(stream.url, headers={**self.headers, **validators}) as response:
+                    if response.status == 304:
+                        playlist: MediaPlaylist | None = None
+                    else:
+                        response.raise_for_status()
+                        playlist: MediaPlaylist | None = parseMedia(await response.text(), base_url)
+                        validators = {header: response.headers[source] for header, source in
+                                      (("If-None-Match", "ETag"), ("If-Modified-Since", "Last-Modified")) if source in response.headers}
+                failures = 0
+            except Exception as e:
+                failures += 1
+                if failures >= tries:
+                    raise M3U8_Error("Nepodařilo se obnovit playlist živého vysílání.", e)
+                playlist = None
+                delay = min(backoffDelay(failures), target / 2)
+            if playlist is not None:
+                new: list[Segment] = [segment for segment in playlist.segments if segment.sequence > last_sequence]
+                if last_sequence >= 0 and len(new) > 0 and new[0].sequence > last_sequence + 1:
+                    print(f"Segmenty {last_sequence+1}-{new[0].sequence-1} vypadly z playlistu dřív, než se stihly stáhnout, v záznamu budou chybět!")
+                for segment in new:
+                    last_sequence = segment.sequence
+                    yield segment
+                    recorded += segment.duration
+                    if duration is not None and recorded >= duration:
+                        return
+                if playlist.endlist:
+                    return
+                target = playlist.target_duration or self.LIVE_REFRESH
+                delay = target if len(new) > 0 else target / 2
+            try:
+                await asyncio.wait_for(stop.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _asyncWriteSegments(self, segments:AsyncIterable[Segment], session:ClientSession, window:int) -> str:
+        """Downloads ``segments`` as they come into the file in the temporary directory"""
+        self._make_tempdir()
+        path: str = os.path.join(self.temp_directory, self.name+self.extention_in)
+        with open(path, "wb") as f:
+            async with aclosing(self._asyncFetchInOrder(segments, session, window)) as fetched:
+                async for data in fetched:
+                    f.write(data)
+                    f.flush()
+        return path
+
+    async def _asyncDownloadSegments(self, segments:list[Segment], session:ClientSession, window:int, resume:bool) -> str:
+        """Downloads ``segments`` into the partial file in the temporary directory"""
+        self._make_tempdir(resume)
+        path: str = os.path.join(self.temp_directory, self.name+self.extention_in)
+        journal: SegmentJournal = SegmentJournal(path+".journal", segments)
+        done: int = 0
+        if resume:
+            open(path, "ab").close()
+            done = journal.load(path)
+            if 0 < done < len(segments):
+                print(f"Navazuji na stahování od segmentu {done+1}/{len(segments)}...")
+        else:
+            open(path, "wb").close()
+            journal.load(path)
+        try:
+            with open(path, "r+b") as f:
+                f.seek(journal.end)
+                index: int = done
+                async with aclosing(self._asyncFetchInOrder(segments[done:], session, window)) as fetched:
+                    async for data in fetched:
+                        offset: int = f.tell()
+                        f.write(data)
+                        f.flush()
+                        journal.append(index, offset, data)
+                        index += 1
+        finally:
+            journal.close()
+        self.layout = [(segments[index].id, offset, length, crc) for index, offset, length, crc in journal.records]
+        return path
+
+    async def _asyncPipeSegments(self, segments:Iterable[Segment] | AsyncIterable[Segment], session:ClientSession, window:int,
+                                 subtitles:list[tuple[str, str]] | None = None) -> str:
+        """Streams ``segments`` in order into ffmpeg which remuxes them into ``extention_out`` file
+        - ``subtitles`` are (name, path) of subtitle files muxed into the output"""
         self._make_tempdir()
-        os.chdir(self.temp_directory)
-        downloaded_data:list[str] = await asyncio.gather(*tasks)
-        await self._asyncWriteDownloadedData(downloaded_data)
-        await session.close()
-
-    async def _asyncDownloadSegment(self, url:str, session:ClientSession, semaphore:asyncio.Semaphore) -> str:
-        """Downloads asynchronously one segment"""
-        async with semaphore:
-            for tries in range(1,6):
-                try:
-                    response = await session.get(url=url, headers=self.headers)
-                    return await response.read()
-                except Exception as e:
-                    print(f"Connection error, trying in 5 seconds... {tries}/5")
-                    time.sleep(5)
-            else:
-                raise Exception(e)
-
-    async def _asyncWriteDownloadedData(self, data_list) -> None:
-        """Writes down downloaded data"""
-        with open(f"{self.name}{self.extention_in}", "wb") as f:
-            for data in data_list:
-                f.write(data)
-
-    def download(self, stream: M3U8Index, base_url:str = ""):
-        """Downloads segments from index file"""
-        if base_url != "" or base_url is not None:
+        path: str = os.path.join(self.temp_directory, self.name+self.extention_out)
+        try:
+            process: asyncio.subprocess.Process = await asyncio.create_subprocess_exec(
+                *self._ffmpegCommand("pipe:0", path, subtitles),
+                stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.PIPE)
+        except OSError as e:
+            raise M3U8_Error("Nepodařilo se spustit ffmpeg.", e)
+        stderr: asyncio.Task = asyncio.create_task(process.stderr.read())
+        broken: bool = False
+        try:
+            async with aclosing(self._asyncFetchInOrder(segments, session, window)) as fetched:
+                async for data in fetched:
+                    process.stdin.write(data)
+                    await process.stdin.drain()
+            process.stdin.close()
+        except (BrokenPipeError, ConnectionResetError):
+            broken = True
+        except BaseException:
+            process.kill()
+            await process.wait()
+            raise
+        returncode: int = await process.wait()
+        if returncode != 0 or broken:
+            raise M3U8_Error("Konvertování pomocí ffmpeg selhalo.", (await stderr).decode(errors="replace").strip())
+        return path
+
+    def _ffmpegCommand(self, source:str, destination:str, subtitles:list[tuple[str, str]] | None = None) -> list[str]:
+        """Returns ffmpeg arguments copying streams from ``source`` into ``destination``
+        - ``subtitles`` are (name, path) of subtitle files muxed in as subtitle streams, only video and audio
+          of ``source`` are kept then (MPEG-TS data and timed ID3 streams can't be stored in .mp4)"""
+        command: list[str] = [self.ffmpeg, "-y", "-loglevel", "error", "-i", source]
+        if not subtitles:
+            return command + ["-c", "copy", destination]
+        for _, path in subtitles:
+            command += ["-i", path]
+        command += ["-map", "0:v", "-map", "0:a?"]
+        for input_index in range(1, len(subtitles) + 1):
+            command += ["-map", str(input_index)]
+        command += ["-c", "copy", "-c:s", "mov_text"]
+        for stream_index, (subtitle_name, _) in enumerate(subtitles):
+            command += [f"-metadata:s:s:{stream_index}", f"title={subtitle_name}"]
+        return command + [destination]
+
+    async def _asyncFetchInOrder(self, segments:Iterable[Segment] | AsyncIterable[Segment], session:ClientSession, window:int) -> AsyncIterator[bytes]:
+        """Yields segments in order while keeping at most ``window`` of them scheduled
+        - ``segments`` can be async iterable producing segments over time (live playlists)"""
+        slots: asyncio.Semaphore = asyncio.Semaphore(window)
+        pending: asyncio.Queue[asyncio.Task | None] = asyncio.Queue()
+        async def schedule() -> None:
+            try:
+                async for segment in iterate(segments):
+                    await slots.acquire()
+                    pending.put_nowait(asyncio.create_task(self._asyncDownloadSegment(segment=segment, session=session)))
+            finally:
+                pending.put_nowait(None)
+        scheduler: asyncio.Task = asyncio.create_task(schedule())
+        try:
+            while (task := await pending.get()) is not None:
+                data: bytes = await task
+                slots.release()
+                yield data
+            await scheduler
+        finally:
+            scheduler.cancel()
+            while not pending.empty():
+                task = pending.get_nowait()
+                if task is not None:
+                    task.cancel()
+
+    async def _asyncDownloadSegment(self, segment:Segment, session:ClientSession) -> bytes | bytearray:
+        """Downloads asynchronously one segment (reads it from ``archive`` if it is there) and decrypts it if it is encrypted"""
+        start: float = time.perf_counter()
+        self.events.emit("segment_start", video=self.name, sequence=segment.sequence, url=segment.url)
+        data: bytes | bytearray | None = None
+        if self.archive is not None:
+            data = await asyncio.to_thread(self.archive.readSegment, segment.id)
+        if data is None:
+            data = await self._asyncFetchDecrypted(segment, session)
+        self.events.emit("segment_finish", video=self.name, sequence=segment.sequence, url=segment.url,
+                         bytes=len(data), seconds=time.perf_counter() - start)
+        return data
+
+    async def _asyncFetchDecrypted(self, segment:Segment, session:ClientSession) -> bytes | bytearray:
+        """Downloads one segment from server and decrypts it if it is encrypted"""
+        data: bytes | bytearray = await self._asyncFetchSegment(segment, session)
+        if segment.key is not None:
+            if self.decryptor is None:
+                self.decryptor = SegmentDecryptor(lambda url: self._asyncGetKey(url, session))
+            try:
+                data = await self.decryptor.decrypt(segment, data)
+            except Decryption_Error as e:
+                raise M3U8_Error(str(e), e.details)
+        return data
+
+    async def _asyncGetKey(self, url:str, session:ClientSession) -> bytes:
+        """Downloads decryption key"""
+        _, _, data = await self._asyncGet(url, session)
+        return bytes(data)
+
+    async def _asyncFetchSegment(self, segment:Segment, session:ClientSession) -> bytes | bytearray:
+        """Downloads asynchronously one segment
+        - segment is requested without range, if the server announces body bigger than ``RANGE_CHUNK`` and accepts ranges,
+          only its first ``RANGE_CHUNK`` bytes are read and the rest is fetched by parallel range requests
+        - ``#EXT-X-BYTERANGE`` segment requests just its range, split the same way when it is big"""
+        if segment.byterange is None:
+            _, headers, data = await self._asyncGet(segment.url, session, limit=self.RANGE_CHUNK)
+            length: int | None = self._contentLength(headers)
+            if length is None or len(data) >= length:
+                return data
+            return await self._asyncFetchRest(segment.url, session, data, 0, length)
+        offset, length = segment.byterange
+        status, _, data = await self._asyncGet(segment.url, session, offset, offset + min(length, self.RANGE_CHUNK) - 1)
+        if status != 206:
+            return data[offset:offset+length]
+        if len(data) >= length:
+            return data[:length]
+        return await self._asyncFetchRest(segment.url, session, data, offset, length)
+
+    async def _asyncFetchRest(self, url:str, session:ClientSession, data:bytes, offset:int, length:int) -> bytearray:
+        """Returns ``length`` bytes of ``url`` from ``offset``, ``data`` are the first of them
+        - the rest is fetched by ``_asyncFetchRanges`` straight into preallocated buffer"""
+        buffer: bytearray = bytearray(length)
+        buffer[:len(data)] = data
+        view: memoryview = memoryview(buffer)
+        def write(position:int, chunk:bytes) -> None:
+            view[position-offset:position-offset+len(chunk)] = chunk
+        await self._asyncFetchRanges(url, session, offset + len(data), offset + length, write)
+        return buffer
+
+    async def _asyncFetchRanges(self, url:str, session:ClientSession, start:int, end:int, write:Callable[[int, bytes], None]) -> None:
+        """Fetches bytes ``start``-``end`` (exclusive) of ``url`` by parallel range requests of ``RANGE_CHUNK`` bytes
+        - every chunk is passed to ``write`` with its offset in the file as soon as it arrives
+        - range the server does not send whole raises ``M3U8_Error`` instead of leaving the data truncated"""
+        async def fetchRange(first:int, last:int) -> None:
+            received: int = 0
+            def sink(position:int, chunk:bytes) -> None:
+                nonlocal received
+                start, end = max(position, first), min(position + len(chunk), last + 1)
+                if start < end:
+                    write(start, chunk[start-position:end-position])
+                    received += end - start
+            await self._asyncGet(url, session, first, last, sink=sink)
+            if received < last - first + 1:
+                raise M3U8_Error("Server neposlal celý segment.", f"{url} bytes={first}-{last}, přijato {received} B")
+        await asyncio.gather(*(fetchRange(first, min(first + self.RANGE_CHUNK, end) - 1) for first in range(start, end, self.RANGE_CHUNK)))
+
+    async def asyncDownloadFile(self, url:str, path:str, session:ClientSession | None = None, maxRequestsAtTime:int = 8,
+                                rateLimit:BandwidthShare | None = None) -> str:
+        """Downloads single file (progressive download) into ``path`` without holding it in memory
+        - ``HEAD`` request probes ``Accept-Ranges`` and ``Content-Length``, a file bigger than ``RANGE_CHUNK`` is preallocated
+          and fetched by parallel range requests, every chunk is written to its offset as it arrives
+        - other files are streamed into ``path`` by one request
+        - returns ``path``"""
+        own_session: bool = session is None
+        if own_session:
+            session = ClientSession()
+        if self.limiter is None:
+            self.limiter = AdaptiveLimiter(maximum=maxRequestsAtTime)
+        self.rate_limit = rateLimit
+        try:
+            try:
+                async with session.head(url, headers=self.headers, allow_redirects=True) as response:
+                    length: int | None = self._contentLength(response.headers) if self._canSplit(response, self.RANGE_CHUNK) else None
+            except Exception:
+                length = None
+            with open(path, "wb") as f:
+                fd: int = f.fileno()
+                write: Callable[[int, bytes], None] = lambda position, chunk: positionedWrite(fd, chunk, position)
+                if length is None:
+                    await self._asyncGet(url, session, sink=write)
+                else:
+                    os.truncate(fd, length)
+                    await self._asyncFetchRanges(url, session, 0, length, write)
+        finally:
+            if own_session:
+                await session.close()
+        return path
+
+    async def _asyncGet(self, url:str, session:ClientSession, first:int | None = None, last:int | None = None,
+                        sink:Callable[[int, bytes], None] | None = None, tries:int = 5,
+                        limit:int | None = None) -> tuple[int, CIMultiDictProxy, bytes]:
+        """Downloads ``url`` or its byte range ``first``-``last``
+        - with ``sink`` every chunk is passed to it with its offset in the file as soon as it arrives
+          and an interrupted range continues where it stopped
+        - with ``limit`` only first ``limit`` bytes are read of a bigger body the server can send by ranges,
+          the connection is closed then
+        - failed requests are retried after jittered exponential backoff without blocking other downloads
+        - time spent waiting for ``rate_limit`` is not counted into latency measured by ``limiter``
+        - returns status, headers and body (empty when ``sink`` is used)"""
+        received: int = 0
+        for attempt in range(1, tries+1):
+            delay: float = backoffDelay(attempt)
+            throttled: bool = False
+            done: bool = False
+            size: int = 0
+            waited: float = 0.0
+            headers: dict = self.headers
+            if first is not None:
+                headers = {**self.headers, "Range": f"bytes={first+received}-{'' if last is None else last}"}
+            start: float = await self.limiter.acquire()
+            try:
+                async with session.get(url=url, headers=headers) as response:
+                    if response.status in self.THROTTLE_STATUSES:
+                        throttled = True
+                        delay = max(delay, self._retryAfter(response.headers.get("Retry-After")))
+                    response.raise_for_status()
+                    if sink is None:
+                        partial: bool = limit is not None and self._canSplit(response, limit)
+                        data, waited = await self._asyncRead(response, limit if partial else None)
+                        if partial:
+                            response.close()
+                        size = len(data)
+                        done = True
+                        return response.status, response.headers, data
+                    position: int = first + received if response.status == 206 and first is not None else 0
+                    async for chunk in response.content.iter_chunked(self.CHUNK_SIZE):
+                        if self.rate_limit is not None:
+                            waited += await self.rate_limit.consume(len(chunk))
+                        sink(position, chunk)
+                        position += len(chunk)
+                        size += len(chunk)
+                        if response.status == 206:
+                            received += len(chunk)
+                    done = True
+                    return response.status, response.headers, b""
+            except Exception as e:
+                error: Exception = e
+            finally:
+                await self.limiter.release(start + waited, size=size, error=not done and not throttled, throttled=throttled)
+            if attempt < tries:
+                self.events.emit("segment_retry", video=self.name, url=url, attempt=attempt, delay=delay, error=repr(error))
+                print(f"Connection error, trying in {delay:.1f} seconds... {attempt}/{tries}")
+                await asyncio.sleep(delay)
+        raise ConnectionError(error)
+
+    async def _asyncRead(self, response:ClientResponse, limit:int | None = None) -> tuple[bytes, float]:
+        """Reads whole body of the response (or its first ``limit`` bytes), chunk by chunk if ``rate_limit`` is set
+        - returns the body and seconds spent waiting for ``rate_limit``"""
+        if self.rate_limit is None and limit is None:
+            return await response.read(), 0.0
+        data: bytearray = bytearray()
+        waited: float = 0.0
+        async for chunk in response.content.iter_chunked(self.CHUNK_SIZE):
+            if limit is not None:
+                chunk = chunk[:limit-len(data)]
+            if self.rate_limit is not None:
+                waited += await self.rate_limit.consume(len(chunk))
+            data += chunk
+            if limit is not None and len(data) >= limit:
+                break
+        return bytes(data), waited
+
+    def _canSplit(self, response:ClientResponse, limit:int) -> bool:
+        """Checks if the plain response announces body bigger than ``limit`` which can be fetched by ranges"""
+        return (response.status == 200 and (response.content_length or 0) > limit
+                and response.headers.get("Accept-Ranges", "").lower() == "bytes"
+                and "Content-Encoding" not in response.headers)
+
+    def _contentLength(self, headers:CIMultiDictProxy) -> int | None:
+        """Returns ``Content-Length`` header as number"""
+        try:
+            return int(headers["Content-Length"])
+        except (KeyError, ValueError):
+            return None
+
+    def _retryAfter(self, value:str | None) -> float:
+        """Returns delay requested by ``Retry-After`` header in seconds"""
+        try:
+            return min(float(value), 60.0)
+        except (TypeError, ValueError):
+            return 0.0
+
+    def download(self, stream: Variant, base_url:str = "") -> str:
+        """Downloads segments from index file
+        - returns path of the downloaded file in ``directory``"""
+        if base_url == "" or base_url is None:
             base_url: str = stream.url.rsplit("/", 1)[0] + "/"
-        contents: str = requests.get(stream.url, headers=self.headers).text
-        segment_num: int = 1
+        playlist: MediaPlaylist = parseMedia(self.session.get(stream.url, headers=self.headers).text, base_url)
         self._make_tempdir()
-        os.chdir(self.temp_directory)
-        for line in contents.split("\n"):
-            if not line.startswith("#"):
-                with open(f"{self.name}{self.extention_in}", "ab") as f:
-                    f.write(self._downloadSegment(base_url+line))
-                segment_num += 1
-
-    def _downloadSegment(self, url:str) -> str:
+        path: str = os.path.join(self.temp_directory, self.name+self.extention_in)
+        keys: dict[str, bytes] = {}
+        try:
+            with open(path, "wb") as f:
+                for segment in playlist.segments:
+                    data: bytes = self._downloadSegment(segment.url, segment.byterange)
+                    if segment.key is not None:
+                        data = self._decryptSegment(segment, data, keys)
+                    f.write(data)
+        except BaseException:
+            self._discard_tempdir()
+            raise
+        return self._finish(path)
+
+    def _decryptSegment(self, segment:Segment, data:bytes, keys:dict[str, bytes]) -> bytes:
+        """Decrypts one segment, downloaded keys are stored in ``keys``"""
+        if segment.key.method != "AES-128" or segment.key.url is None:
+            raise M3U8_Error("Nepodporovaný způsob šifrování segmentů.", segment.key.method)
+        if segment.key.url not in keys:
+            keys[segment.key.url] = self._downloadSegment(segment.key.url)
+        try:
+            return decryptAES128(data, keys[segment.key.url], segmentIV(segment))
+        except Decryption_Error as e:
+            raise M3U8_Error(str(e), e.details)
+
+    def _downloadSegment(self, url:str, byterange:tuple[int, int] | None = None) -> str:
         """Downloads one segment"""
+        headers: dict = self.headers
+        if byterange is not None:
+            headers = {**self.headers, "Range": f"bytes={byterange[0]}-{byterange[0]+byterange[1]-1}"}
         for tries in range(1,6):
             try:
-                return requests.get(url=url, headers=self.headers).content
+                response: requests.Response = self.session.get(url=url, headers=headers)
+                if byterange is not None and response.status_code != 206:
+                    return response.content[byterange[0]:byterange[0]+byterange[1]]
+                return response.content
             except ConnectionError as e:
                 print(f"Connection error, trying in 5 seconds... {tries}/5")
                 time.sleep(5)
         else:
             raise ConnectionError(e)
 
-    def _convert(self, remove: bool = True) -> None:
-        """Converts video file from ``extention_in`` to ``extention_out``"""
-        os.chdir(self.temp_directory)
-        command = [
-            'ffmpeg','-i',
-            f"\"{os.path.join(self.temp_directory, self.name+self.extention_in)}\"",
-            '-c:v', 'copy','-c:a', 'copy',
-            f"\"{os.path.join(self.directory, self.name+self.extention_out)}\""
-        ]
-        subprocess.check_call(" ".join(command))
-        #os.system(" ".join(command)) #does not work correctly with ffmpeg
+    def _convert(self, remove: bool = True, subtitles: list[tuple[str, str]] | None = None) -> str:
+        """Converts video file from ``extention_in`` to ``extention_out``
+        - ``subtitles`` are (name, path) of subtitle files muxed into the output
+        - converted file is renamed into ``directory`` only when ffmpeg succeeds, see ``_reserveDestination``
+        - returns path of the converted file"""
+        converted: str = os.path.join(self.temp_directory, self.name+".converted"+self.extention_out)
+        command: list[str] = self._ffmpegCommand(os.path.join(self.temp_directory, self.name+self.extention_in), converted, subtitles)
+        try:
+            subprocess.run(command, check=True, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        except subprocess.CalledProcessError as e:
+            raise M3U8_Error("Konvertování pomocí ffmpeg selhalo.", e.stderr.decode(errors="replace").strip())
+        except OSError as e:
+            raise M3U8_Error("Nepodařilo se spustit ffmpeg.", e)
+        destination: str = self._reserveDestination(self.extention_out)
+        os.replace(converted, destination)
         if remove:
             self._remove_tempdir()
+        return destination
+
+    def _finish(self, path: str) -> str:
+        """Moves finished file from temporary directory into ``directory`` by atomic rename and removes temporary directory
+        - returns new path of the file, see ``_reserveDestination``"""
+        destination: str = self._reserveDestination(os.path.splitext(path)[1])
+        os.replace(path, destination)
+        self._remove_tempdir()
+        return destination
+
+    def _reserveDestination(self, extention: str) -> str:
+        """Creates empty file for the finished video in ``directory`` and returns its path
+        - existing files are never overwritten, the name gets suffix `` (2)``, `` (3)``... when ``name`` is taken
+          (e.g. by another video with the same title or by a file of the user)
+        - the file is created exclusively, so concurrent jobs can't reserve the same name"""
+        number: int = 1
+        while True:
+            destination: str = os.path.join(self.directory, (self.name if number == 1 else f"{self.name} ({number})")+extention)
+            try:
+                with open(destination, "xb"):
+                    return destination
+            except FileExistsError:
+                number += 1
 
-    def _make_tempdir(self) -> None:
-        """Makes temporary directory in ``directory``"""
-        os.chdir(self.directory)
-        os.makedirs(self.name, exist_ok=True)
+    def _linkArchived(self, extention: str) -> str | None:
+        """Links archived file with the same segments as ``fingerprint`` into temporary directory (copies it if it can't be linked)
+        - returns its path there or ``None`` if there is no such file"""
+        record = self.archive.findContent(self.fingerprint, extention)
+        if record is None:
+            return None
+        print(f"Stejné video už je v archivu, použiji {record.path}...")
+        self._make_tempdir()
+        path: str = os.path.join(self.temp_directory, self.name+extention)
+        try:
+            os.link(record.path, path)
+        except OSError:
+            shutil.copyfile(record.path, path)
+        self.layout = self.archive.segmentsOf(record.path)
+        return path
+
+    def _make_tempdir(self, resume: bool = False) -> None:
+        """Makes temporary directory of the job in ``directory``
+        - resumable download uses directory named after the video and ``fingerprint`` of its segments so it can be found again,
+          it is locked while the job runs and a job finding it locked gets a unique directory like all other jobs"""
+        os.makedirs(self.directory, exist_ok=True)
+        self._unlock_tempdir()
+        if resume:
+            self.temp_directory = os.path.join(self.directory, f".{self.name}.{(self.fingerprint or '')[:16]}.part")
+            os.makedirs(self.temp_directory, exist_ok=True)
+            self._temp_made = True
+            self._temp_lock = lockFile(os.path.join(self.temp_directory, ".lock"))
+            if self._temp_lock is not None:
+                return
+            print("Stejné video se už stahuje jinde, stahuji ho bez navázání...")
+        self.temp_directory = tempfile.mkdtemp(prefix=f".{self.name}.", suffix=".part", dir=self.directory)
+        self._temp_made = True
     
     def _remove_tempdir(self) -> None:
         """Removes temporary directory from ``directory``"""
-        os.chdir(self.directory)
+        self._unlock_tempdir()
+        self._temp_made = False
         shutil.rmtree(self.temp_directory)
+
+    def _discard_tempdir(self) -> None:
+        """Cleans up temporary directory of a failed job, resumable directory is kept for the next attempt and only unlocked"""
+        if self._temp_lock is not None:
+            self._unlock_tempdir()
+            self._temp_made = False
+        elif self._temp_made:
+            self._temp_made = False
+            shutil.rmtree(self.temp_directory, ignore_errors=True)
+
+    def _unlock_tempdir(self) -> None:
+        """Releases lock of the resumable temporary directory"""
+        if self._temp_lock is not None:
+            self._temp_lock.close()
+            self._temp_lock = None
     
     def _valid_name(self, filename) -> str:
         """Returns valid name"""
@@ -160,9 +893,9 @@ class M3U8:
     def get_playlist(self) -> None:
         """Downloads playlist"""
         with open(f'{os.path.join(self.directory,"playlist.m3u8")}', "wb") as f:
-            f.write(requests.get(self.playlist_url, headers=self.headers).content)
+            f.write(self.session.get(self.playlist_url, headers=self.headers).content)
 
-    def get_index(self, index: M3U8Index) -> None:
+    def get_index(self, index: Variant) -> None:
         """Downloads index"""
         with open(f'{os.path.join(self.directory,f"index {index.resolution}.m3u8")}', "wb") as f:
-            f.write(requests.get(index.url, headers=self.headers).content)
+            f.write(self.session.get(index.url, headers=self.headers).content)
@@ -0,0 +1,106 @@
+"""Instrumentation module"""
+import json
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator
+from rich.progress import BarColumn, MofNCompleteColumn, Progress, TaskID, TextColumn, TimeElapsedColumn
+
+class Events:
+    """Hub of instrumentation events
+    - every event is a dict with ``event`` name, ``time`` and its own fields
+    - subscribers are called synchronously from the thread that emitted the event
+
+    Events:
+    - ``phase``: resolution step finished (``name``, ``seconds``, ``url``)
+    - ``download_start``: segments are about to be downloaded (``video``, ``segments``, ``bandwidth``)
+    - ``segment_start``, ``segment_finish`` (``bytes``, ``seconds``), ``segment_retry`` (``attempt``, ``delay``, ``error``)
+    - ``download_finish`` (``bytes``, ``seconds``) or ``download_error`` (``error``)"""
+
+    def __init__(self) -> None:
+        """Initializes ``Events`` class"""
+        self.subscribers:list[Callable[[dict], None]] = []
+
+    def subscribe(self, callback:Callable[[dict], None]) -> None:
+        """Registers ``callback`` called with every event"""
+        self.subscribers.append(callback)
+
+    def emit(self, event:str, **fields) -> None:
+        """Sends event to all subscribers"""
+        if len(self.subscribers) == 0:
+            return
+        record:dict = {"event": event, "time": time.time(), **fields}
+        for callback in self.subscribers:
+            callback(record)
+
+    @contextmanager
+    def phase(self, name:str, **fields) -> Iterator[None]:
+        """Measures the wrapped block and emits ``phase`` event with its duration"""
+        start:float = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.emit("phase", name=name, seconds=time.perf_counter() - start, **fields)
+
+class JsonLinesLog:
+    """Subscriber writing every event as one JSON line into ``path``"""
+
+    def __init__(self, path:str) -> None:
+        """Initializes ``JsonLinesLog`` class, events are appended to existing file"""
+        self.path:str = path
+        self._lock:threading.Lock = threading.Lock()
+        self._file = open(path, "a", encoding="utf-8")
+
+    def __call__(self, record:dict) -> None:
+        """Writes event"""
+        line:str = json.dumps(record, ensure_ascii=False, default=str)
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+
+    def close(self) -> None:
+        """Closes the log file"""
+        with self._lock:
+            self._file.close()
+
+class ProgressBar:
+    """Subscriber showing rich progress bar with segments, throughput and retries of every download"""
+
+    def __init__(self) -> None:
+        """Initializes ``ProgressBar`` class"""
+        self.progress:Progress = Progress(TextColumn("{task.description}"), BarColumn(), MofNCompleteColumn(),
+                                          TextColumn("{task.fields[speed]}"), TextColumn("{task.fields[retries]}"),
+                                          TimeElapsedColumn())
+        self._tasks:dict[str, TaskID] = {}
+        self._started:dict[str, float] = {}
+        self._bytes:dict[str, int] = {}
+        self._retries:dict[str, int] = {}
+
+    def __enter__(self) -> "ProgressBar":
+        """Starts showing the progress bar"""
+        self.progress.start()
+        return self
+
+    def __exit__(self, *_) -> None:
+        """Stops showing the progress bar"""
+        self.progress.stop()
+
+    def __call__(self, record:dict) -> None:
+        """Updates progress of the download the event belongs to"""
+        video:str | None = record.get("video")
+        if record["event"] == "download_start":
+            self._started[video] = time.perf_counter()
+            self._bytes[video] = 0
+            self._retries[video] = 0
+            self._tasks[video] = self.progress.add_task(video, total=record.get("segments"), speed="", retries="")
+        elif video not in self._tasks:
+            return
+        elif record["event"] == "segment_finish":
+            self._bytes[video] += record["bytes"]
+            elapsed:float = time.perf_counter() - self._started[video]
+            self.progress.update(self._tasks[video], advance=1, speed=f"{self._bytes[video]/elapsed/1_000_000:.2f} MB/s")
+        elif record["event"] == "segment_retry":
+            self._retries[video] += 1
+            self.progress.update(self._tasks[video], retries=f"opakování: {self._retries[video]}")
+        elif record["event"] in ("download_finish", "download_error"):
+            self.progress.stop_task(self._tasks[video])
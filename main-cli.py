@@ -1,16 +1,24 @@
+from contextlib import nullcontext
 import typer
 from typing_extensions import Annotated
 from pathlib import Path
-from prettytable import PrettyTable
-
-from downloadCT import CT as ct, CT_Gold as ctg
 
 app = typer.Typer(add_completion=False, context_settings={"help_option_names": ["-h", "--help"]})
 
 @app.command()
 def main(url:Annotated[str, typer.Option(
             "-u", "--url",
-            help="Url adresa na ČT", show_default=False)],
+            help="Url adresa na ČT", show_default=False)]
+            = None,
+         batch:Annotated[str, typer.Option(
+            "-b", "--batch",
+            help="Soubor se seznamem url adres (- pro stdin), za url může být váha jejího podílu na --rate-limit (např. <url> 2)",
+            show_default=False)]
+            = None,
+         show:Annotated[str, typer.Option(
+            "--show",
+            help="Url adresa pořadu, stáhnou se všechny jeho díly", show_default=False)]
+            = None,
          directory:Annotated[Path, typer.Option(
             "-d", "--directory",
             help="Umístění pro stažený soubor", show_default=True,
@@ -24,43 +32,193 @@ def main(url:Annotated[str, typer.Option(
             "-s", "--subtitles",
             help="Stahovat titulky", show_default=True)]
             = False,
+         vtt:Annotated[bool, typer.Option(
+            "--vtt",
+            help="Uložit titulky také ve formátu WebVTT", show_default=True)]
+            = False,
+         mux_subtitles:Annotated[bool, typer.Option(
+            "--mux-subtitles",
+            help="Vložit titulky do konvertovaného .mp4", show_default=True)]
+            = False,
          convert:Annotated[bool, typer.Option(
             "-c", "--convert",
             help="Konvertovat z .ts do .mp4", show_default=True)]
             = False,
+         pipe:Annotated[bool, typer.Option(
+            "-p", "--pipe",
+            help="Konvertovat do .mp4 rovnou při stahování, bez dočasného .ts", show_default=True)]
+            = False,
+         resume:Annotated[bool, typer.Option(
+            "--resume/--no-resume", "-r/-R",
+            help="Navázat na přerušené stahování", show_default=True)]
+            = True,
+         live:Annotated[bool, typer.Option(
+            "-l", "--live",
+            help="Nahrávat živé vysílání, dokud neskončí nebo není přerušeno (Ctrl+C)", show_default=True)]
+            = False,
+         duration:Annotated[float, typer.Option(
+            "--duration",
+            help="Nejdelší doba nahrávání živého vysílání v sekundách", show_default=False)]
+            = None,
+         max_resolution:Annotated[int, typer.Option(
+            "--max-resolution",
+            help="Nejvyšší rozlišení (výška v pixelech, např. 720)", show_default=False)]
+            = None,
+         min_resolution:Annotated[int, typer.Option(
+            "--min-resolution",
+            help="Stáhnout nejmenší stream s alespoň tímto rozlišením (výška v pixelech)", show_default=False)]
+            = None,
+         max_bitrate:Annotated[int, typer.Option(
+            "--max-bitrate",
+            help="Nejvyšší datový tok streamu v kbit/s", show_default=False)]
+            = None,
+         codec:Annotated[str, typer.Option(
+            "--codec",
+            help="Upřednostňovaný kodek (např. avc1, hvc1)", show_default=False)]
+            = None,
+         budget:Annotated[float, typer.Option(
+            "--budget",
+            help="Celková velikost dávky v GB, kvalita se rozvrhne podle odhadu před stahováním", show_default=False)]
+            = None,
          force_confirm:Annotated[bool, typer.Option(
             "-f", "--force-confirm",
             help="Přeskočit potvrzení pro stahování", show_default=True)]
-            = False
+            = False,
+         no_cache:Annotated[bool, typer.Option(
+            "--no-cache",
+            help="Nepoužívat mezipaměť informací o videích", show_default=True)]
+            = False,
+         refresh:Annotated[bool, typer.Option(
+            "--refresh",
+            help="Znovu zjistit informace o videích a obnovit mezipaměť", show_default=True)]
+            = False,
+         no_archive:Annotated[bool, typer.Option(
+            "--no-archive",
+            help="Nepoužívat archiv stažených videí (stáhnout znovu i to, co už je staženo)", show_default=True)]
+            = False,
+         verify_archive:Annotated[bool, typer.Option(
+            "--verify-archive",
+            help="Před přeskočením staženého videa ověřit jeho kontrolní součet", show_default=True)]
+            = False,
+         jobs:Annotated[int, typer.Option(
+            "-j", "--jobs",
+            help="Počet současně stahovaných videí v dávce", show_default=True)]
+            = 3,
+         connections:Annotated[int, typer.Option(
+            "--connections",
+            help="Maximální počet spojení v dávce", show_default=True)]
+            = 32,
+         connections_per_host:Annotated[int, typer.Option(
+            "--connections-per-host",
+            help="Maximální počet spojení na jeden server v dávce", show_default=True)]
+            = 16,
+         rate_limit:Annotated[str, typer.Option(
+            "--rate-limit",
+            help="Nejvyšší celková rychlost stahování v B/s (např. 500k, 2M) nebo rozvrh podle denní doby (např. 08:00-18:00=2M,18:00-08:00=max)",
+            show_default=False)]
+            = None,
+         job_rate_limit:Annotated[str, typer.Option(
+            "--job-rate-limit",
+            help="Nejvyšší rychlost stahování jednoho videa, zapisuje se stejně jako --rate-limit", show_default=False)]
+            = None,
+         progress:Annotated[bool, typer.Option(
+            "--progress/--no-progress",
+            help="Zobrazovat průběh stahování", show_default=True)]
+            = True,
+         events_log:Annotated[Path, typer.Option(
+            "--events",
+            help="Soubor, do kterého se zapisují události stahování (JSON lines)", show_default=False,
+            dir_okay=False, resolve_path=True)]
+            = None
             ):
    """Main CLI command for downloading videos from ČT"""
-   if url.startswith(ctg.VALID_URLS[0]):
-      c:ctg = ctg(url, directory, name)
-   c:ct = ct(url, directory, name)     
+   from prettytable import PrettyTable
+   from downloadCT import CT, getDownloader
+   from cache import MetadataCache
+   from archive import ArchiveIndex
+   from selection import StreamSelector
+   from events import Events, JsonLinesLog, ProgressBar
+   from concurrency import BandwidthLimiter, parseRate
+   if url is None and batch is None and show is None:
+      raise typer.BadParameter("Zadej --url, --batch nebo --show.")
+   if pipe and not convert:
+      raise typer.BadParameter("--pipe konvertuje při stahování, použij ho spolu s --convert (-c).")
+   if vtt and not subtitles:
+      raise typer.BadParameter("--vtt ukládá stažené titulky, použij ho spolu se --subtitles (-s).")
+   if mux_subtitles and not (subtitles and convert):
+      raise typer.BadParameter("--mux-subtitles vkládá stažené titulky do konvertovaného .mp4, použij ho spolu se --subtitles (-s) a --convert (-c).")
+   selector:StreamSelector | None = None
+   if any(option is not None for option in (max_resolution, min_resolution, max_bitrate, codec)):
+      selector = StreamSelector(maxHeight=max_resolution, minHeight=min_resolution,
+                                maxBandwidth=max_bitrate*1000 if max_bitrate is not None else None, codec=codec)
+   try:
+      limiter:BandwidthLimiter | None = None
+      if rate_limit is not None or job_rate_limit is not None:
+         limiter = BandwidthLimiter(parseRate(rate_limit), parseRate(job_rate_limit))
+   except ValueError as e:
+      raise typer.BadParameter(str(e))
+   cache:MetadataCache | None = None if no_cache else MetadataCache()
+   archive:ArchiveIndex | None = None if no_archive else ArchiveIndex()
+   events:Events = Events()
+   log:JsonLinesLog | None = JsonLinesLog(events_log) if events_log is not None else None
+   if log is not None:
+      events.subscribe(log)
+   bar:ProgressBar | None = ProgressBar() if progress else None
+   if bar is not None:
+      events.subscribe(bar)
+   try:
+      if batch is not None or show is not None:
+         from batch import Batch
+         if show is not None:
+            from crawlCT import ShowCrawler
+            urls = ShowCrawler(show).crawl()
+         else:
+            try:
+               urls = Batch.readUrls(batch)
+            except ValueError as e:
+               raise typer.BadParameter(str(e))
+         b:Batch = Batch(urls, str(directory), subs=subtitles, convert=convert, resume=resume, pipe=pipe,
+                         maxJobs=jobs, maxConnections=connections, maxConnectionsPerHost=connections_per_host,
+                         cache=cache, refresh=refresh, selector=selector,
+                         budget=int(budget*1_000_000_000) if budget is not None else None, events=events,
+                         archive=archive, verify=verify_archive, rateLimit=limiter)
+         with bar if bar is not None else nullcontext():
+            b.run()
+         b.displaySummary()
+         return
+      c:CT = getDownloader(url, str(directory), name, cache=cache, refresh=refresh, events=events, archive=archive)
 
-   if not force_confirm:
-      t:PrettyTable = PrettyTable()
-      t.align = "l"
-      t.header = False
-      t.add_row(["\033[1mNázev videa\033[0m", c.name])
-      t.add_row(["\033[1mURL videa\033[0m", c.url])
-      #t.add_row(["URL playlistu", c.playlist_url])
-      t.add_row(["\033[1mUmístění\033[0m", c.directory])
-      if subtitles and len(c.subtitles_urls) > 0:
-         t.add_row(["\033[1mStahovat titulky\033[0m", ", ".join(sub_name for sub_name, _ in c.subtitles_urls)])
-      elif subtitles and len(c.subtitles_urls) == 0:
-         t.add_row(["\033[1mStahovat titulky\033[0m", "Nejsou k dispozici"])
-      else:
-         t.add_row(["\033[1mStahovat titulky\033[0m", "Ne"])
-      t.add_row(["\033[1mKonvertovat z .ts do .mp4\033[0m", "Ano" if convert else "Ne"])
-      print("\033[H\033[J", end="")
-      print(t)
+      if not force_confirm:
+         t:PrettyTable = PrettyTable()
+         t.align = "l"
+         t.header = False
+         t.add_row(["\033[1mNázev videa\033[0m", c.name])
+         t.add_row(["\033[1mURL videa\033[0m", c.url])
+         #t.add_row(["URL playlistu", c.playlist_url])
+         t.add_row(["\033[1mUmístění\033[0m", c.directory])
+         if subtitles and len(c.subtitles_urls) > 0:
+            t.add_row(["\033[1mStahovat titulky\033[0m", ", ".join(sub_name for sub_name, _ in c.subtitles_urls)])
+         elif subtitles and len(c.subtitles_urls) == 0:
+            t.add_row(["\033[1mStahovat titulky\033[0m", "Nejsou k dispozici"])
+         else:
+            t.add_row(["\033[1mStahovat titulky\033[0m", "Ne"])
+         t.add_row(["\033[1mKvalita\033[0m", c.video.select_stream(selector).resolution])
+         t.add_row(["\033[1mKonvertovat z .ts do .mp4\033[0m", "Ano" if convert else "Ne"])
+         if live:
+            t.add_row(["\033[1mNahrávat živě\033[0m", f"{duration:.0f} s" if duration is not None else "Do konce vysílání"])
+         print("\033[H\033[J", end="")
+         print(t)
 
-      print("Přejete si stáhnout toto video podle těchno nastavení? \033[1mY/N\033[0m")
-      if input().upper() == "Y":
-         c.download(subs=subtitles, convert=convert)
-      return
-   c.download(subs=subtitles, convert=convert)
+         print("Přejete si stáhnout toto video podle těchno nastavení? \033[1mY/N\033[0m")
+         if input().upper() != "Y":
+            return
+      with bar if bar is not None else nullcontext():
+         c.download(subs=subtitles, convert=convert, resume=resume, pipe=pipe, live=live, duration=duration, selector=selector,
+                    vtt=vtt, mux=mux_subtitles, verify=verify_archive,
+                    rateLimit=limiter.share() if limiter is not None else None)
+   finally:
+      if log is not None:
+         log.close()
 
 if __name__ == "__main__":
     app()
@@ -0,0 +1,120 @@
+"""Page scanning module"""
+import codecs
+from html.parser import HTMLParser
+from typing import Callable, Iterable
+import requests
+from aiohttp import ClientResponse
+
+class PageInfo:
+    """Parts of the page used by downloaders"""
+    __slots__ = ("ld_json", "iframes", "title")
+
+    def __init__(self) -> None:
+        """Initializes ``PageInfo`` class"""
+        self.ld_json:list[str] = []
+        self.iframes:list[str] = []
+        self.title:str | None = None
+
+class PageScanner(HTMLParser):
+    """Incremental page scanner
+    - collects ``application/ld+json`` scripts, iframe sources and title
+    - ``enough`` tells when all needed parts were found, the rest of the page is not parsed"""
+
+    def __init__(self, enough:Callable[[PageInfo], bool]) -> None:
+        """Initializes ``PageScanner`` class"""
+        super().__init__(convert_charrefs=True)
+        self.enough:Callable[[PageInfo], bool] = enough
+        self.page:PageInfo = PageInfo()
+        self.done:bool = False
+        self._capture:str | None = None
+        self._buffer:list[str] = []
+
+    def handle_starttag(self, tag:str, attrs:list[tuple[str, str | None]]) -> None:
+        """Starts capturing ld+json scripts and title, stores iframe sources"""
+        if tag == "script" and ("type", "application/ld+json") in attrs:
+            self._capture = "script"
+        elif tag == "title" and self.page.title is None:
+            self._capture = "title"
+        elif tag == "iframe":
+            src:str | None = dict(attrs).get("src")
+            if src is not None:
+                self.page.iframes.append(src)
+                self._check()
+
+    def handle_data(self, data:str) -> None:
+        """Collects contents of captured tag"""
+        if self._capture is not None:
+            self._buffer.append(data)
+
+    def handle_endtag(self, tag:str) -> None:
+        """Stores contents of captured tag"""
+        if self._capture is not None and tag == self._capture:
+            contents:str = "".join(self._buffer)
+            if tag == "script":
+                self.page.ld_json.append(contents)
+            else:
+                self.page.title = contents
+            self._capture = None
+            self._buffer = []
+            self._check()
+
+    def _check(self) -> None:
+        """Marks scanner as done when ``enough`` is satisfied"""
+        if not self.done and self.enough(self.page):
+            self.done = True
+
+def scanChunks(chunks:Iterable[str], enough:Callable[[PageInfo], bool]) -> tuple[PageInfo | None, str]:
+    """Scans page chunks until ``enough`` is satisfied
+    - returns found parts (``None`` if they are not on the page) and text read so far"""
+    scanner:PageScanner = PageScanner(enough)
+    read:list[str] = []
+    for chunk in chunks:
+        read.append(chunk)
+        scanner.feed(chunk)
+        if scanner.done:
+            return scanner.page, "".join(read)
+    return None, "".join(read)
+
+def scanSoup(text:str) -> PageInfo:
+    """Parses the whole page using BeautifulSoup"""
+    from bs4 import BeautifulSoup
+    soup:BeautifulSoup = BeautifulSoup(text, "html.parser")
+    page:PageInfo = PageInfo()
+    page.ld_json = [script.string or "" for script in soup.find_all("script", {"type": "application/ld+json"})]
+    page.iframes = [iframe["src"] for iframe in soup.find_all("iframe", src=True)]
+    title = soup.find("title")
+    page.title = title.text if title is not None else None
+    return page
+
+def scanResponse(response:requests.Response, enough:Callable[[PageInfo], bool], chunk_size:int = 16384) -> PageInfo:
+    """Scans streamed response and stops reading it as soon as ``enough`` is satisfied
+    - falls back to parsing the whole page when the fast scan misses"""
+    decoder = codecs.getincrementaldecoder(response.encoding or "utf-8")(errors="replace")
+    chunks:Iterable[str] = (decoder.decode(chunk) for chunk in response.iter_content(chunk_size=chunk_size))
+    try:
+        page, read = scanChunks(chunks, enough)
+        if page is not None:
+            return page
+        return scanSoup(read + decoder.decode(b"", final=True))
+    finally:
+        response.close()
+
+async def asyncScanResponse(response:ClientResponse, enough:Callable[[PageInfo], bool], chunk_size:int = 16384) -> PageInfo:
+    """Scans aiohttp response the same way as ``scanResponse``
+    - connection is closed once ``enough`` is satisfied, fully read response keeps its connection alive"""
+    decoder = codecs.getincrementaldecoder(response.charset or "utf-8")(errors="replace")
+    scanner:PageScanner = PageScanner(enough)
+    read:list[str] = []
+    try:
+        async for chunk in response.content.iter_chunked(chunk_size):
+            text:str = decoder.decode(chunk)
+            read.append(text)
+            scanner.feed(text)
+            if scanner.done:
+                response.close()
+                return scanner.page
+    except BaseException:
+        response.close()
+        raise
+    response.release()
+    return scanSoup("".join(read) + decoder.decode(b"", final=True))
@@ -0,0 +1,241 @@
+"""M3U8 playlist parsing module"""
+import re
+from urllib.parse import urljoin, urlsplit
+
+ATTRIBUTE_PATTERN: re.Pattern = re.compile(r'([A-Z0-9-]+)=("[^"]*"|[^,]*)')
+
+def parseAttributes(text: str) -> dict[str, str]:
+    """Parses attribute list of a tag, quoted values may contain commas"""
+    return {name: value[1:-1] if value.startswith('"') else value
+            for name, value in ATTRIBUTE_PATTERN.findall(text)}
+
+class Key:
+    """Encryption key of segments (``#EXT-X-KEY``)"""
+    __slots__ = ("method", "url", "iv", "keyformat")
+
+    def __init__(self, method: str, url: str | None = None, iv: bytes | None = None, keyformat: str | None = None) -> None:
+        """Initializes Key class"""
+        self.method: str = method
+        self.url: str | None = url
+        self.iv: bytes | None = iv
+        self.keyformat: str | None = keyformat
+
+class Segment:
+    """Media segment"""
+    __slots__ = ("url", "duration", "sequence", "byterange", "discontinuity", "key")
+
+    def __init__(self, url: str, duration: float = 0.0, sequence: int = 0, byterange: tuple[int, int] | None = None,
+                 discontinuity: bool = False, key: Key | None = None) -> None:
+        """Initializes Segment class
+        - ``byterange`` is (offset, length) of the segment inside ``url``"""
+        self.url: str = url
+        self.duration: float = duration
+        self.sequence: int = sequence
+        self.byterange: tuple[int, int] | None = byterange
+        self.discontinuity: bool = discontinuity
+        self.key: Key | None = key
+
+    @property
+    def id(self) -> str:
+        """Identifies segment regardless of signed query of the url
+        - host is kept, generic paths like ``/hls/720/segment-0.ts`` of different servers are different segments"""
+        url = urlsplit(self.url)
+        if self.byterange is None:
+            return url.netloc + url.path
+        return f"{url.netloc}{url.path}@{self.byterange[0]}:{self.byterange[1]}"
+
+class Variant:
+    """Variant stream (``#EXT-X-STREAM-INF``)"""
+    __slots__ = ("url", "uri", "bandwidth", "average_bandwidth", "resolution", "codecs", "frame_rate", "audio", "subtitles")
+
+    def __init__(self, url: str, bandwidth: int | None = None, resolution: str | None = None, codecs: str | None = None,
+                 average_bandwidth: int | None = None, frame_rate: float | None = None,
+                 audio: str | None = None, subtitles: str | None = None, uri: str | None = None) -> None:
+        """Initializes Variant class
+        - ``url`` is absolute, ``uri`` is as written in playlist"""
+        self.url: str = url
+        self.uri: str = uri if uri is not None else url
+        self.bandwidth: int | None = bandwidth
+        self.average_bandwidth: int | None = average_bandwidth
+        self.resolution: str | None = resolution
+        self.codecs: str | None = codecs
+        self.frame_rate: float | None = frame_rate
+        self.audio: str | None = audio
+        self.subtitles: str | None = subtitles
+
+    @property
+    def bandwith(self) -> int | None:
+        """Bandwidth of the stream"""
+        return self.bandwidth
+
+    @property
+    def height(self) -> int | None:
+        """Vertical resolution of the stream"""
+        try:
+            return int(self.resolution.split("x")[1])
+        except (AttributeError, IndexError, ValueError):
+            return None
+
+    def __str__(self) -> str:
+        """If print statement is placed on Variant"""
+        return "STREAM"+"\n"+f"\t - resolution: {self.resolution}"+"\n"+f"\t - bandwith: {self.bandwidth}"
+
+class Rendition:
+    """Alternative audio or subtitle rendition (``#EXT-X-MEDIA``)"""
+    __slots__ = ("type", "group_id", "name", "language", "default", "autoselect", "url")
+
+    def __init__(self, type: str, group_id: str, name: str, language: str | None = None,
+                 default: bool = False, autoselect: bool = False, url: str | None = None) -> None:
+        """Initializes Rendition class"""
+        self.type: str = type
+        self.group_id: str = group_id
+        self.name: str = name
+        self.language: str | None = language
+        self.default: bool = default
+        self.autoselect: bool = autoselect
+        self.url: str | None = url
+
+class MasterPlaylist:
+    """Master playlist with variant streams and renditions"""
+    __slots__ = ("variants", "renditions", "version", "independent_segments")
+
+    def __init__(self) -> None:
+        """Initializes MasterPlaylist class"""
+        self.variants: list[Variant] = []
+        self.renditions: list[Rendition] = []
+        self.version: int | None = None
+        self.independent_segments: bool = False
+
+class MediaPlaylist:
+    """Media playlist with segments"""
+    __slots__ = ("segments", "target_duration", "media_sequence", "discontinuity_sequence", "version", "playlist_type", "endlist")
+
+    def __init__(self) -> None:
+        """Initializes MediaPlaylist class"""
+        self.segments: list[Segment] = []
+        self.target_duration: float | None = None
+        self.media_sequence: int = 0
+        self.discontinuity_sequence: int = 0
+        self.version: int | None = None
+        self.playlist_type: str | None = None
+        self.endlist: bool = False
+
+    @property
+    def duration(self) -> float:
+        """Total duration of all segments in seconds"""
+        return sum(segment.duration for segment in self.segments)
+
+def parseMaster(content: str, base_url: str) -> MasterPlaylist:
+    """Parses master playlist in one pass"""
+    playlist: MasterPlaylist = MasterPlaylist()
+    stream_info: dict[str, str] | None = None
+    for line in content.splitlines():
+        line = line.strip()
+        if line == "":
+            continue
+        if line[0] != "#":
+            if stream_info is not None:
+                playlist.variants.append(_variant(stream_info, line, base_url))
+                stream_info = None
+        elif line.startswith("#EXT-X-STREAM-INF:"):
+            stream_info = parseAttributes(line[18:])
+        elif line.startswith("#EXT-X-MEDIA:"):
+            attributes: dict[str, str] = parseAttributes(line[13:])
+            playlist.renditions.append(Rendition(type=attributes.get("TYPE", ""),
+                                                 group_id=attributes.get("GROUP-ID", ""),
+                                                 name=attributes.get("NAME", ""),
+                                                 language=attributes.get("LANGUAGE"),
+                                                 default=attributes.get("DEFAULT") == "YES",
+                                                 autoselect=attributes.get("AUTOSELECT") == "YES",
+                                                 url=urljoin(base_url, attributes["URI"]) if "URI" in attributes else None))
+        elif line.startswith("#EXT-X-VERSION:"):
+            playlist.version = int(line[15:])
+        elif line == "#EXT-X-INDEPENDENT-SEGMENTS":
+            playlist.independent_segments = True
+    return playlist
+
+def _variant(attributes: dict[str, str], uri: str, base_url: str) -> Variant:
+    """Makes Variant from attributes of ``#EXT-X-STREAM-INF``"""
+    def number(name: str, convert: type) -> int | float | None:
+        try:
+            return convert(attributes[name])
+        except (KeyError, ValueError):
+            return None
+    return Variant(url=urljoin(base_url, uri), uri=uri,
+                   bandwidth=number("BANDWIDTH", int),
+                   average_bandwidth=number("AVERAGE-BANDWIDTH", int),
+                   resolution=attributes.get("RESOLUTION"),
+                   codecs=attributes.get("CODECS"),
+                   frame_rate=number("FRAME-RATE", float),
+                   audio=attributes.get("AUDIO"),
+                   subtitles=attributes.get("SUBTITLES"))
+
+def parseMedia(content: str, base_url: str) -> MediaPlaylist:
+    """Parses media playlist in one pass"""
+    playlist: MediaPlaylist = MediaPlaylist()
+    segments: list[Segment] = playlist.segments
+    duration: float = 0.0
+    byterange: tuple[int, int | None] | None = None
+    discontinuity: bool = False
+    key: Key | None = None
+    ends: dict[str, int] = {}
+    join = _joiner(base_url)
+    for line in content.splitlines():
+        if line == "" or line.isspace():
+            continue
+        if line[0] != "#":
+            url: str = join(line.strip())
+            segment_range: tuple[int, int] | None = None
+            if byterange is not None:
+                length, offset = byterange
+                if offset is None:
+                    offset = ends.get(url, 0)
+                ends[url] = offset + length
+                segment_range = (offset, length)
+            segments.append(Segment(url, duration, playlist.media_sequence + len(segments), segment_range, discontinuity, key))
+            duration = 0.0
+            byterange = None
+            discontinuity = False
+        elif line.startswith("#EXTINF:"):
+            duration = float(line[8:].split(",", 1)[0])
+        elif line.startswith("#EXT-X-BYTERANGE:"):
+            length, _, offset = line[17:].strip().partition("@")
+            byterange = (int(length), int(offset) if offset != "" else None)
+        elif line.startswith("#EXT-X-DISCONTINUITY"):
+            if line.startswith("#EXT-X-DISCONTINUITY-SEQUENCE:"):
+                playlist.discontinuity_sequence = int(line[30:])
+            else:
+                discontinuity = True
+        elif line.startswith("#EXT-X-KEY:"):
+            key = _key(parseAttributes(line[11:]), base_url)
+        elif line.startswith("#EXT-X-TARGETDURATION:"):
+            playlist.target_duration = float(line[22:])
+        elif line.startswith("#EXT-X-MEDIA-SEQUENCE:"):
+            playlist.media_sequence = int(line[22:])
+        elif line.startswith("#EXT-X-PLAYLIST-TYPE:"):
+            playlist.playlist_type = line[21:].strip()
+        elif line.startswith("#EXT-X-VERSION:"):
+            playlist.version = int(line[15:])
+        elif line.startswith("#EXT-X-ENDLIST"):
+            playlist.endlist = True
+    return playlist
+
+def _joiner(base_url: str):
+    """Returns function making absolute urls, plain relative paths skip the generic ``urljoin``"""
+    base_directory: str = urljoin(base_url, ".")
+    def join(uri: str) -> str:
+        if "://" in uri or uri[0] in "/.?#" or "/." in uri:
+            return urljoin(base_url, uri)
+        return base_directory + uri
+    return join
+
+def _key(attributes: dict[str, str], base_url: str) -> Key | None:
+    """Makes Key from attributes of ``#EXT-X-KEY``"""
+    method: str = attributes.get("METHOD", "NONE")
+    if method == "NONE":
+        return None
+    iv: str | None = attributes.get("IV")
+    return Key(method=method,
+               url=urljoin(base_url, attributes["URI"]) if "URI" in attributes else None,
+               iv=bytes.fromhex(iv[2:]) if iv is not None and iv[:2] in ("0x", "0X") else None,
+               keyformat=attributes.get("KEYFORMAT"))
@@ -0,0 +1,81 @@
+"""Rendition selection module"""
+from parseM3u8 import Variant
+
+def streamBandwidth(stream:Variant) -> int:
+    """Returns average bandwidth of the stream if known, peak bandwidth otherwise"""
+    return stream.average_bandwidth or stream.bandwidth or 0
+
+def estimateSize(stream:Variant, duration:float) -> int:
+    """Estimates size of the stream in bytes from its bandwidth and ``duration`` in seconds"""
+    return int(streamBandwidth(stream) * duration / 8)
+
+class StreamSelector:
+    """Selects variant stream of master playlist
+    - ``maxHeight`` and ``maxBandwidth`` cap resolution and bitrate
+    - ``minHeight`` picks the smallest stream with at least this resolution (e.g. smallest ≥ 720p)
+    - ``codec`` prefers streams whose codecs start with it (e.g. ``avc1``, ``hvc1``)
+    - when no stream fits the caps, the smallest one is selected"""
+
+    def __init__(self, maxHeight:int | None = None, maxBandwidth:int | None = None,
+                 minHeight:int | None = None, codec:str | None = None) -> None:
+        """Initializes ``StreamSelector`` class"""
+        self.maxHeight:int | None = maxHeight
+        self.maxBandwidth:int | None = maxBandwidth
+        self.minHeight:int | None = minHeight
+        self.codec:str | None = codec
+
+    def candidates(self, streams:list[Variant]) -> list[Variant]:
+        """Returns streams allowed by the selector ordered from the smallest to the biggest"""
+        streams = sorted(streams, key=streamBandwidth)
+        if self.codec is not None:
+            preferred:list[Variant] = [stream for stream in streams if self._hasCodec(stream)]
+            streams = preferred if len(preferred) > 0 else streams
+        allowed:list[Variant] = [stream for stream in streams if self._fitsCaps(stream)]
+        if len(allowed) == 0:
+            return streams[:1]
+        if self.minHeight is not None:
+            high:list[Variant] = [stream for stream in allowed if (stream.height or 0) >= self.minHeight]
+            return high[:1] if len(high) > 0 else allowed[-1:]
+        return allowed
+
+    def select(self, streams:list[Variant]) -> Variant:
+        """Returns the best stream allowed by the selector"""
+        return self.candidates(streams)[-1]
+
+    def _fitsCaps(self, stream:Variant) -> bool:
+        """Checks resolution and bitrate caps, unknown values pass"""
+        if self.maxHeight is not None and stream.height is not None and stream.height > self.maxHeight:
+            return False
+        if self.maxBandwidth is not None and (stream.bandwidth or 0) > self.maxBandwidth:
+            return False
+        return True
+
+    def _hasCodec(self, stream:Variant) -> bool:
+        """Checks if some codec of the stream starts with ``codec``"""
+        if stream.codecs is None:
+            return False
+        return any(codec.strip().startswith(self.codec) for codec in stream.codecs.split(","))
+
+def planBudget(episodes:list[tuple[list[Variant], float]], budget:int, selector:StreamSelector | None = None) -> list[Variant]:
+    """Selects one stream per episode so that estimated total size fits into ``budget`` bytes
+    - ``episodes`` are (streams, duration in seconds) pairs
+    - every episode starts with its smallest allowed stream, then the episode with the lowest
+      bitrate is upgraded while the budget allows it, so quality stays even across the batch
+    - if even the smallest streams do not fit, they are returned anyway"""
+    selector = selector if selector is not None else StreamSelector()
+    candidates:list[list[Variant]] = [selector.candidates(streams) for streams, _ in episodes]
+    levels:list[int] = [0] * len(episodes)
+    total:int = sum(estimateSize(streams[0], duration) for streams, (_, duration) in zip(candidates, episodes))
+    upgradable:set[int] = {i for i, streams in enumerate(candidates) if len(streams) > 1}
+    while len(upgradable) > 0:
+        i:int = min(upgradable, key=lambda i: (streamBandwidth(candidates[i][levels[i]]), i))
+        duration:float = episodes[i][1]
+        cost:int = estimateSize(candidates[i][levels[i]+1], duration) - estimateSize(candidates[i][levels[i]], duration)
+        if total + cost > budget:
+            upgradable.discard(i)
+            continue
+        total += cost
+        levels[i] += 1
+        if levels[i] == len(candidates[i]) - 1:
+            upgradable.discard(i)
+    return [streams[level] for streams, level in zip(candidates, levels)]
@@ -0,0 +1,341 @@
+"""Local stand-in for ČT servers"""
+import asyncio
+import json
+import os
+import random
+import time
+import typer
+from typing_extensions import Annotated
+from aiohttp import web
+from decrypt import encryptAES128
+
+def syntheticSubtitles(hours:float = 1.0, every:int = 3000) -> str:
+    """Returns subtitles in ČT text format with one cue every ``every`` milliseconds for ``hours`` hours"""
+    cues:list[str] = []
+    for index, start in enumerate(range(0, int(hours * 3_600_000), every), 1):
+        cues.append(f"{index}; {start} {start + every - 200}\nŘádek titulků číslo {index}\n- a jeho druhý řádek.\n")
+    return "\n".join(cues) + "\n"
+
+class StandIn:
+    """Local HTTP stand-in for ceskatelevize.cz
+    - serves saved fixtures from ``fixtures`` directory, show pages ``/porady/...`` are then served from saved
+      ``<fixtures>/porady/.../index.html`` (``page-<n>.html`` for ``?page=<n>``) instead of the synthetic show
+    - serves synthetic paginated show ``/porady/<show>/`` with ``episodes`` episodes
+    - serves CT episode pages ``/video/<id>/``, CT Gold pages ``/zlata/<id>/`` and the playlist API
+    - serves synthetic HLS stream ``/hls/master.m3u8`` with ``segments`` segments of ``segmentSize`` bytes
+      in every variant of ``heights``, segments support byte ranges
+    - with ``encrypted`` the segments are encrypted by AES-128 with key ``KEY`` served at ``/hls/key.bin``
+      and IV from their media sequence number, they decrypt to the same bytes as the unencrypted ones
+    - serves ``subtitleTracks`` synthetic subtitle tracks ``/subtitles/<track>.txt`` of ``subtitleHours`` hours
+    - video pages, playlist API and every HLS response are delayed by ``latency`` seconds,
+      HLS responses are sent at most ``bandwidth`` bytes per second,
+      segment requests fail with 503 with ``errorRate`` probability"""
+
+    PLAYER_URL:str = "https://www.ceskatelevize.cz/ivysilani/embed/iFramePlayer.php?"
+    KEY:bytes = bytes(range(16))
+
+    def __init__(self, fixtures:str | None = None, episodes:int = 300, perPage:int = 20, host:str = "127.0.0.1", port:int = 0,
+                 segments:int = 100, segmentSize:int = 1_000_000, heights:tuple[int, ...] = (360, 720, 1080),
+                 latency:float = 0.0, bandwidth:int | None = None, errorRate:float = 0.0,
+                 subtitleTracks:int = 2, subtitleHours:float = 1.0, encrypted:bool = False) -> None:
+        """Initializes ``StandIn`` class"""
+        self.fixtures:str | None = fixtures
+        self.episodes:int = episodes
+        self.perPage:int = perPage
+        self.host:str = host
+        self.port:int = port
+        self.segments:int = segments
+        self.segmentSize:int = segmentSize
+        self.heights:tuple[int, ...] = heights
+        self.latency:float = latency
+        self.bandwidth:int | None = bandwidth
+        self.errorRate:float = errorRate
+        self.subtitleTracks:int = subtitleTracks
+        self.subtitleHours:float = subtitleHours
+        self.encrypted:bool = encrypted
+        self._encrypted_segments:dict[int, bytes] = {}
+        self._subtitle_text:bytes | None = None
+        self.runner:web.AppRunner | None = None
+        self.requests:int = 0
+        self.errors:int = 0
+        self.first_segment:float | None = None
+        self._payload:bytes = bytes(random.Random(0).getrandbits(8) for _ in range(min(segmentSize, 65536)))
+
+    @property
+    def url(self) -> str:
+        """Base url of the running stand-in"""
+        return f"http://{self.host}:{self.port}/"
+
+    def makeApp(self) -> web.Application:
+        """Returns aiohttp application of the stand-in"""
+        app:web.Application = web.Application()
+        app.router.add_get("/porady/{show}/", self._show)
+        app.router.add_get("/porady/{show}/dily/", self._listing)
+        app.router.add_get("/porady/{show}/{episode:\\d+}/", self._episode)
+        app.router.add_get("/stats", self._stats)
+        app.router.add_get("/video/{id}/", self._video)
+        app.router.add_get("/zlata/{id}/", self._gold)
+        app.router.add_post("/ivysilani/ajax/get-client-playlist/", self._playlistApi)
+        app.router.add_get("/playlist/{id}.json", self._playlistInfo)
+        app.router.add_get("/subtitles/{track:\\d+}.txt", self._subtitles)
+        app.router.add_get("/hls/master.m3u8", self._master)
+        app.router.add_get("/hls/key.bin", self._key)
+        app.router.add_get("/hls/{height:\\d+}/index.m3u8", self._media)
+        app.router.add_get("/hls/{height:\\d+}/segment-{index:\\d+}.ts", self._segment)
+        if self.fixtures is not None:
+            app.router.add_static("/fixtures/", os.path.abspath(self.fixtures))
+        return app
+
+    def reset(self) -> None:
+        """Resets request counters and wall clock time of the first segment byte"""
+        self.requests = 0
+        self.errors = 0
+        self.first_segment = None
+
+    async def start(self) -> str:
+        """Starts the stand-in and returns its base url"""
+        self.runner = web.AppRunner(self.makeApp())
+        await self.runner.setup()
+        site:web.TCPSite = web.TCPSite(self.runner, self.host, self.port)
+        await site.start()
+        self.port = self.runner.addresses[0][1]
+        return self.url
+
+    async def stop(self) -> None:
+        """Stops the stand-in"""
+        if self.runner is not None:
+            await self.runner.cleanup()
+            self.runner = None
+
+    async def _show(self, request:web.Request) -> web.Response:
+        """Show page linking to the episode listing"""
+        if self.fixtures is not None:
+            return self._fixture(request)
+        show:str = request.match_info["show"]
+        return self._html(f"<h1>{show}</h1><a href=\"/porady/{show}/dily/\">Všechny díly</a>")
+
+    async def _listing(self, request:web.Request) -> web.Response:
+        """One page of the episode listing"""
+        if self.fixtures is not None:
+            return self._fixture(request)
+        show:str = request.match_info["show"]
+        pages:int = max(1, -(-self.episodes // self.perPage))
+        page:int = int(request.query.get("page", "1"))
+        if page < 1 or page > pages:
+            raise web.HTTPNotFound()
+        first:int = (page - 1) * self.perPage
+        body:list[str] = [f"<a href=\"/porady/{show}/{100000 + i}/\">Díl {i + 1}</a>"
+                          for i in range(first, min(first + self.perPage, self.episodes))]
+        body.append("<a href=\"/porady/jiny-porad/999999/\">Doporučujeme</a>")
+        for near in range(max(1, page - 2), min(pages, page + 2) + 1):
+            body.append(f"<a href=\"/porady/{show}/dily/?page={near}\">{near}</a>")
+        if page < pages:
+            body.append(f"<a rel=\"next\" href=\"/porady/{show}/dily/?page={page + 1}\">Další</a>")
+        return self._html("\n".join(body))
+
+    async def _episode(self, request:web.Request) -> web.Response:
+        """Episode page"""
+        if self.fixtures is not None:
+            return self._fixture(request)
+        return self._html(f"<h1>Díl {request.match_info['episode']}</h1>")
+
+    async def _stats(self, request:web.Request) -> web.Response:
+        """Request counters and wall clock time of the first segment byte, ``?reset`` resets them"""
+        stats:dict = {"requests": self.requests, "errors": self.errors, "first_segment": self.first_segment}
+        if "reset" in request.query:
+            self.reset()
+        return web.json_response(stats)
+
+    async def _video(self, request:web.Request) -> web.Response:
+        """CT episode page with ld+json scripts containing IDEC of the video"""
+        await self._delay()
+        idec:str = request.match_info["id"]
+        video:str = json.dumps({"@type": "VideoObject", "name": f"Díl {idec}", "video": {"embedUrl": f"{self.PLAYER_URL}IDEC={idec}"}})
+        return web.Response(text="<!DOCTYPE html><html><head><title>ČT</title>"
+                                 "<script type=\"application/ld+json\">{\"@type\": \"WebSite\"}</script>"
+                                 f"<script type=\"application/ld+json\">{video}</script></head><body></body></html>",
+                            content_type="text/html")
+
+    async def _gold(self, request:web.Request) -> web.Response:
+        """CT Gold page with the player iframe"""
+        await self._delay()
+        bonus:str = request.match_info["id"][:5].rjust(5, "0")
+        return web.Response(text=f"<!DOCTYPE html><html><head><title>Bonus {bonus} | Zlatá Praha</title></head>"
+                                 f"<body><iframe src=\"{self.PLAYER_URL}bonus={bonus}&amp;x=1\"></iframe></body></html>",
+                            content_type="text/html")
+
+    async def _playlistApi(self, request:web.Request) -> web.Response:
+        """Playlist API returning url of the playlist info"""
+        await self._delay()
+        data = await request.post()
+        return web.json_response({"url": f"{self.url}playlist/{data.get('playlist[0][id]', '0')}.json"})
+
+    async def _playlistInfo(self, request:web.Request) -> web.Response:
+        """Playlist info with url of the master playlist"""
+        await self._delay()
+        return web.json_response({"playlist": [{"title": f"Video {request.match_info['id']}",
+                                                "streamUrls": {"main": f"{self.url}hls/master.m3u8"},
+                                                "subtitles": [{"title": f"Titulky {track}", "url": f"{self.url}subtitles/{track}.txt"}
+                                                              for track in range(self.subtitleTracks)]}]})
+
+    async def _subtitles(self, request:web.Request) -> web.StreamResponse:
+        """Synthetic subtitle track"""
+        if self._subtitle_text is None:
+            self._subtitle_text = syntheticSubtitles(self.subtitleHours).encode()
+        return await self._send(request, self._subtitle_text)
+
+    async def _master(self, request:web.Request) -> web.StreamResponse:
+        """Master playlist with variant for every height"""
+        lines:list[str] = ["#EXTM3U"]
+        for height in self.heights:
+            lines.append(f"#EXT-X-STREAM-INF:BANDWIDTH={height * 5000},RESOLUTION={height * 16 // 9}x{height},CODECS=\"avc1.4d401f,mp4a.40.2\"")
+            lines.append(f"{height}/index.m3u8")
+        return await self._send(request, ("\n".join(lines) + "\n").encode())
+
+    async def _media(self, request:web.Request) -> web.StreamResponse:
+        """Media playlist of one variant"""
+        lines:list[str] = ["#EXTM3U", "#EXT-X-VERSION:3", "#EXT-X-TARGETDURATION:4", "#EXT-X-MEDIA-SEQUENCE:0", "#EXT-X-PLAYLIST-TYPE:VOD"]
+        if self.encrypted:
+            lines.append("#EXT-X-KEY:METHOD=AES-128,URI=\"../key.bin\"")
+        for index in range(self.segments):
+            lines.append("#EXTINF:4.000,")
+            lines.append(f"segment-{index}.ts")
+        lines.append("#EXT-X-ENDLIST")
+        return await self._send(request, ("\n".join(lines) + "\n").encode())
+
+    async def _key(self, request:web.Request) -> web.StreamResponse:
+        """Decryption key of encrypted segments"""
+        return await self._send(request, self.KEY)
+
+    async def _segment(self, request:web.Request) -> web.StreamResponse:
+        """Segment, whole or its byte range"""
+        index:int = int(request.match_info["index"])
+        if index >= self.segments:
+            raise web.HTTPNotFound()
+        body:bytes | None = self._encryptedSegment(index) if self.encrypted else None
+        total:int = len(body) if body is not None else self.segmentSize
+        first, last = 0, total - 1
+        status:int = 200
+        if request.http_range.start is not None or request.http_range.stop is not None:
+            first = request.http_range.start or 0
+            last = min((request.http_range.stop or total) - 1, total - 1)
+            status = 206
+        return await self._send(request, body[first:last + 1] if body is not None else None, first, last, status,
+                                segment=True, total=total)
+
+    def _encryptedSegment(self, index:int) -> bytes:
+        """Synthetic segment encrypted by ``KEY`` with IV from its sequence number"""
+        if index not in self._encrypted_segments:
+            self._encrypted_segments[index] = encryptAES128(self._synthetic(0, self.segmentSize), self.KEY, index.to_bytes(16, "big"))
+        return self._encrypted_segments[index]
+
+    def _synthetic(self, first:int, length:int) -> bytes:
+        """Synthetic segment bytes from ``first``, ``length`` bytes long"""
+        chunks:list[bytes] = []
+        while length > 0:
+            offset:int = first % len(self._payload)
+            chunk:bytes = self._payload[offset:offset + length]
+            chunks.append(chunk)
+            first += len(chunk)
+            length -= len(chunk)
+        return b"".join(chunks)
+
+    async def _send(self, request:web.Request, body:bytes | None, first:int = 0, last:int = 0, status:int = 200,
+                    segment:bool = False, total:int | None = None) -> web.StreamResponse:
+        """Sends ``body`` (or synthetic segment bytes ``first``-``last``) with configured latency, bandwidth and errors
+        - ``total`` is size of the whole segment for ``Content-Range``"""
+        self.requests += 1
+        await self._delay()
+        if segment and self.errorRate > 0 and random.random() < self.errorRate:
+            self.errors += 1
+            raise web.HTTPServiceUnavailable()
+        size:int = len(body) if body is not None else last - first + 1
+        response:web.StreamResponse = web.StreamResponse(status=status)
+        response.content_length = size
+        if segment:
+            response.headers["Accept-Ranges"] = "bytes"
+        if status == 206:
+            response.headers["Content-Range"] = f"bytes {first}-{last}/{total if total is not None else self.segmentSize}"
+        await response.prepare(request)
+        if segment and self.first_segment is None:
+            self.first_segment = time.time()
+        chunk_size:int = 65536
+        for position in range(0, size, chunk_size):
+            length:int = min(chunk_size, size - position)
+            if body is not None:
+                chunk:bytes = body[position:position + length]
+            else:
+                chunk:bytes = self._synthetic(first + position, length)
+            await response.write(chunk)
+            if self.bandwidth is not None:
+                await asyncio.sleep(length / self.bandwidth)
+        await response.write_eof()
+        return response
+
+    async def _delay(self) -> None:
+        """Waits ``latency`` seconds before the response is sent"""
+        if self.latency > 0:
+            await asyncio.sleep(self.latency)
+
+    def _fixture(self, request:web.Request) -> web.Response:
+        """Saved page of the request path, 404 if it was not saved"""
+        page:str = request.query.get("page", "")
+        path:str = os.path.join(os.path.abspath(self.fixtures), *request.path.strip("/").split("/"),
+                                f"page-{page}.html" if page.isdigit() else "index.html")
+        if not os.path.isfile(path):
+            raise web.HTTPNotFound()
+        with open(path, encoding="utf-8") as f:
+            return web.Response(text=f.read(), content_type="text/html")
+
+    def _html(self, body:str) -> web.Response:
+        """Wraps ``body`` into html page"""
+        return web.Response(text=f"<!DOCTYPE html><html><head><title>ČT</title></head><body>{body}</body></html>",
+                            content_type="text/html")
+
+app = typer.Typer(add_completion=False, context_settings={"help_option_names": ["-h", "--help"]})
+
+@app.command()
+def main(port:Annotated[int, typer.Option(
+            "-p", "--port",
+            help="Port stand-inu", show_default=True)]
+            = 8000,
+         fixtures:Annotated[str, typer.Option(
+            "-f", "--fixtures",
+            help="Složka s uloženými stránkami", show_default=False)]
+            = None,
+         episodes:Annotated[int, typer.Option(
+            "-e", "--episodes",
+            help="Počet dílů syntetického pořadu", show_default=True)]
+            = 300,
+         segments:Annotated[int, typer.Option(
+            "-s", "--segments",
+            help="Počet segmentů syntetického streamu", show_default=True)]
+            = 100,
+         segment_size:Annotated[int, typer.Option(
+            "--segment-size",
+            help="Velikost segmentu v bajtech", show_default=True)]
+            = 1_000_000,
+         latency:Annotated[float, typer.Option(
+            "--latency",
+            help="Zpoždění každé odpovědi v sekundách", show_default=True)]
+            = 0.0,
+         bandwidth:Annotated[int, typer.Option(
+            "--bandwidth",
+            help="Rychlost každé odpovědi v bajtech za sekundu", show_default=False)]
+            = None,
+         error_rate:Annotated[float, typer.Option(
+            "--error-rate",
+            help="Podíl požadavků na segmenty, které selžou s chybou 503", show_default=True)]
+            = 0.0,
+         encrypted:Annotated[bool, typer.Option(
+            "--encrypted",
+            help="Šifrovat segmenty pomocí AES-128", show_default=True)]
+            = False
+            ):
+   """Runs local stand-in for ČT servers"""
+   standin:StandIn = StandIn(fixtures=fixtures, episodes=episodes, port=port, segments=segments, segmentSize=segment_size,
+                             latency=latency, bandwidth=bandwidth, errorRate=error_rate, encrypted=encrypted)
+   web.run_app(standin.makeApp(), host="127.0.0.1", port=port)
+
+if __name__ == "__main__":
+    app()
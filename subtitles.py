@@ -0,0 +1,85 @@
+"""Subtitles module"""
+import asyncio
+import os
+from typing import Iterable, Iterator
+from aiohttp import ClientSession
+
+class SubtitleConverter:
+    """Converts ČT subtitles (``index; start end`` header, text lines, blank line) line by line
+    - ``vtt`` produces WebVTT instead of SRT"""
+
+    def __init__(self, vtt:bool = False) -> None:
+        """Initializes ``SubtitleConverter`` class"""
+        self.vtt:bool = vtt
+        self._start:bool = True
+
+    def header(self) -> str:
+        """Returns header of the output file"""
+        return "WEBVTT\n\n" if self.vtt else ""
+
+    def line(self, line:str) -> str:
+        """Returns converted ``line`` (without line ending)"""
+        if self._start and line != "":
+            index:str = line.strip().split(";")[0]
+            start_time, end_time = line.strip().split(" ")[1:]
+            self._start = False
+            return f"{index}\n{self._time(int(start_time))} --> {self._time(int(end_time))}\n"
+        if line == "":
+            self._start = True
+            return "\n"
+        return line + "\n"
+
+    def _time(self, milliseconds:int) -> str:
+        """Converts milliseconds to ``HH:MM:SS,mmm`` (``HH:MM:SS.mmm`` in WebVTT)"""
+        seconds, milliseconds = divmod(milliseconds, 1000)
+        minutes, seconds = divmod(seconds, 60)
+        hours, minutes = divmod(minutes, 60)
+        return f"{hours:02d}:{minutes:02d}:{seconds:02d}{'.' if self.vtt else ','}{milliseconds:03d}"
+
+def txtToSrt(lines:Iterable[str], vtt:bool = False) -> Iterator[str]:
+    """Yields converted subtitles line by line, ``lines`` are without line endings"""
+    converter:SubtitleConverter = SubtitleConverter(vtt)
+    yield converter.header()
+    for line in lines:
+        yield converter.line(line)
+
+async def asyncDownloadSubtitles(tracks:list[tuple[str, str]], directory:str, name:str, session:ClientSession,
+                                 vtt:bool = False) -> list[tuple[str, str]]:
+    """Downloads subtitle tracks concurrently, each one is converted while it is streamed into the file
+    - ``tracks`` are (name, url) pairs
+    - returns (name, path) of SRT files in the order of ``tracks``"""
+    return list(await asyncio.gather(*(_asyncDownloadTrack(track_name, url, directory, name, session, vtt)
+                                       for track_name, url in tracks)))
+
+async def _asyncDownloadTrack(track_name:str, url:str, directory:str, name:str, session:ClientSession,
+                              vtt:bool) -> tuple[str, str]:
+    """Downloads one subtitle track into SRT file (and WebVTT file if ``vtt``)
+    - output is the same as converting the whole text split by ``\n``, including the trailing empty line"""
+    path:str = os.path.join(directory, f"{name} ({track_name}).srt")
+    converters:list[tuple[SubtitleConverter, str]] = [(SubtitleConverter(), path)]
+    if vtt:
+        converters.append((SubtitleConverter(vtt=True), os.path.splitext(path)[0] + ".vtt"))
+    files:list = [open(file_path + ".part", "w", encoding="utf-8") for _, file_path in converters]
+    try:
+        for (converter, _), f in zip(converters, files):
+            f.write(converter.header())
+        async with session.get(url) as response:
+            response.raise_for_status()
+            raw:bytes = b"\n"
+            async for raw in response.content:
+                line:str = raw.decode().rstrip("\r\n")
+                for (converter, _), f in zip(converters, files):
+                    f.write(converter.line(line))
+        if raw.endswith(b"\n"):
+            # whole text split by "\n" ends with an empty line after the final line ending, keep it in the output
+            for (converter, _), f in zip(converters, files):
+                f.write(converter.line(""))
+    except BaseException:
+        for (_, file_path), f in zip(converters, files):
+            f.close()
+            os.remove(file_path + ".part")
+        raise
+    for (_, file_path), f in zip(converters, files):
+        f.close()
+        os.replace(file_path + ".part", file_path)
+    return track_name, path
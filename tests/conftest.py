@@ -0,0 +1,25 @@
+"""Shared fixtures of the tests"""
+import os
+import pytest
+import requests
+from batch import Batch
+from benchmark import runningStandIn
+from downloadCT import CT
+
+FIXTURES:str = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+@pytest.fixture
+def standin():
+    """Returns context manager running local stand-in of ČT servers with given options and yielding its base url"""
+    return runningStandIn
+
+@pytest.fixture
+def standinBatch():
+    """Returns function making batch class whose jobs use ``downloader`` (e.g. from ``standInDownloaders``) instead of ``getDownloader``,
+    ``options`` are passed to the downloader"""
+    def makeBatch(downloader:type[CT], **options) -> type[Batch]:
+        class StandInBatch(Batch):
+            def _getDownloader(self, url:str, session:requests.Session) -> CT:
+                return downloader(url, self.directory, session=session, **options)
+        return StandInBatch
+    return makeBatch
@@ -0,0 +1 @@
+ob(=˲hF
\ No newline at end of file
@@ -0,0 +1,23 @@
+#!/usr/bin/env python3
+"""Stand-in for ffmpeg, copies the first input (``pipe:0`` is stdin) into the output file (the last argument)
+- ``STUB_FFMPEG_FAIL_AFTER=<bytes>`` makes it exit with code 1 after copying that many bytes, like ffmpeg failing halfway"""
+import os
+import sys
+
+def main(arguments:list[str]) -> int:
+    """Runs the stub, returns exit code"""
+    source:str = arguments[arguments.index("-i") + 1]
+    destination:str = arguments[-1]
+    fail_after:int | None = int(os.environ["STUB_FFMPEG_FAIL_AFTER"]) if "STUB_FFMPEG_FAIL_AFTER" in os.environ else None
+    copied:int = 0
+    with (sys.stdin.buffer if source == "pipe:0" else open(source, "rb")) as f, open(destination, "wb") as out:
+        while chunk := f.read(65536):
+            out.write(chunk)
+            copied += len(chunk)
+            if fail_after is not None and copied >= fail_after:
+                sys.stderr.write(f"stub ffmpeg: failed after {copied} bytes\n")
+                return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
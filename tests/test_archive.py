@@ -0,0 +1,75 @@
+"""Tests of the archive index of downloaded videos and segments"""
+import os
+import zlib
+from archive import ArchiveIndex, segmentsFingerprint
+from benchmark import standInDownloaders
+from parseM3u8 import Segment
+
+SEGMENTS:list[Segment] = [Segment(f"https://cdn-a.example.com/hls/720/segment-{index}.ts?token=a", 4.0, index) for index in range(3)]
+DATA:list[bytes] = [bytes([index]) * 1000 for index in range(3)]
+
+def archiveFile(archive:ArchiveIndex, path:str, video:str = "CT:1") -> None:
+    """Writes the file of ``SEGMENTS`` and adds it to ``archive`` with its segments"""
+    with open(path, "wb") as f:
+        f.write(b"".join(DATA))
+    layout:list[tuple[str, int, int, int]] = [(segment.id, index * 1000, 1000, zlib.crc32(data))
+                                              for index, (segment, data) in enumerate(zip(SEGMENTS, DATA))]
+    archive.add(video, "720", segmentsFingerprint(SEGMENTS), path, layout)
+
+def test_find_skips_only_intact_files(tmp_path):
+    archive:ArchiveIndex = ArchiveIndex(str(tmp_path / "index"))
+    path:str = str(tmp_path / "video.ts")
+    archiveFile(archive, path)
+    assert archive.find("CT:1", "720", ".ts").path == path
+    assert archive.find("CT:1", "720", ".mp4") is None
+    assert archive.find("CT:2", "720", ".ts") is None
+    with open(path, "r+b") as f:
+        f.write(b"\xff")
+    assert archive.find("CT:1", "720", ".ts").path == path
+    assert archive.find("CT:1", "720", ".ts", verify=True) is None
+    assert archive.find("CT:1", "720", ".ts") is None
+    archiveFile(archive, path)
+    os.truncate(path, 10)
+    assert archive.find("CT:1", "720", ".ts") is None
+
+def test_segments_are_read_from_archived_files(tmp_path):
+    archive:ArchiveIndex = ArchiveIndex(str(tmp_path / "index"))
+    path:str = str(tmp_path / "video.ts")
+    archiveFile(archive, path)
+    assert archive.findContent(segmentsFingerprint(SEGMENTS), ".ts").path == path
+    signed:Segment = Segment("https://cdn-a.example.com/hls/720/segment-1.ts?token=b", 4.0, 1)
+    assert archive.readSegment(signed.id) == DATA[1]
+    with open(path, "r+b") as f:
+        f.seek(1500)
+        f.write(b"\xff")
+    assert archive.readSegment(signed.id) is None
+    assert archive.segmentsOf(path) == []
+    assert archive.findContent(segmentsFingerprint(SEGMENTS), ".ts") is None
+
+def test_segments_of_other_servers_are_not_shared(tmp_path):
+    archive:ArchiveIndex = ArchiveIndex(str(tmp_path / "index"))
+    archiveFile(archive, str(tmp_path / "video.ts"))
+    other:list[Segment] = [Segment(segment.url.replace("cdn-a", "cdn-b"), 4.0, segment.sequence) for segment in SEGMENTS]
+    assert other[0].id == "cdn-b.example.com/hls/720/segment-0.ts"
+    assert archive.readSegment(other[0].id) is None
+    assert archive.findContent(segmentsFingerprint(other), ".ts") is None
+
+def test_corrupt_index_is_moved_aside(tmp_path, capsys):
+    directory:str = str(tmp_path / "index")
+    os.makedirs(directory)
+    with open(os.path.join(directory, "archive.sqlite"), "wb") as f:
+        f.write(b"tohle neni databaze" * 100)
+    archive:ArchiveIndex = ArchiveIndex(directory)
+    archiveFile(archive, str(tmp_path / "video.ts"))
+    assert archive.find("CT:1", "720", ".ts") is not None
+    assert os.path.exists(os.path.join(directory, "archive.sqlite.corrupt"))
+    assert "je poškozený" in capsys.readouterr().out
+
+def test_archived_video_is_not_downloaded_again(standin, tmp_path):
+    archive:ArchiveIndex = ArchiveIndex(str(tmp_path / "index"))
+    with standin(segments=4, segmentSize=10_000) as url:
+        ct, _ = standInDownloaders(url)
+        first:str = ct(url + "video/1/", str(tmp_path), archive=archive).download(convert=False, resume=False)
+        second:str = ct(url + "video/1/", str(tmp_path), archive=archive).download(convert=False, resume=False)
+    assert second == first
+    assert [name for name in os.listdir(str(tmp_path)) if name.endswith(".ts")] == [os.path.basename(first)]
@@ -0,0 +1,21 @@
+"""Tests of batch byte budget planning, with the stand-in"""
+from benchmark import standInDownloaders
+from downloadM3u8 import M3U8
+
+OPTIONS:dict = {"segments": 4, "segmentSize": 10_000}
+
+def test_budget_plan_skips_items_whose_duration_fails(standin, standinBatch, tmp_path, monkeypatch):
+    get_duration = M3U8.asyncGetDuration
+    async def failingDuration(self, session) -> float:
+        if self.name == "Video 2":
+            raise ConnectionError("playlist nedostupný")
+        return await get_duration(self, session)
+    monkeypatch.setattr(M3U8, "asyncGetDuration", failingDuration)
+    with standin(**OPTIONS) as url:
+        ct, _ = standInDownloaders(url)
+        items = standinBatch(ct)([url + "video/1/", url + "video/2/", url + "video/3/"], str(tmp_path), resume=False,
+                                 budget=10**9).run()
+    assert [(item.name, item.status, item.error) for item in items] == [("Video 1", "hotovo", None),
+                                                                        ("Video 2", "chyba", "playlist nedostupný"),
+                                                                        ("Video 3", "hotovo", None)]
+    assert items[0].estimate is not None and items[1].estimate is None
@@ -0,0 +1,129 @@
+"""Tests of fetching big segments by parallel byte ranges and of ``#EXT-X-BYTERANGE`` playlists"""
+import asyncio
+import pytest
+from aiohttp import ClientSession, web
+from concurrency import AdaptiveLimiter
+from downloadM3u8 import M3U8, M3U8_Error
+from parseM3u8 import Segment, Variant
+
+SIZE:int = 6_000_000
+PAYLOAD:bytes = bytes(range(256)) * (SIZE // 256 + 1)
+
+class RangeServer:
+    """Local server with segments served in different ways, remembers Range headers it got"""
+
+    PLAYLIST:str = ("#EXTM3U\n#EXT-X-TARGETDURATION:4\n#EXT-X-BYTERANGE:1500000@0\n#EXTINF:4.0,\nranged\n"
+                    "#EXT-X-BYTERANGE:4500000\n#EXTINF:4.0,\nranged\n#EXT-X-ENDLIST\n")
+
+    def __init__(self) -> None:
+        """Initializes ``RangeServer`` class"""
+        self.ranges:dict[str, list[str | None]] = {}
+        self.runner:web.AppRunner | None = None
+        self.url:str = ""
+
+    async def __aenter__(self) -> "RangeServer":
+        """Starts the server"""
+        app:web.Application = web.Application()
+        app.router.add_get("/media/index.m3u8", self._playlist)
+        app.router.add_get("/{name}", self._file)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, "127.0.0.1", 0).start()
+        self.url = f"http://127.0.0.1:{self.runner.addresses[0][1]}/"
+        return self
+
+    async def __aexit__(self, *_) -> None:
+        """Stops the server"""
+        await self.runner.cleanup()
+
+    async def _playlist(self, request:web.Request) -> web.Response:
+        """Media playlist with two ``#EXT-X-BYTERANGE`` segments of ``ranged``"""
+        return web.Response(text=self.PLAYLIST)
+
+    async def _file(self, request:web.Request) -> web.Response:
+        """``ranged``: ranges with total, ``unknown``: ranges with ``/*`` total, ``plain``: no ranges,
+        ``short``: ranges after the first 4 MiB are cut in half, ``small``: 1000 bytes"""
+        name:str = request.match_info["name"]
+        self.ranges.setdefault(name, []).append(request.headers.get("Range"))
+        body:bytes = PAYLOAD[:1000] if name == "small" else PAYLOAD[:SIZE]
+        if name == "plain" or request.http_range.start is None:
+            headers:dict = {} if name == "plain" else {"Accept-Ranges": "bytes"}
+            return web.Response(body=body, headers=headers)
+        first:int = request.http_range.start
+        last:int = min(request.http_range.stop or len(body), len(body)) - 1
+        part:bytes = body[first:last+1]
+        if name == "short" and first > 0:
+            part = part[:len(part)//2]
+            last = first + len(part) - 1
+        total:str = "*" if name == "unknown" else str(len(body))
+        return web.Response(status=206, body=part, headers={"Accept-Ranges": "bytes", "Content-Range": f"bytes {first}-{last}/{total}"})
+
+def fetch(name:str, byterange:tuple[int, int] | None = None) -> tuple[bytes, dict[str, list[str | None]]]:
+    """Fetches one segment from ``RangeServer`` and returns it with Range headers the server got"""
+    async def run() -> tuple[bytes, dict[str, list[str | None]]]:
+        async with RangeServer() as server, ClientSession() as session:
+            video:M3U8 = M3U8(server.url + "master.m3u8", ".", "test")
+            video.limiter = AdaptiveLimiter()
+            data = await video._asyncFetchSegment(Segment(server.url + name, byterange=byterange), session)
+            return bytes(data), server.ranges
+    return asyncio.run(run())
+
+def test_small_segment_is_fetched_without_range():
+    data, ranges = fetch("small")
+    assert data == PAYLOAD[:1000]
+    assert ranges["small"] == [None]
+
+@pytest.mark.parametrize("name", ["ranged", "unknown"])
+def test_big_segment_is_split_into_ranges(name):
+    data, ranges = fetch(name)
+    assert data == PAYLOAD[:SIZE]
+    assert ranges[name][0] is None
+    assert ranges[name][1:] == [f"bytes={M3U8.RANGE_CHUNK}-{SIZE-1}"]
+
+def test_server_without_ranges_sends_whole_segment():
+    data, ranges = fetch("plain")
+    assert data == PAYLOAD[:SIZE]
+    assert ranges["plain"] == [None]
+
+def test_truncated_range_is_an_error():
+    with pytest.raises(M3U8_Error, match="Server neposlal celý segment."):
+        fetch("short")
+
+@pytest.mark.parametrize("byterange", [(1000, 2000), (500_000, 5_000_000)])
+def test_byterange_segment(byterange):
+    offset, length = byterange
+    data, ranges = fetch("ranged", byterange)
+    assert data == PAYLOAD[offset:offset+length]
+    assert ranges["ranged"][0] == f"bytes={offset}-{offset + min(length, M3U8.RANGE_CHUNK) - 1}"
+
+def test_byterange_playlist_download(tmp_path):
+    async def run() -> str:
+        async with RangeServer() as server:
+            video:M3U8 = M3U8(server.url + "master.m3u8", str(tmp_path), "byterange")
+            return await video.asyncDownload(Variant(server.url + "media/index.m3u8"), base_url=server.url)
+    path:str = asyncio.run(run())
+    with open(path, "rb") as f:
+        assert f.read() == PAYLOAD[:SIZE]
+
+@pytest.mark.parametrize("name", ["ranged", "plain"])
+def test_download_file_writes_ranges_into_file(tmp_path, monkeypatch, name):
+    async def unexpected(*args, **kwargs):
+        pytest.fail("Soubor se neměl číst celý do paměti.")
+    monkeypatch.setattr(M3U8, "_asyncRead", unexpected)
+    async def run() -> tuple[str, dict[str, list[str | None]]]:
+        async with RangeServer() as server:
+            video:M3U8 = M3U8(server.url + "master.m3u8", str(tmp_path), "file")
+            return await video.asyncDownloadFile(server.url + name, str(tmp_path / "file.mp4")), server.ranges
+    path, ranges = asyncio.run(run())
+    with open(path, "rb") as f:
+        assert f.read() == PAYLOAD[:SIZE]
+    expected:list[str | None] = [f"bytes={first}-{min(first + M3U8.RANGE_CHUNK, SIZE) - 1}" for first in range(0, SIZE, M3U8.RANGE_CHUNK)]
+    assert ranges[name] == [None] + (expected if name == "ranged" else [None])
+
+def test_download_file_truncated_range_is_an_error(tmp_path):
+    async def run() -> str:
+        async with RangeServer() as server:
+            video:M3U8 = M3U8(server.url + "master.m3u8", str(tmp_path), "file")
+            return await video.asyncDownloadFile(server.url + "short", str(tmp_path / "file.mp4"))
+    with pytest.raises(M3U8_Error, match="Server neposlal celý segment."):
+        asyncio.run(run())
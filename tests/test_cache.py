@@ -0,0 +1,46 @@
+"""Tests of the metadata cache"""
+import pytest
+import cache
+from cache import MetadataCache
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Fake ``time.time`` of the cache, returns list whose only item is the current time"""
+    now:list[float] = [1_700_000_000.0]
+    monkeypatch.setattr(cache.time, "time", lambda: now[0])
+    return now
+
+def test_entries_expire_after_ttl(tmp_path, clock):
+    metadata:MetadataCache = MetadataCache(str(tmp_path), ttl=100)
+    metadata.set("id", "https://www.ceskatelevize.cz/porady/1/", "123")
+    metadata.set("info", "123", "{}", ttl=10)
+    clock[0] += 50
+    assert metadata.get("id", "https://www.ceskatelevize.cz/porady/1/") == "123"
+    assert metadata.get("info", "123") is None
+    clock[0] += 51
+    assert metadata.get("id", "https://www.ceskatelevize.cz/porady/1/") is None
+
+def test_entries_expire_with_signed_urls(tmp_path, clock):
+    metadata:MetadataCache = MetadataCache(str(tmp_path), ttl=3600)
+    expires:int = int(clock[0]) + 600
+    metadata.set("master", "https://cdn.example.com/master.m3u8", "#EXTM3U", signed=f"https://cdn.example.com/master.m3u8?exp={expires}")
+    clock[0] += 600 - MetadataCache.EXPIRY_MARGIN - 1
+    assert metadata.get("master", "https://cdn.example.com/master.m3u8") == "#EXTM3U"
+    clock[0] += 2
+    assert metadata.get("master", "https://cdn.example.com/master.m3u8") is None
+    metadata.set("master", "https://cdn.example.com/old.m3u8", f"https://cdn.example.com/index.m3u8?exp={int(clock[0])}")
+    assert metadata.get("master", "https://cdn.example.com/old.m3u8") is None
+
+def test_least_recently_used_entries_are_evicted(tmp_path, clock):
+    metadata:MetadataCache = MetadataCache(str(tmp_path), maxEntries=2)
+    for key in ("a", "b"):
+        metadata.set("id", key, key)
+        clock[0] += 1
+    assert metadata.get("id", "a") == "a"
+    clock[0] += 1
+    metadata.set("id", "c", "c")
+    assert [metadata.get("id", key) for key in ("a", "b", "c")] == ["a", None, "c"]
+
+def test_entries_survive_reopening(tmp_path, clock):
+    MetadataCache(str(tmp_path)).set("id", "a", "1")
+    assert MetadataCache(str(tmp_path)).get("id", "a") == "1"
@@ -0,0 +1,54 @@
+"""Tests of the adaptive limit of concurrent requests"""
+import asyncio
+import pytest
+import concurrency
+from concurrency import AdaptiveLimiter
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Fake ``time.monotonic`` of the limiter, returns list whose only item is the current time"""
+    now:list[float] = [1000.0]
+    monkeypatch.setattr(concurrency.time, "monotonic", lambda: now[0])
+    return now
+
+def request(limiter:AdaptiveLimiter, clock:list[float], latency:float = 0.1, error:bool = False, throttled:bool = False) -> None:
+    """Runs one request of ``latency`` seconds through ``limiter``"""
+    async def run() -> None:
+        start:float = await limiter.acquire()
+        clock[0] += latency
+        await limiter.release(start, size=1000, error=error, throttled=throttled)
+    asyncio.run(run())
+
+def test_limit_grows_by_one_per_round_up_to_maximum(clock):
+    limiter:AdaptiveLimiter = AdaptiveLimiter(initial=4, maximum=6)
+    for _ in range(4):
+        request(limiter, clock)
+    assert limiter._limit == pytest.approx(4.9206, abs=0.0001)
+    request(limiter, clock)
+    assert limiter.limit == 5
+    for _ in range(50):
+        request(limiter, clock)
+    assert limiter.limit == 6
+
+@pytest.mark.parametrize("outcome", [{"throttled": True}, {"error": True}], ids=["429", "5xx"])
+def test_limit_is_halved_once_per_burst_down_to_minimum(clock, outcome):
+    limiter:AdaptiveLimiter = AdaptiveLimiter(initial=16, minimum=3, maximum=32)
+    request(limiter, clock)
+    request(limiter, clock, latency=0.0, **outcome)
+    assert limiter.limit == 8
+    request(limiter, clock, latency=0.0, **outcome)
+    assert limiter.limit == 8
+    assert limiter.errors == 2
+    clock[0] += 1
+    request(limiter, clock, latency=0.0, **outcome)
+    assert limiter.limit == 4
+    clock[0] += 1
+    request(limiter, clock, latency=0.0, **outcome)
+    assert limiter.limit == 3
+
+def test_rising_latency_cuts_the_limit(clock):
+    limiter:AdaptiveLimiter = AdaptiveLimiter(initial=8)
+    request(limiter, clock, latency=0.1)
+    request(limiter, clock, latency=2.0)
+    assert limiter.limit == 4
+    assert limiter.latency == pytest.approx(0.48)
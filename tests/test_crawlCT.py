@@ -0,0 +1,39 @@
+"""Tests of the show crawler against saved pages served by the stand-in"""
+import asyncio
+import os
+from crawlCT import ShowCrawler
+from conftest import FIXTURES
+
+SHOW:str = "porady/1095946610-zivot-na-zamku/"
+
+def crawl(url:str) -> list[str]:
+    """Returns all episode urls the crawler yields"""
+    async def collect() -> list[str]:
+        return [episode async for episode in ShowCrawler(url).crawl()]
+    return asyncio.run(collect())
+
+def test_crawl_follows_pagination(standin):
+    with standin(fixtures=os.path.join(FIXTURES, "pages")) as url:
+        episodes:list[str] = crawl(url + SHOW)
+    assert sorted(episodes) == [f"{url}{SHOW}21356221100{n:04d}-dil-{n}/" for n in range(1, 9)]
+
+def test_crawl_skips_other_shows_and_hosts(standin):
+    with standin(fixtures=os.path.join(FIXTURES, "pages")) as url:
+        episodes:list[str] = crawl(url + SHOW + "dily/")
+    assert len(episodes) == len(set(episodes)) == 8
+    assert all(episode.startswith(url + SHOW) for episode in episodes)
+
+def test_crawl_skips_failed_page(standin, capsys):
+    with standin(fixtures=os.path.join(FIXTURES, "pages")) as url:
+        episodes:list[str] = crawl(url + SHOW + "dily/?page=2")
+    assert len(episodes) == 8
+    assert "přeskakuji" in capsys.readouterr().out
+
+def test_crawl_missing_show(standin):
+    with standin(fixtures=os.path.join(FIXTURES, "pages")) as url:
+        assert crawl(url + "porady/1-neexistuje/") == []
+
+def test_crawl_synthetic_show(standin):
+    with standin(episodes=45, perPage=20) as url:
+        episodes:list[str] = crawl(url + "porady/1000-serial/")
+    assert sorted(episodes) == [f"{url}porady/1000-serial/{100000 + i}/" for i in range(45)]
@@ -0,0 +1,88 @@
+"""Tests of AES-128 segment decryption, with segments encrypted offline by the openssl command"""
+import asyncio
+import os
+import shutil
+import pytest
+import decrypt
+from benchmark import standInDownloaders
+from conftest import FIXTURES
+from decrypt import Decryption_Error, SegmentDecryptor, decryptAES128, segmentIV
+from downloadCT import CT_Error
+from downloadM3u8 import M3U8
+from parseM3u8 import MediaPlaylist, Variant, parseMedia
+
+AES128:str = os.path.join(FIXTURES, "aes128")
+OPTIONS:dict = {"segments": 6, "segmentSize": 50_000}
+
+def readFile(path:str) -> bytes:
+    """Returns contents of the file"""
+    with open(path, "rb") as f:
+        return f.read()
+
+def fixturePlaylist() -> MediaPlaylist:
+    """Returns parsed playlist of the encrypted fixture"""
+    with open(os.path.join(AES128, "index.m3u8"), encoding="utf-8") as f:
+        return parseMedia(f.read(), "http://example.com/aes128/index.m3u8")
+
+def plainFixture() -> bytes:
+    """Returns all fixture segments before encryption"""
+    return b"".join(readFile(os.path.join(AES128, f"plain-{sequence}.ts")) for sequence in (7, 8, 9))
+
+def test_fixture_iv_from_sequence_and_key_tag():
+    segments = fixturePlaylist().segments
+    assert [segmentIV(segment) for segment in segments] == [(7).to_bytes(16, "big"), (8).to_bytes(16, "big"),
+                                                            bytes.fromhex("00112233445566778899aabbccddeeff")]
+
+@pytest.mark.parametrize("processes", [False, True], ids=["threads", "processes"])
+def test_decryptor_decrypts_fixture(processes):
+    fetched:list[str] = []
+    async def fetchKey(url:str) -> bytes:
+        fetched.append(url)
+        return readFile(os.path.join(AES128, "key.bin"))
+    async def decryptAll() -> list[bytes]:
+        decryptor:SegmentDecryptor = SegmentDecryptor(fetchKey, workers=2, processes=processes)
+        try:
+            return await asyncio.gather(*(decryptor.decrypt(segment, readFile(os.path.join(AES128, f"segment-{segment.sequence}.ts")))
+                                          for segment in fixturePlaylist().segments))
+        finally:
+            decryptor.close()
+    assert b"".join(asyncio.run(decryptAll())) == plainFixture()
+    assert fetched == ["http://example.com/aes128/key.bin"]
+
+@pytest.mark.skipif(shutil.which("openssl") is None, reason="openssl není nainstalován")
+def test_openssl_fallback_decrypts_fixture(monkeypatch):
+    monkeypatch.setattr(decrypt, "Cipher", None)
+    key:bytes = readFile(os.path.join(AES128, "key.bin"))
+    segments = fixturePlaylist().segments
+    assert b"".join(decryptAES128(readFile(os.path.join(AES128, f"segment-{segment.sequence}.ts")), key, segmentIV(segment))
+                    for segment in segments) == plainFixture()
+
+def test_wrong_key_raises():
+    segment = fixturePlaylist().segments[0]
+    with pytest.raises(Decryption_Error):
+        decryptAES128(readFile(os.path.join(AES128, "segment-7.ts")), bytes(16), segmentIV(segment))
+
+def test_downloads_fixture_playlist(standin, tmp_path):
+    with standin(fixtures=FIXTURES) as url:
+        video:M3U8 = M3U8(url + "fixtures/aes128/index.m3u8", str(tmp_path), "fixture")
+        path:str = asyncio.run(video.asyncDownload(Variant(url + "fixtures/aes128/index.m3u8")))
+    assert readFile(path) == plainFixture()
+
+def test_encrypted_standin_matches_plain(standin, tmp_path):
+    with standin(**OPTIONS) as url:
+        ct, _ = standInDownloaders(url)
+        plain:str = ct(url + "video/1/", str(tmp_path), "plain").download(convert=False, resume=False)
+    with standin(encrypted=True, **OPTIONS) as url:
+        ct, _ = standInDownloaders(url)
+        decrypted:str = ct(url + "video/1/", str(tmp_path), "decrypted").download(convert=False, resume=False)
+    assert readFile(decrypted) == readFile(plain)
+
+def test_missing_backend_raises_ct_error(standin, tmp_path, monkeypatch):
+    with standin(encrypted=True, **OPTIONS) as url:
+        monkeypatch.setattr(decrypt, "Cipher", None)
+        monkeypatch.setattr(decrypt.shutil, "which", lambda command: None)
+        ct, _ = standInDownloaders(url)
+        with pytest.raises(CT_Error) as error:
+            ct(url + "video/1/", str(tmp_path), "missing").download(convert=False, resume=False)
+    assert str(error.value) == "Pro dešifrování segmentů je potřeba balíček cryptography."
+    assert "pip install cryptography" in error.value.details
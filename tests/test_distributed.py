@@ -0,0 +1,75 @@
+"""Tests of distributed download, coordinator and local workers against the stand-in"""
+import asyncio
+import os
+import time
+import pytest
+from aiohttp import ClientSession, web
+from benchmark import standInDownloaders
+from distributed import Coordinator, Distributed_Error, SegmentRange, Worker, resolveVideo
+from downloadM3u8 import M3U8
+from parseM3u8 import Variant
+
+OPTIONS:dict = {"segments": 30, "segmentSize": 50_000}
+
+def readFile(path:str) -> bytes:
+    """Returns contents of the file"""
+    with open(path, "rb") as f:
+        return f.read()
+
+def test_two_workers_match_single_process_download(standin, tmp_path):
+    with standin(**OPTIONS) as url:
+        video:M3U8 = resolveVideo(url + "hls/master.m3u8", str(tmp_path / "distributed"))
+        distributed:str = Coordinator(video, video.get_best_stream(), port=0, rangeSize=4).download(convert=False, localWorkers=2)
+        single:M3U8 = M3U8(url + "hls/master.m3u8", str(tmp_path / "single"), "video")
+        path:str = single._finish(asyncio.run(single.asyncDownload(single.get_best_stream())))
+    assert distributed == os.path.join(str(tmp_path / "distributed"), "video.ts")
+    assert readFile(distributed) == readFile(path)
+    assert len(readFile(path)) == OPTIONS["segments"] * OPTIONS["segmentSize"]
+    assert [name for name in os.listdir(str(tmp_path / "distributed")) if name.endswith(".part")] == []
+
+def test_resolve_video_with_injected_downloader(standin, tmp_path):
+    with standin() as url:
+        ct, _ = standInDownloaders(url)
+        video:M3U8 = resolveVideo(url + "video/1/", str(tmp_path), downloader=ct)
+        assert video.name == "Video 1"
+        assert len(video.get_streams()) == 3
+
+def test_steals_from_range_expected_to_finish_last_past_its_window(tmp_path):
+    coordinator:Coordinator = Coordinator(M3U8("http://127.0.0.1/master.m3u8", str(tmp_path), "video"),
+                                          Variant("http://127.0.0.1/index.m3u8"))
+    fast:SegmentRange = SegmentRange(1, 0, 100, "fast", ahead=8)
+    slow:SegmentRange = SegmentRange(2, 100, 140, "slow", ahead=8)
+    fast.started = slow.started = time.monotonic() - 10
+    fast.done, slow.done = 40, 102
+    coordinator.leases = {1: fast, 2: slow}
+    assert coordinator._steal("thief") == (125, 140)
+    assert slow.end == 125 and fast.end == 100
+    slow.end = 111
+    fast.done = 91
+    assert coordinator._steal("thief") is None
+
+def test_coordinator_requires_token(standin, tmp_path):
+    with standin(segments=4, segmentSize=1000) as url:
+        video:M3U8 = M3U8(url + "hls/master.m3u8", str(tmp_path), "video")
+        coordinator:Coordinator = Coordinator(video, video.get_best_stream(), port=0, token="secret")
+        async def run() -> list[int]:
+            coordinator._finished = asyncio.Event()
+            coordinator.pending.append((0, 4))
+            runner:web.AppRunner = web.AppRunner(coordinator.makeApp())
+            await runner.setup()
+            await web.TCPSite(runner, "127.0.0.1", 0).start()
+            coordinator.port = runner.addresses[0][1]
+            try:
+                statuses:list[int] = []
+                async with ClientSession() as session:
+                    for headers in ({}, {"X-Token": "wrong"}, {"X-Token": "secret"}):
+                        async with session.post(coordinator.url + "lease", json={"worker": "test"}, headers=headers) as response:
+                            statuses.append(response.status)
+                    async with session.put(coordinator.url + "chunk/1", data=b"") as response:
+                        statuses.append(response.status)
+                with pytest.raises(Distributed_Error, match="token"):
+                    await Worker(coordinator.url, "wrong").asyncRun()
+                return statuses
+            finally:
+                await runner.cleanup()
+        assert asyncio.run(run()) == [403, 403, 200, 403]
@@ -0,0 +1,64 @@
+"""Tests of the segment journal used to resume interrupted downloads"""
+import os
+from downloadM3u8 import SegmentJournal
+from parseM3u8 import Segment
+
+SEGMENTS:list[Segment] = [Segment(f"http://127.0.0.1/hls/720/segment-{index}.ts", 4.0, index) for index in range(4)]
+DATA:list[bytes] = [bytes([index]) * (1000 + index) for index in range(4)]
+
+def writePartial(directory:str, done:int = 3) -> tuple[str, str]:
+    """Writes partial file with first ``done`` segments and their journal, returns their paths"""
+    data_path:str = os.path.join(directory, "video.ts")
+    journal:SegmentJournal = SegmentJournal(data_path + ".journal", SEGMENTS)
+    open(data_path, "wb").close()
+    journal.load(data_path)
+    with open(data_path, "r+b") as f:
+        for index in range(done):
+            offset:int = f.tell()
+            f.write(DATA[index])
+            journal.append(index, offset, DATA[index])
+    journal.close()
+    return data_path, journal.path
+
+def resume(data_path:str, segments:list[Segment] = SEGMENTS) -> tuple[int, bytes]:
+    """Loads journal of ``data_path`` and returns number of completed segments and what is left of the partial file"""
+    journal:SegmentJournal = SegmentJournal(data_path + ".journal", segments)
+    done:int = journal.load(data_path)
+    journal.close()
+    with open(data_path, "rb") as f:
+        return done, f.read()
+
+def test_resumes_after_journaled_segments(tmp_path):
+    data_path, _ = writePartial(str(tmp_path))
+    assert resume(data_path) == (3, b"".join(DATA[:3]))
+
+def test_torn_data_tail_is_truncated(tmp_path):
+    data_path, _ = writePartial(str(tmp_path))
+    os.truncate(data_path, len(DATA[0]) + len(DATA[1]) + 10)
+    assert resume(data_path) == (2, b"".join(DATA[:2]))
+
+def test_unjournaled_data_is_truncated(tmp_path):
+    data_path, _ = writePartial(str(tmp_path))
+    with open(data_path, "ab") as f:
+        f.write(DATA[3][:500])
+    assert resume(data_path) == (3, b"".join(DATA[:3]))
+
+def test_torn_journal_record_is_ignored(tmp_path):
+    data_path, journal_path = writePartial(str(tmp_path))
+    with open(journal_path, "ab") as f:
+        f.write(SegmentJournal.RECORD.pack(3, sum(map(len, DATA[:3])), len(DATA[3]), 0)[:7])
+    assert resume(data_path) == (3, b"".join(DATA[:3]))
+    assert os.path.getsize(journal_path) == SegmentJournal.HEADER.size + 3 * SegmentJournal.RECORD.size
+
+def test_crc_mismatch_drops_the_segment(tmp_path):
+    data_path, _ = writePartial(str(tmp_path))
+    with open(data_path, "r+b") as f:
+        f.seek(len(DATA[0]) + len(DATA[1]) + 5)
+        f.write(b"\xff")
+    assert resume(data_path) == (2, b"".join(DATA[:2]))
+
+def test_changed_playlist_starts_over(tmp_path):
+    data_path, _ = writePartial(str(tmp_path))
+    changed:list[Segment] = SEGMENTS[:3] + [Segment("http://127.0.0.1/hls/720/segment-new.ts", 4.0, 3)]
+    assert resume(data_path, changed) == (0, b"")
+    assert resume(data_path, SEGMENTS) == (0, b"")
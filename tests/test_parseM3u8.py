@@ -0,0 +1,108 @@
+"""Tests of the playlist parser on fixture playlists, compared with the parser it replaced"""
+import os
+import pytest
+from parseM3u8 import MasterPlaylist, MediaPlaylist, parseAttributes, parseMaster, parseMedia
+from conftest import FIXTURES
+
+BASE_URL:str = "https://ivys.example.com/stream/abc/index.m3u8"
+
+def fixture(name:str) -> str:
+    """Returns text of fixture playlist"""
+    with open(os.path.join(FIXTURES, "playlists", name), encoding="utf-8") as f:
+        return f.read()
+
+def legacyStreams(content:str, playlist_url:str) -> list[tuple[int | None, str | None, str]]:
+    """Variant streams as (bandwidth, resolution, url) the way ``M3U8.get_streams`` parsed them before the playlist model"""
+    streams:list[tuple[int | None, str | None, str]] = []
+    for index, line in enumerate(content.split("\n")):
+        if line.startswith("#EXT-X-STREAM-INF"):
+            parts:list[str] = line[18:].split(",")
+            url:str = str(content.split("\n")[index+1])
+            bandwidth:int | None = None
+            resolution:str | None = None
+            for i, part in enumerate(parts):
+                if str(part).startswith("BANDWIDTH"):
+                    bandwidth = int(parts[i].split("=")[1])
+                if str(part).startswith("RESOLUTION"):
+                    resolution = parts[i].split("=")[1]
+            if not url.startswith("http"):
+                url = playlist_url.rsplit("/", 1)[0] + "/" + url
+            streams.append((bandwidth, resolution, url))
+    return streams
+
+def legacySegmentUrls(content:str, base_url:str) -> list[str]:
+    """Segment urls the way ``M3U8.download`` built them before the playlist model
+    - blank lines are skipped, the old loop requested ``base_url`` itself for them"""
+    return [base_url + line for line in content.split("\n") if not line.startswith("#") and line != ""]
+
+def test_master_matches_legacy_parser():
+    content:str = fixture("master.m3u8")
+    playlist:MasterPlaylist = parseMaster(content, BASE_URL)
+    assert [(variant.bandwidth, variant.resolution, variant.url) for variant in playlist.variants] == legacyStreams(content, BASE_URL)
+
+def test_master_quoted_codecs_with_commas():
+    playlist:MasterPlaylist = parseMaster(fixture("master.m3u8"), BASE_URL)
+    assert [variant.codecs for variant in playlist.variants] == ["avc1.4d401f,mp4a.40.2", "avc1.4d401e,mp4a.40.2",
+                                                                "hvc1.2.4.L123.B0,mp4a.40.2"]
+    first = playlist.variants[0]
+    assert (first.average_bandwidth, first.frame_rate, first.audio, first.subtitles, first.height) == (1200000, 25.0, "aac", "subs", 720)
+    assert first.uri == "720/index.m3u8?token=abc"
+    assert playlist.variants[2].url == "https://cdn.example.com/hevc/1080/index.m3u8"
+    assert (playlist.version, playlist.independent_segments) == (4, True)
+
+def test_master_renditions():
+    renditions = parseMaster(fixture("master.m3u8"), BASE_URL).renditions
+    assert [(r.type, r.group_id, r.name, r.language, r.default, r.autoselect, r.url) for r in renditions] == [
+        ("AUDIO", "aac", "Čeština", "cs", True, True, "https://ivys.example.com/stream/abc/audio/cs.m3u8"),
+        ("SUBTITLES", "subs", "Skryté titulky, čeština", "cs", False, False, "https://ivys.example.com/stream/abc/subs/cs.m3u8")]
+
+@pytest.mark.parametrize("name", ["media_byterange.m3u8", "media_key.m3u8", "media_sequence.m3u8", "media_live_end.m3u8"])
+def test_media_urls_match_legacy_parser(name):
+    content:str = fixture(name)
+    base_url:str = BASE_URL.rsplit("/", 1)[0] + "/"
+    assert [segment.url for segment in parseMedia(content, base_url).segments] == legacySegmentUrls(content, base_url)
+
+def test_media_byterange_with_and_without_offset():
+    playlist:MediaPlaylist = parseMedia(fixture("media_byterange.m3u8"), BASE_URL)
+    assert [segment.byterange for segment in playlist.segments] == [(0, 75232), (75232, 82112), (157344, 69864), (500, 1000)]
+    assert [segment.id for segment in playlist.segments][:2] == ["ivys.example.com/stream/abc/main.ts@0:75232", "ivys.example.com/stream/abc/main.ts@75232:82112"]
+    assert playlist.playlist_type == "VOD"
+    assert playlist.duration == pytest.approx(22.5)
+
+def test_media_key_with_and_without_iv():
+    segments = parseMedia(fixture("media_key.m3u8"), BASE_URL).segments
+    first, second, third, fourth = segments
+    assert first.key is second.key
+    assert (first.key.method, first.key.url, first.key.iv) == ("AES-128", "https://keys.example.com/key?id=1,2", None)
+    assert third.key.url == "https://ivys.example.com/stream/abc/key2.bin"
+    assert third.key.iv == bytes(range(16))
+    assert third.key.keyformat == "identity"
+    assert fourth.key is None
+    assert [segment.sequence for segment in segments] == [7, 8, 9, 10]
+
+def test_media_sequence_discontinuity_and_endlist():
+    playlist:MediaPlaylist = parseMedia(fixture("media_sequence.m3u8"), BASE_URL)
+    assert (playlist.media_sequence, playlist.discontinuity_sequence, playlist.target_duration) == (1200, 3, 4.0)
+    assert [segment.sequence for segment in playlist.segments] == [1200, 1201, 1202, 1203]
+    assert [segment.discontinuity for segment in playlist.segments] == [False, False, True, False]
+    assert [segment.duration for segment in playlist.segments] == [4.0, 4.0, 3.96, 4.0]
+    assert playlist.endlist is False
+    ended:MediaPlaylist = parseMedia(fixture("media_live_end.m3u8"), BASE_URL)
+    assert ended.endlist is True
+    assert [segment.sequence for segment in ended.segments] == [1203, 1204]
+
+def test_media_relative_and_absolute_uris():
+    urls:list[str] = [segment.url for segment in parseMedia(fixture("media_uris.m3u8"), BASE_URL).segments]
+    assert urls == ["https://ivys.example.com/stream/abc/relative/segment-0.ts",
+                    "https://ivys.example.com/stream/up/segment-1.ts",
+                    "https://ivys.example.com/root/segment-2.ts",
+                    "https://cdn2.example.com/abs/segment-3.ts?sig=x",
+                    "https://cdn3.example.com/proto/segment-4.ts"]
+
+def test_crlf_playlist():
+    content:str = fixture("media_sequence.m3u8").replace("\n", "\r\n")
+    assert [segment.url for segment in parseMedia(content, BASE_URL).segments] == \
+           [segment.url for segment in parseMedia(fixture("media_sequence.m3u8"), BASE_URL).segments]
+
+def test_attributes():
+    assert parseAttributes('A=1,B="x,y",C=0x1F,D=') == {"A": "1", "B": "x,y", "C": "0x1F", "D": ""}
@@ -0,0 +1,53 @@
+"""Tests of streaming segments into ffmpeg, with stub ffmpeg and the stand-in"""
+import asyncio
+import os
+import pytest
+from benchmark import standInDownloaders
+from downloadCT import CT_Error
+from downloadM3u8 import M3U8, M3U8_Error
+
+STUB_FFMPEG:str = os.path.join(os.path.dirname(os.path.abspath(__file__)), "stub_ffmpeg.py")
+OPTIONS:dict = {"segments": 12, "segmentSize": 100_000}
+
+def readFile(path:str) -> bytes:
+    """Returns contents of the file"""
+    with open(path, "rb") as f:
+        return f.read()
+
+def test_pipe_produces_same_bytes_as_ts(standin, tmp_path):
+    with standin(**OPTIONS) as url:
+        ct, _ = standInDownloaders(url)
+        ts:str = ct(url + "video/1/", str(tmp_path), "ts").download(convert=False, resume=False)
+        c = ct(url + "video/1/", str(tmp_path), "piped")
+        c.video.ffmpeg = STUB_FFMPEG
+        mp4:str = c.download(convert=True, pipe=True, resume=False)
+    assert mp4 == os.path.join(str(tmp_path), "piped.mp4")
+    assert readFile(mp4) == readFile(ts)
+    assert len(readFile(ts)) == OPTIONS["segments"] * OPTIONS["segmentSize"]
+    assert not os.path.exists(os.path.join(str(tmp_path), "piped.ts"))
+
+def test_convert_after_download_uses_ffmpeg(standin, tmp_path):
+    with standin(**OPTIONS) as url:
+        ct, _ = standInDownloaders(url)
+        c = ct(url + "video/1/", str(tmp_path), "converted")
+        c.video.ffmpeg = STUB_FFMPEG
+        mp4:str = c.download(convert=True, resume=False)
+    assert os.path.getsize(mp4) == OPTIONS["segments"] * OPTIONS["segmentSize"]
+
+def test_pipe_ffmpeg_failure_raises_ct_error(standin, tmp_path, monkeypatch):
+    monkeypatch.setenv("STUB_FFMPEG_FAIL_AFTER", "250000")
+    with standin(**OPTIONS) as url:
+        ct, _ = standInDownloaders(url)
+        c = ct(url + "video/1/", str(tmp_path), "failed")
+        c.video.ffmpeg = STUB_FFMPEG
+        with pytest.raises(CT_Error) as error:
+            c.download(convert=True, pipe=True, resume=False)
+    assert str(error.value) == "Konvertování pomocí ffmpeg selhalo."
+    assert "stub ffmpeg: failed" in error.value.details
+    assert not os.path.exists(os.path.join(str(tmp_path), "failed.mp4"))
+
+def test_pipe_missing_ffmpeg(standin, tmp_path):
+    with standin(**OPTIONS) as url:
+        video:M3U8 = M3U8(url + "hls/master.m3u8", str(tmp_path), "missing", ffmpeg=os.path.join(str(tmp_path), "no-ffmpeg"))
+        with pytest.raises(M3U8_Error, match="Nepodařilo se spustit ffmpeg."):
+            asyncio.run(video.asyncDownload(video.get_best_stream(), pipe=True))
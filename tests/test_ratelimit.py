@@ -0,0 +1,51 @@
+"""Tests of the bandwidth limit of downloads and batches, with the stand-in"""
+import asyncio
+import os
+import pytest
+from batch import Batch
+from benchmark import standInDownloaders
+from concurrency import AdaptiveLimiter, BandwidthLimiter, BandwidthShare
+from downloadM3u8 import M3U8
+
+OPTIONS:dict = {"segments": 12, "segmentSize": 100_000}
+
+def test_parse_batch_line_weights():
+    assert Batch.parseUrl("https://example.com/video/1/") == ("https://example.com/video/1/", 1.0)
+    assert Batch.parseUrl("https://example.com/video/1/  2.5") == ("https://example.com/video/1/", 2.5)
+    for line in ("https://example.com/video/1/ 0", "https://example.com/video/1/ -1", "https://example.com/video/1/ abc",
+                 "https://example.com/video/1/ 1 2", "https://example.com/video/1/ inf"):
+        with pytest.raises(ValueError):
+            Batch.parseUrl(line)
+
+def test_read_urls_rejects_invalid_weight(tmp_path):
+    path = tmp_path / "batch.txt"
+    path.write_text("# komentář\nhttps://example.com/video/1/ 2\n\nhttps://example.com/video/2/\n", encoding="utf-8")
+    assert Batch.readUrls(str(path)) == ["https://example.com/video/1/ 2", "https://example.com/video/2/"]
+    path.write_text("https://example.com/video/1/ dva\n", encoding="utf-8")
+    with pytest.raises(ValueError, match="Neplatná váha"):
+        Batch.readUrls(str(path))
+
+def test_rate_limit_waits_are_not_latency(standin, tmp_path):
+    limiter:AdaptiveLimiter = AdaptiveLimiter(maximum=8)
+    with standin(segments=6, segmentSize=100_000) as url:
+        video:M3U8 = M3U8(url + "hls/master.m3u8", str(tmp_path), "limited")
+        async def run() -> str:
+            return await video.asyncDownload(video.get_best_stream(), limiter=limiter, rateLimit=BandwidthLimiter(300_000).share())
+        path:str = asyncio.run(run())
+    assert os.path.getsize(path) == 6 * 100_000
+    assert limiter.latency is not None and limiter.latency < 0.1
+
+def test_batch_jobs_get_shares_by_weight(standin, standinBatch, tmp_path, monkeypatch):
+    weights:list[float] = []
+    share = BandwidthLimiter.share
+    def recordingShare(self, weight:float = 1.0, rate=None) -> BandwidthShare:
+        weights.append(weight)
+        return share(self, weight, rate)
+    monkeypatch.setattr(BandwidthLimiter, "share", recordingShare)
+    with standin(**OPTIONS) as url:
+        ct, _ = standInDownloaders(url)
+        items = standinBatch(ct)([url + "video/1/ 3", url + "video/2/"], str(tmp_path), resume=False,
+                                 rateLimit=BandwidthLimiter(10_000_000)).run()
+    assert [(item.url, item.weight, item.status) for item in items] == [(url + "video/1/", 3.0, "hotovo"),
+                                                                        (url + "video/2/", 1.0, "hotovo")]
+    assert sorted(weights) == [1.0, 3.0]
@@ -0,0 +1,54 @@
+"""Tests of recording live playlists against the stand-in"""
+import asyncio
+import os
+import signal
+import time
+import pytest
+from aiohttp import ClientSession, web
+from downloadM3u8 import M3U8
+from parseM3u8 import Variant
+
+def test_record_until_endlist(standin, tmp_path):
+    with standin(segments=5, segmentSize=10_000) as url:
+        video:M3U8 = M3U8(url + "hls/master.m3u8", str(tmp_path), "live")
+        path:str = asyncio.run(video.asyncRecord(video.get_best_stream()))
+    assert os.path.getsize(path) == 5 * 10_000
+
+def test_record_restores_sigint_handler(standin, tmp_path):
+    async def record(video:M3U8) -> tuple:
+        before = signal.getsignal(signal.SIGINT)
+        await video.asyncRecord(video.get_best_stream(), duration=8)
+        return before, signal.getsignal(signal.SIGINT)
+    with standin(segments=5, segmentSize=10_000) as url:
+        video:M3U8 = M3U8(url + "hls/master.m3u8", str(tmp_path), "live")
+        before, after = asyncio.run(record(video))
+    assert after == before
+    assert signal.getsignal(signal.SIGINT) is signal.default_int_handler
+
+def test_poll_follows_target_duration_and_reports_lost_segments(capsys):
+    playlists:list[str | None] = ["#EXTM3U\n#EXT-X-TARGETDURATION:1\n#EXT-X-MEDIA-SEQUENCE:0\n#EXTINF:1.0,\n0.ts\n#EXTINF:1.0,\n1.ts\n",
+                                  None,
+                                  "#EXTM3U\n#EXT-X-TARGETDURATION:1\n#EXT-X-MEDIA-SEQUENCE:5\n#EXTINF:1.0,\n5.ts\n#EXTINF:1.0,\n6.ts\n",
+                                  "#EXTM3U\n#EXT-X-TARGETDURATION:1\n#EXT-X-MEDIA-SEQUENCE:5\n#EXTINF:1.0,\n5.ts\n#EXTINF:1.0,\n6.ts\n#EXT-X-ENDLIST\n"]
+    requested:list[float] = []
+    async def playlist(request:web.Request) -> web.Response:
+        requested.append(time.monotonic())
+        body:str | None = playlists[min(len(requested), len(playlists)) - 1]
+        return web.Response(status=304) if body is None else web.Response(text=body)
+    async def run() -> list[int]:
+        app:web.Application = web.Application()
+        app.router.add_get("/index.m3u8", playlist)
+        runner:web.AppRunner = web.AppRunner(app)
+        await runner.setup()
+        await web.TCPSite(runner, "127.0.0.1", 0).start()
+        url:str = f"http://127.0.0.1:{runner.addresses[0][1]}/"
+        try:
+            async with ClientSession() as session:
+                video:M3U8 = M3U8(url + "master.m3u8", ".", "live")
+                return [segment.sequence async for segment in video._asyncPollSegments(Variant(url + "index.m3u8"), url, session,
+                                                                                       None, asyncio.Event())]
+        finally:
+            await runner.cleanup()
+    assert asyncio.run(run()) == [0, 1, 5, 6]
+    assert [second - first for first, second in zip(requested, requested[1:])] == pytest.approx([1.0, 0.5, 1.0], abs=0.2)
+    assert "Segmenty 2-4 vypadly z playlistu" in capsys.readouterr().out
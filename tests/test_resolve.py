@@ -0,0 +1,50 @@
+"""Tests of asynchronous resolution of video metadata, with the stand-in"""
+import asyncio
+import pytest
+import downloadCT
+from benchmark import standInDownloaders
+
+def test_resolve_matches_blocking_chain(standin, tmp_path):
+    with standin() as url:
+        ct, ct_gold = standInDownloaders(url)
+        for downloader, page in ((ct, url + "video/1/"), (ct_gold, url + "zlata/12345/")):
+            resolved = asyncio.run(downloader(page, str(tmp_path)).resolve())
+            blocking = downloader(page, str(tmp_path))
+            assert resolved.name == blocking.name
+            assert [stream.url for stream in resolved.streams] == [stream.url for stream in blocking.streams]
+
+def test_name_and_master_playlist_are_resolved_concurrently(standin, tmp_path, monkeypatch):
+    with standin() as url:
+        ct, _ = standInDownloaders(url)
+        video = ct(url + "video/1/", str(tmp_path))
+        master_started:asyncio.Event | None = None
+        name_started:asyncio.Event | None = None
+        resolve_name = video._asyncResolveName
+        get_master = downloadCT.asyncGetMasterPlaylist
+        async def slowName(session) -> str:
+            name_started.set()
+            await asyncio.wait_for(master_started.wait(), 5)
+            return await resolve_name(session)
+        async def slowMaster(*args, **kwargs) -> str:
+            master_started.set()
+            await asyncio.wait_for(name_started.wait(), 5)
+            return await get_master(*args, **kwargs)
+        monkeypatch.setattr(video, "_asyncResolveName", slowName)
+        monkeypatch.setattr(downloadCT, "asyncGetMasterPlaylist", slowMaster)
+        async def run():
+            nonlocal master_started, name_started
+            master_started, name_started = asyncio.Event(), asyncio.Event()
+            return await video.resolve()
+        resolved = asyncio.run(run())
+    assert resolved.name == "Video 1"
+    assert len(resolved.streams) == 3
+
+def test_resolve_without_streams_skips_master_playlist(standin, tmp_path, monkeypatch):
+    async def unexpected(*args, **kwargs) -> str:
+        pytest.fail("Master playlist se neměl stahovat.")
+    monkeypatch.setattr(downloadCT, "asyncGetMasterPlaylist", unexpected)
+    with standin() as url:
+        ct, _ = standInDownloaders(url)
+        resolved = asyncio.run(ct(url + "video/1/", str(tmp_path)).resolve(streams=False))
+    assert resolved.name == "Video 1"
+    assert "streams" not in resolved.video.__dict__
@@ -0,0 +1,81 @@
+"""Tests of subtitle conversion, compared with the converter that wrote the whole file at once, and of subtitle options"""
+import asyncio
+import importlib.util
+import os
+import pytest
+from aiohttp import ClientSession
+from typer.testing import CliRunner
+from conftest import FIXTURES
+from downloadM3u8 import M3U8
+from standin import syntheticSubtitles
+from subtitles import asyncDownloadSubtitles, txtToSrt
+
+def legacyTxtToSrt(source:str) -> str:
+    """The former ``CT._txtToSrt``, converted the whole text split by ``\\n``"""
+    def seconds(milliseconds:int) -> str:
+        seconds, milliseconds = divmod(milliseconds, 1000)
+        minutes, seconds = divmod(seconds, 60)
+        hours, minutes = divmod(minutes, 60)
+        return f"{hours:02d}:{minutes:02d}:{seconds:02d},{milliseconds:03d}"
+    start:bool = True
+    srt_file:str = ""
+    for line in source.split("\n"):
+        if start and line != "":
+            index:str = line.strip().split(";")[0]
+            start_time, end_time = line.strip().split(" ")[1:]
+            srt_file += f"{index}\n{seconds(int(start_time))} --> {seconds(int(end_time))}\n"
+            start = False
+        else:
+            if line == "":
+                start = True
+                srt_file += "\n"
+                continue
+            srt_file += line+"\n"
+    return srt_file
+
+def download(url:str, directory:str, vtt:bool = False) -> str:
+    """Downloads one subtitle track and returns path of its SRT file"""
+    async def run() -> list[tuple[str, str]]:
+        async with ClientSession() as session:
+            return await asyncDownloadSubtitles([("cs", url)], directory, "video", session, vtt)
+    return asyncio.run(run())[0][1]
+
+@pytest.mark.parametrize("fixture", ["trailing-newline.txt", "no-trailing-newline.txt"])
+def test_download_matches_legacy_converter(standin, tmp_path, fixture):
+    with open(os.path.join(FIXTURES, "subtitles", fixture), encoding="utf-8") as f:
+        text:str = f.read()
+    with standin(fixtures=FIXTURES) as url:
+        path:str = download(url + f"fixtures/subtitles/{fixture}", str(tmp_path))
+    with open(path, encoding="utf-8", newline="") as f:
+        assert f.read() == legacyTxtToSrt(text)
+
+def test_synthetic_track_matches_legacy_converter(standin, tmp_path):
+    with standin(subtitleHours=0.05) as url:
+        path:str = download(url + "subtitles/0.txt", str(tmp_path), vtt=True)
+    expected:str = legacyTxtToSrt(syntheticSubtitles(0.05))
+    assert os.path.getsize(path) == len(expected.encode())
+    with open(path, encoding="utf-8", newline="") as f:
+        assert f.read() == expected
+    with open(os.path.splitext(path)[0] + ".vtt", encoding="utf-8") as f:
+        assert f.read().startswith("WEBVTT\n\n1\n00:00:00.000 --> 00:00:02.800\n")
+
+def test_txt_to_srt_matches_legacy_converter():
+    text:str = syntheticSubtitles(0.05)
+    assert "".join(txtToSrt(text.split("\n"))) == legacyTxtToSrt(text)
+
+def test_muxed_subtitles_map_only_video_and_audio(tmp_path):
+    video:M3U8 = M3U8("http://127.0.0.1/master.m3u8", str(tmp_path), "video")
+    assert video._ffmpegCommand("pipe:0", "video.mp4", [("cs", "cs.srt"), ("en", "en.srt")]) == [
+        "ffmpeg", "-y", "-loglevel", "error", "-i", "pipe:0", "-i", "cs.srt", "-i", "en.srt",
+        "-map", "0:v", "-map", "0:a?", "-map", "1", "-map", "2", "-c", "copy", "-c:s", "mov_text",
+        "-metadata:s:s:0", "title=cs", "-metadata:s:s:1", "title=en", "video.mp4"]
+
+@pytest.mark.parametrize("options,message", [(["--vtt"], "--vtt"), (["--mux-subtitles", "-c"], "--mux-subtitles"),
+                                             (["--mux-subtitles", "-s"], "--mux-subtitles")])
+def test_cli_rejects_subtitle_options_without_subtitles_or_convert(options, message):
+    spec = importlib.util.spec_from_file_location("main_cli", os.path.join(os.path.dirname(FIXTURES), "..", "main-cli.py"))
+    cli = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(cli)
+    result = CliRunner().invoke(cli.app, ["-u", "https://www.ceskatelevize.cz/porady/1/", *options])
+    assert result.exit_code == 2
+    assert message in result.output
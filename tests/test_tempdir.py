@@ -0,0 +1,90 @@
+"""Tests of temporary directories of downloads, with the stand-in and stub ffmpeg"""
+import os
+import pytest
+from benchmark import standInDownloaders
+from downloadCT import CT_Error
+from downloadM3u8 import M3U8, lockFile
+
+STUB_FFMPEG:str = os.path.join(os.path.dirname(os.path.abspath(__file__)), "stub_ffmpeg.py")
+OPTIONS:dict = {"segments": 8, "segmentSize": 50_000}
+
+def partDirectories(directory:str) -> list[str]:
+    """Returns temporary directories left in ``directory``"""
+    return [name for name in os.listdir(directory) if name.endswith(".part")]
+
+@pytest.mark.parametrize("pipe", [False, True], ids=["convert", "pipe"])
+def test_failed_download_removes_tempdir(standin, tmp_path, monkeypatch, pipe):
+    monkeypatch.setenv("STUB_FFMPEG_FAIL_AFTER", "100000")
+    with standin(**OPTIONS) as url:
+        ct, _ = standInDownloaders(url)
+        c = ct(url + "video/1/", str(tmp_path), "failed")
+        c.video.ffmpeg = STUB_FFMPEG
+        with pytest.raises(CT_Error):
+            c.download(convert=True, pipe=pipe, resume=False)
+    assert partDirectories(str(tmp_path)) == []
+
+def test_failed_resumable_download_keeps_unlocked_tempdir(standin, tmp_path, monkeypatch):
+    monkeypatch.setenv("STUB_FFMPEG_FAIL_AFTER", "100000")
+    with standin(**OPTIONS) as url:
+        ct, _ = standInDownloaders(url)
+        c = ct(url + "video/1/", str(tmp_path), "resumable")
+        c.video.ffmpeg = STUB_FFMPEG
+        with pytest.raises(CT_Error):
+            c.download(convert=True, resume=True)
+        assert partDirectories(str(tmp_path)) == [f".resumable.{c.video.fingerprint[:16]}.part"]
+        lock = lockFile(os.path.join(c.video.temp_directory, ".lock"))
+        assert lock is not None
+        lock.close()
+        monkeypatch.delenv("STUB_FFMPEG_FAIL_AFTER")
+        path:str = c.download(convert=True, resume=True)
+    assert os.path.getsize(path) == OPTIONS["segments"] * OPTIONS["segmentSize"]
+    assert partDirectories(str(tmp_path)) == []
+
+def test_resumable_tempdir_is_keyed_by_fingerprint_and_locked(tmp_path):
+    first:M3U8 = M3U8("http://127.0.0.1/master.m3u8", str(tmp_path), "same")
+    second:M3U8 = M3U8("http://127.0.0.1/master.m3u8", str(tmp_path), "same")
+    other:M3U8 = M3U8("http://127.0.0.1/master.m3u8", str(tmp_path), "same")
+    first.fingerprint = second.fingerprint = "a" * 64
+    other.fingerprint = "b" * 64
+    for video in (first, second, other):
+        video._make_tempdir(resume=True)
+    assert os.path.basename(first.temp_directory) == f".same.{'a' * 16}.part"
+    assert os.path.basename(other.temp_directory) == f".same.{'b' * 16}.part"
+    assert second.temp_directory not in (first.temp_directory, other.temp_directory)
+    second._discard_tempdir()
+    assert not os.path.exists(second.temp_directory)
+    first._discard_tempdir()
+    other._remove_tempdir()
+    assert partDirectories(str(tmp_path)) == [f".same.{'a' * 16}.part"]
+
+def test_batch_same_name_jobs_and_duplicate_urls(standin, standinBatch, tmp_path):
+    with standin(**OPTIONS) as url:
+        _, ct_gold = standInDownloaders(url)
+        urls:list[str] = [url + "zlata/12345/", url + "zlata/123456/", url + "zlata/12345/"]
+        items = standinBatch(ct_gold)(urls, str(tmp_path), resume=True, maxJobs=2).run()
+    assert [item.url for item in items] == urls[:2]
+    assert [item.status for item in items] == ["hotovo", "hotovo"]
+    assert items[0].name == items[1].name
+    assert partDirectories(str(tmp_path)) == []
+
+def test_different_videos_with_the_same_name_keep_both_files(standin, standinBatch, tmp_path):
+    with open(tmp_path / "same.ts", "wb") as f:
+        f.write(b"soubor uzivatele")
+    with standin(**OPTIONS) as url:
+        ct, _ = standInDownloaders(url)
+        items = standinBatch(ct, name="same")([url + "video/1/", url + "video/2/"], str(tmp_path), resume=False, maxJobs=2).run()
+    assert [item.status for item in items] == ["hotovo", "hotovo"]
+    assert sorted(name for name in os.listdir(str(tmp_path)) if name.endswith(".ts")) == ["same (2).ts", "same (3).ts", "same.ts"]
+    with open(tmp_path / "same.ts", "rb") as f:
+        assert f.read() == b"soubor uzivatele"
+    for name in ("same (2).ts", "same (3).ts"):
+        assert os.path.getsize(tmp_path / name) == OPTIONS["segments"] * OPTIONS["segmentSize"]
+
+def test_failed_resolution_keeps_its_error(standin, tmp_path):
+    with standin() as url:
+        ct, _ = standInDownloaders(url)
+        c = ct(url + "neexistuje/1/", str(tmp_path))
+        with pytest.raises(CT_Error) as error:
+            c.download(convert=False)
+    assert str(error.value) == "Nemohl jsem se dostat na web. Zkontroluj připojení k internetu nebo správnost url."
+    assert "video" not in c.__dict__